@@ -0,0 +1,291 @@
+"""
+Các benchmark đo hiệu năng của honolib
+Chạy: python benchmark.py <tên benchmark> [tham số]
+"""
+import argparse
+import contextlib
+import csv
+import io
+import os
+import random
+import re
+import tempfile
+import time
+from array import array
+import honolib as hd
+
+DEFAULT_INPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'house-prices.csv')
+
+
+def scale_csv(filename, scale):
+    """
+    Tạo file CSV tạm bằng cách lặp lại phần dữ liệu của `filename` `scale` lần.
+    Trả về: đường dẫn file tạm, số hàng dữ liệu
+    """
+    with open(filename, 'rt', newline='') as f:
+        header = f.readline()
+        body = f.read()
+    if not body.endswith('\n'):
+        body += '\n'
+    n_rows = body.count('\n')
+
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(fd, 'wt', newline='') as f:
+        f.write(header)
+        for _ in range(scale):
+            f.write(body)
+    return path, n_rows * scale
+
+
+def timeit(func, repeat):
+    """
+    Chạy `func` `repeat` lần, trả về thời gian chạy nhanh nhất (giây)
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def legacy_detect_type_value(val):
+    """
+    Bản sao cố định của `detect_type_value` cũ (regex không biên dịch trước, gọi cho từng ô)
+    """
+    if re.match('^[-+]?[0-9]+$', val):
+        return int
+    elif re.match('^[-+]?([0-9]+\\.[0-9]*|[0-9]*\\.[0-9]+)$', val):
+        return float
+    return str
+
+
+def legacy_series(cells, label):
+    """
+    Bản sao cố định của cách Series cũ xử lý một cột đọc từ CSV: gán ô rỗng thành None, đoán kiểu, kết hợp kiểu
+    và ép kiểu từng ô một, cuối cùng mới chuyển cột số sang array.array.
+    Không dùng constructor của Series để hàng "legacy" luôn đo đúng đường đọc cũ.
+    """
+    for index, cell in enumerate(cells):
+        if len(cell) == 0:
+            cells[index] = None
+
+    dtype = None
+    for index, cell in enumerate(cells):
+        if cell is None:
+            continue
+        t = legacy_detect_type_value(cell)
+        dtype = hd.promote_type(dtype, t)
+        cells[index] = t(cell)
+
+    if dtype in [int, float]:
+        try:
+            rows = array('q' if dtype is int else 'd', (0 if cell is None else cell for cell in cells))
+        except (OverflowError, TypeError):
+            return hd.Series.from_buffer(cells, None, dtype, label)
+        return hd.Series.from_buffer(rows, bytearray(cell is not None for cell in cells), dtype, label)
+    return hd.Series.from_buffer(cells, None, dtype, label)
+
+
+def legacy_read_csv(filename):
+    """
+    Cách đọc CSV cũ: csv.DictReader, gom từng ô theo tên cột, sau đó xử lý ô rỗng và đoán kiểu từng ô (`legacy_series`)
+    """
+    columns = {}
+    with open(filename, 'rt', newline='') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            for key in row:
+                if key not in columns:
+                    columns[key] = [row[key]]
+                else:
+                    columns[key].append(row[key])
+
+    df = hd.DataFrame()
+    for col in columns:
+        df.append_column(legacy_series(columns[col], col))
+    return df
+
+
+def bench_read_csv(args):
+    path, n_rows = scale_csv(args.input, args.scale)
+    try:
+        print('Rows:', n_rows)
+        readers = [('DictReader (legacy)', legacy_read_csv), ('CsvReader', hd.read_csv)]
+        if args.usecols is not None:
+            readers.append(('CsvReader (usecols)', lambda path: hd.read_csv(path, usecols=args.usecols)))
+        for workers in args.workers:
+            readers.append(('CsvReader (%d workers)' % workers, lambda path, workers=workers: hd.read_csv(path, workers=workers)))
+        if args.cache:
+            # Lần đọc đầu tiên (ghi cache) không được tính
+            hd.read_csv(path, cache=True)
+            readers.append(('Binary cache', lambda path: hd.read_csv(path, cache=True)))
+        for name, func in readers:
+            elapsed = timeit(lambda: func(path), args.repeat)
+            print(name.ljust(24), '\t', round(elapsed, 3), 's\t', round(n_rows / elapsed), 'rows/s')
+    finally:
+        os.remove(path)
+        if os.path.exists(hd.ColumnarFile.cache_filename(path, True)):
+            os.remove(hd.ColumnarFile.cache_filename(path, True))
+
+
+def make_expression(columns, n_operators):
+    """
+    Tạo biểu thức có `n_operators` toán tử từ các cột số `columns`.
+    Phép chia luôn chia cho hằng số để tránh chia cho 0.
+    """
+    tokens = [columns[0]]
+    for i in range(n_operators):
+        operator = '+*-/'[i % 4]
+        operand = '2' if operator == '/' else columns[(i + 1) % len(columns)]
+        tokens += [operator, operand]
+    return ' '.join(tokens)
+
+
+def bench_evaluate(args):
+    path, n_rows = scale_csv(args.input, args.scale)
+    try:
+        df = hd.read_csv(path)
+    finally:
+        os.remove(path)
+    columns = [col.label for col in df._columns if col.dtype in (int, float)]
+
+    print('Rows:', n_rows)
+    print('Operators\tUnfused (s)\tFused (s)\tSpeedup')
+    for n_operators in args.operators:
+        expr = hd.SeriesExpression(make_expression(columns, n_operators), df)
+        unfused = timeit(lambda: expr.evaluate(fused=False), args.repeat)
+        fused = timeit(lambda: expr.evaluate(fused=True), args.repeat)
+        print(n_operators, '\t\t', round(unfused, 4), '\t', round(fused, 4), '\t', round(unfused / fused, 2), 'x')
+
+
+def bench_lazy(args):
+    path, n_rows = scale_csv(args.input, args.scale)
+    try:
+        plan = (hd.scan_csv(path)
+            .evaluate({'Total': 'LotArea * 2 + SalePrice'})
+            .drop_duplicate(['Neighborhood', 'YrSold'])
+            .fill_na('mean', 'LotFrontage')
+            .normalize('SalePrice')
+            .select(['Neighborhood', 'Total', 'LotFrontage', 'SalePrice']))
+        print('Rows:', n_rows)
+        print(plan.explain())
+        eager = timeit(lambda: plan.collect(optimize=False), args.repeat)
+        lazy = timeit(lambda: plan.collect(), args.repeat)
+        print('Eager (s)\tOptimized (s)\tSpeedup')
+        print(round(eager, 3), '\t\t', round(lazy, 3), '\t\t', round(eager / lazy, 2), 'x')
+    finally:
+        os.remove(path)
+
+
+def bench_categorical(args):
+    path, n_rows = scale_csv(args.input, args.scale)
+    try:
+        categorical = hd.read_csv(path)
+    finally:
+        os.remove(path)
+    # Cùng dữ liệu nhưng các cột chuỗi lưu bằng list (không mã hóa).
+    # Mỗi ô là một chuỗi riêng như khi đọc từ CSV (không dùng chung các chuỗi trong từ điển).
+    plain = hd.DataFrame()
+    for col in categorical._columns:
+        if col.is_categorical():
+            rows = [value.encode().decode() if value is not None else None for value in col]
+            col = hd.Series.from_buffer(rows, None, col.dtype, col.label)
+        plain.append_column(col)
+    labels = [col.label for col in categorical._columns if col.is_categorical()]
+
+    def mode(df):
+        # Xóa các tham số thống kê đã lưu để mỗi lần chạy đều phải tính lại
+        for label in labels:
+            col = df.get_column(label)
+            col._invalidate()
+            col.mode()
+
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, 'out.csv')
+        tasks = [
+            ('mode', mode),
+            ('drop_duplicate', lambda df: df._duplicate_mask(labels)),
+            ('write_csv', lambda df: df.write_csv(output)),
+        ]
+        print('Rows:', n_rows, '\tCategorical columns:', len(labels))
+        print('Task\t\tPlain (s)\tCategorical (s)\tSpeedup')
+        for name, func in tasks:
+            before = timeit(lambda: func(plain), args.repeat)
+            after = timeit(lambda: func(categorical), args.repeat)
+            print(name.ljust(16), round(before, 3), '\t\t', round(after, 3), '\t\t', round(before / after, 2), 'x')
+
+
+def make_wide_frame(n_cols, n_rows):
+    """
+    Tạo DataFrame gồm `n_cols` cột số thực ngẫu nhiên (khoảng 10% ô rỗng), mỗi cột `n_rows` hàng
+    """
+    rng = random.Random(0)
+    df = hd.DataFrame()
+    for i in range(n_cols):
+        rows = array('d', (rng.gauss(0, 1) for _ in range(n_rows)))
+        valid = bytearray(rng.random() > 0.1 for _ in range(n_rows))
+        df.append_column(hd.Series.from_buffer(rows, valid, float, 'col' + str(i)))
+    return df
+
+
+def bench_workers(args):
+    df = make_wide_frame(args.columns, args.rows)
+
+    def describe(workers):
+        # Xóa các tham số thống kê đã lưu để mỗi lần chạy đều phải tính lại
+        for col in df._columns:
+            col._invalidate()
+        with contextlib.redirect_stdout(io.StringIO()):
+            df.describe(workers=workers)
+
+    print('Columns:', args.columns, '\tRows:', args.rows, '\tCPUs:', os.cpu_count())
+    print('Workers\tdescribe (s)\tSpeedup')
+    baseline = None
+    for workers in args.workers:
+        elapsed = timeit(lambda: describe(workers), args.repeat)
+        if baseline is None:
+            baseline = elapsed
+        print(workers, '\t', round(elapsed, 3), '\t\t', round(baseline / elapsed, 2), 'x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Honolib benchmarks')
+    parser.add_argument('-i', '--input', default=DEFAULT_INPUT, metavar='INPUT', help='Input CSV file')
+    parser.add_argument('-r', '--repeat', default=3, type=int, help='Number of runs (the best run is reported)')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    read_csv_parser = subparsers.add_parser('read_csv', help='Compare CSV loading throughput')
+    read_csv_parser.add_argument('-s', '--scale', default=100, type=int, help='Repeat the input data N times')
+    read_csv_parser.add_argument('-u', '--usecols', default=None, nargs='+', help='Also measure a column-projected read of these columns')
+    read_csv_parser.add_argument('-j', '--workers', default=[], nargs='+', type=int, help='Also measure parallel byte-range parsing with these worker counts')
+    read_csv_parser.add_argument('-c', '--cache', action='store_true', help='Also measure loading from the binary columnar cache')
+    read_csv_parser.set_defaults(func=bench_read_csv)
+
+    evaluate_parser = subparsers.add_parser('evaluate', help='Compare fused and unfused expression evaluation')
+    evaluate_parser.add_argument('-s', '--scale', default=10, type=int, help='Repeat the input data N times')
+    evaluate_parser.add_argument('-n', '--operators', default=[2, 5, 10, 15, 20], nargs='+', type=int, help='Number of operators of the benchmarked expressions')
+    evaluate_parser.set_defaults(func=bench_evaluate)
+
+    lazy_parser = subparsers.add_parser('lazy', help='Compare running a lazy plan step by step and optimized')
+    lazy_parser.add_argument('-s', '--scale', default=10, type=int, help='Repeat the input data N times')
+    lazy_parser.set_defaults(func=bench_lazy)
+
+    categorical_parser = subparsers.add_parser('categorical', help='Compare string columns stored as lists and dictionary-encoded')
+    categorical_parser.add_argument('-s', '--scale', default=20, type=int, help='Repeat the input data N times')
+    categorical_parser.set_defaults(func=bench_categorical)
+
+    workers_parser = subparsers.add_parser('workers', help='Measure scaling of per-column work (describe) over worker processes')
+    workers_parser.add_argument('-c', '--columns', default=64, type=int, help='Number of columns of the generated frame')
+    workers_parser.add_argument('-n', '--rows', default=50000, type=int, help='Number of rows of the generated frame')
+    workers_parser.add_argument('-w', '--workers', default=[1, 2, 4, 8, 16], nargs='+', type=int, help='Worker counts to measure')
+    workers_parser.set_defaults(func=bench_workers)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,80 +1,482 @@
 """
 Module chứa các hàm để xử lý từng chức năng cho chương trình
 """
+import time
 import honolib as hd
 
 class Controller:
-    def __init__(self, input_filename, output_filename, verbose):
+    # Số hàng mỗi phần khi áp dụng tham số đã fit theo từng phần (nếu không có chunksize)
+    STREAM_CHUNKSIZE = 10000
+
+    def __init__(self, input_filename, output_filename, verbose, chunksize=None, workers=None, cache=None, state=None):
         self.input_filename = input_filename
         self.output_filename = output_filename
         self.verbose = verbose
-        self.df: hd.DataFrame = hd.read_csv(self.input_filename)
-
-        if verbose:
-            print('File read into memory.')
-    
-    def describe(self, column):
-        # In các tham số thống kê (mean, std, ...) của cột
-        col = self.df.get_column(column)
-        col.describe()
-    
+        # Nếu có chunksize thì các lệnh hỗ trợ sẽ đọc file theo từng phần thay vì đọc toàn bộ vào bộ nhớ
+        self.chunksize = chunksize
+        # Số tiến trình xử lý song song các cột (None: xử lý tuần tự)
+        self.workers = workers
+        # Cache nhị phân của file input (True: cạnh file input, chuỗi: thư mục chứa cache, None: không dùng)
+        self.cache = cache
+        # File lưu trạng thái đã xử lý của file input (chỉ đọc phần mới ghi thêm vào cuối file, None: không dùng)
+        self.state_filename = state
+        self._df: hd.DataFrame = None
+        # Trong pipeline, kết quả của mỗi bước được giữ lại trong bộ nhớ thay vì ghi ra file
+        self._in_pipeline = False
+
+    @property
+    def df(self) -> hd.DataFrame:
+        # Chỉ đọc toàn bộ file vào bộ nhớ khi lệnh cần đến
+        if self._df is None:
+            self._df = hd.read_csv(self.input_filename, workers=self.workers, cache=self.cache)
+            if self.verbose:
+                print('File read into memory.')
+        return self._df
+
+    def _write(self, df):
+        # Ghi kết quả ra file (trong pipeline thì chỉ giữ lại để bước sau dùng tiếp)
+        if self._in_pipeline:
+            self._df = df
+        else:
+            df.write_csv(self.output_filename)
+
+    def _projected(self, columns):
+        # Dataframe chỉ gồm các cột `columns` (dùng cho các lệnh chỉ đọc dữ liệu)
+        # Nếu file đã được đọc vào bộ nhớ (vd: trong pipeline) thì dùng luôn, nếu chưa thì chỉ đọc các cột cần thiết
+        if self._df is not None or columns is None:
+            return self.df
+        return hd.read_csv(self.input_filename, workers=self.workers, usecols=columns, cache=self.cache)
+
+    def _can_patch(self):
+        # Lệnh chỉ đọc/sửa một vài cột thì chỉ đọc các cột đó và chép nguyên byte các cột còn lại từ file gốc.
+        # Không dùng được khi dataframe đã được đọc vào bộ nhớ (vd: trong pipeline).
+        return self._df is None and not self._in_pipeline
+
+    def _use_state(self):
+        # Chỉ dùng trạng thái đã lưu khi đọc trực tiếp file input (không dùng trong pipeline)
+        return self.state_filename is not None and self._can_patch()
+
+    def _state(self, subset=None, dedup=False):
+        # Nạp trạng thái đã lưu của file input, cập nhật với các hàng mới ghi thêm vào cuối file rồi lưu lại
+        # Nếu `dedup` thì trạng thái lưu cả fingerprint của các hàng theo các cột `subset` để xóa hàng trùng lặp
+        state = hd.IncrementalState.load(self.input_filename, self.state_filename)
+        if dedup:
+            state.track_duplicates(subset)
+        new_rows = state.update()
+        state.save()
+        if self.verbose:
+            print('State updated:', new_rows, 'new rows,', state.n_rows, 'rows in total.')
+        return state
+
+    def _read_columns(self, columns):
+        # Chỉ đọc các cột `columns` của file
+        return hd.read_csv(self.input_filename, workers=self.workers, usecols=columns, cache=self.cache)
+
+    def _chunks(self, usecols=None):
+        # Đọc file theo từng phần (mỗi lần gọi là một lượt đọc file mới)
+        return hd.read_csv(self.input_filename, chunksize=self.chunksize, usecols=usecols)
+
+    def describe(self, columns=None):
+        # In các tham số thống kê (mean, std, ...) của các cột (mặc định: tất cả các cột)
+        if self._use_state():
+            state = self._state()
+            labels = columns if columns is not None else state.labels or []
+            for index, label in enumerate(labels):
+                if index > 0:
+                    print()
+                state.get_stats(label).describe()
+            return
+
+        if self.chunksize is None:
+            self._projected(columns).describe(columns, workers=self.workers)
+            return
+
+        # Tích lũy tham số của tất cả các cột trong một lượt đọc file
+        stats = {}
+        for chunk in self._chunks(columns):
+            labels = chunk.get_column_labels() if columns is None else columns
+            for label in labels:
+                if label not in stats:
+                    stats[label] = hd.ColumnStats(label, frequency=True, quantiles=True)
+                stats[label].update(chunk.get_column(label))
+
+        for index, column_stats in enumerate(stats.values()):
+            if index > 0:
+                print()
+            column_stats.describe()
+
     def list_null_columns(self):
         # In ra các cột rỗng
-        self.df.count_na()
-    
+        if self.chunksize is None:
+            self.df.count_na()
+            return
+
+        counter = {}
+        for chunk in self._chunks():
+            for label, null_count in chunk.count_na_columns().items():
+                counter[label] = counter.get(label, 0) + null_count
+        hd.print_na_counts(counter)
+
     def shape(self):
         # In ra kích thước dataframe
-        print(self.df.shape())
-    
+        if self.chunksize is None:
+            print(self.df.shape())
+            return
+
+        n_rows, n_cols = 0, 0
+        for chunk in self._chunks():
+            chunk_rows, n_cols = chunk.shape()
+            n_rows += chunk_rows
+        print((n_rows, n_cols))
+
     def count_null_rows(self):
         # Đếm số hàng rỗng
-        print('Number of null rows in dataframe:', self.df.count_na_rows())
-    
+        if self.chunksize is None:
+            count = self.df.count_na_rows()
+        else:
+            count = sum(chunk.count_na_rows() for chunk in self._chunks())
+        print('Number of null rows in dataframe:', count)
+
     def list_columns(self):
         # In ra tất cả các cột
-        columns = self.df.get_column_labels()
+        dtypes = {}
+        if self.chunksize is None:
+            for column in self.df.get_column_labels():
+                dtypes[column] = self.df.get_column(column).dtype
+        else:
+            # Kết hợp kiểu dữ liệu của cột trên từng phần
+            for chunk in self._chunks():
+                for col in chunk._columns:
+                    dtypes[col.label] = hd.promote_type(dtypes.get(col.label), col.dtype)
+
+        columns = list(dtypes)
         col_width = max([len(col) for col in columns]) + 2
 
         for column in columns:
-            dtype = self.df.get_column(column).dtype
-            print(column.ljust(col_width), '\t', dtype)
+            print(column.ljust(col_width), '\t', dtypes[column])
         print('Total:', len(columns), 'columns.')
-    
-    def fillna(self, method, column):
-        # Điền các ô rỗng 
+
+    def fillna(self, method, column, fit=None, apply=None):
+        # Điền các ô rỗng
         # Nếu không chỉ rõ cột thì điền trên tất cả các cột
-        if column is None: 
-            for col in self.df._columns:
-                col.fill_na(method=method, verbose=self.verbose)
-        else: 
+        # - fit: chỉ tính giá trị điền và lưu vào file tham số `fit` (không ghi file output)
+        # - apply: điền bằng giá trị đã lưu trong file tham số `apply` (không tính lại thống kê), đọc và ghi theo từng phần
+        if apply is not None:
+            self._apply(self.fillna_apply_step(method, column, apply))
+            return
+
+        # Nếu có trạng thái đã lưu hoặc có chunksize (khi fit) thì giá trị điền được tính từ tham số thống kê tích lũy
+        fill_values = {}
+        if self._use_state() or (fit is not None and self.chunksize is not None):
+            stats = self._columns_stats([column] if column is not None else None, fill=True)
+            fill_values = {label: column_stats.fill_value(method) for label, column_stats in stats.items()}
+            dtypes = {label: column_stats.dtype for label, column_stats in stats.items()}
+
+        if fit is not None:
+            if len(fill_values) == 0:
+                columns = [self._column(column)] if column is not None else self.df._columns
+                fill_values = {col.label: col._fill_value(method) for col in columns}
+                dtypes = {col.label: col.dtype for col in columns}
+            params = hd.TransformParams.load(fit, missing_ok=True)
+            for label, value in fill_values.items():
+                params.set_fill_na(label, method, hd.fitted_fill_value(dtypes[label], value))
+            params.save(fit)
+            return
+
+        if column is None:
+            self.df.fill_na(method=method, verbose=self.verbose, workers=self.workers, fill_values=fill_values)
+        elif self._can_patch():
+            col = self._read_columns([column]).get_column(column)
+            col.fill_na(method=method, verbose=self.verbose, fill_value=fill_values.get(column))
+            hd.CsvPatcher(self.input_filename).write(self.output_filename, replaced=[col])
+            return
+        else:
             col = self.df.get_column(column)
             col.fill_na(method=method, verbose=self.verbose)
-        self.df.write_csv(self.output_filename)
-    
+        self._write(self.df)
+
+    def fillna_apply_step(self, method, column, filename):
+        # Bước điền các ô rỗng bằng giá trị đã fit trong file tham số `filename` (chỉ phụ thuộc vào từng hàng)
+        # Nếu không chỉ rõ cột thì điền tất cả các cột có trong file tham số
+        params = hd.TransformParams.load(filename)
+        labels = [column] if column is not None else list(params.fill_na)
+        values = {}
+        for label in labels:
+            fitted_method, values[label] = params.get_fill_na(label)
+            if method is not None and method != fitted_method:
+                raise AttributeError('Column ' + label + ' was fitted with method: ' + fitted_method)
+
+        def step(df):
+            for label, value in values.items():
+                df.get_column(label).fill_with(value)
+            return df
+        return step
+
     def dropna(self, axis, threshold):
         # Xóa hàng/cột rỗng theo tỉ lệ
+        if self.chunksize is not None and axis == 0:
+            # Việc xóa một hàng chỉ phụ thuộc vào chính hàng đó nên xử lý được trên từng phần
+            def chunks():
+                for chunk in self._chunks():
+                    chunk.drop_na(axis=axis, threshold=threshold)
+                    yield chunk
+            hd.write_csv_chunks(chunks(), self.output_filename)
+            return
+
         self.df.drop_na(axis=axis, threshold=threshold)
-        self.df.write_csv(self.output_filename)
-    
-    def drop_duplicate(self):
-        # Xoá các hàng trùng nhau =
-        new_df = self.df.drop_duplicate()
-        new_df.write_csv(self.output_filename)
+        self._write(self.df)
+
+    def drop_duplicate(self, subset=None, keep='first', partitions=None):
+        # Xoá các hàng trùng nhau
+        if self._use_state():
+            # Các hàng cũ được giữ lại hay không không đổi khi thêm hàng mới (giữ hàng đầu tiên)
+            # nên chỉ cần so fingerprint của các hàng mới với các hàng đã gặp
+            if keep != 'first':
+                raise AttributeError('Incremental dropdup only supports keep=first')
+            mask = self._state(subset, dedup=True).keep_mask(subset)
+            if self.chunksize is None:
+                hd.CsvPatcher(self.input_filename).write(self.output_filename, mask=mask)
+            else:
+                self._write_masked_chunks(mask)
+            return
+
+        if self.chunksize is None and subset is not None and self._can_patch():
+            # Chỉ cần đọc các cột dùng để so sánh, các hàng được giữ lại được chép nguyên byte
+            mask = self._read_columns(subset)._duplicate_mask(subset, keep, partitions)
+            hd.CsvPatcher(self.input_filename).write(self.output_filename, mask=mask)
+            return
 
-    def normalize(self, method, column):
+        if self.chunksize is None:
+            new_df = self.df.drop_duplicate(subset=subset, keep=keep, partitions=partitions)
+            self._write(new_df)
+            return
+
+        # Lượt 1: đánh dấu các hàng được giữ lại trên toàn bộ file
+        dedup = hd.Deduplicator(keep=keep, partitions=partitions)
+        for chunk in self._chunks():
+            if subset is None:
+                columns = chunk._columns
+            else:
+                columns = [chunk.get_column(label) for label in subset]
+            for row in zip(*columns):
+                dedup.add(row)
+        mask = dedup.keep_mask()
+
+        # Lượt 2: chỉ ghi ra các hàng được giữ lại của từng phần
+        self._write_masked_chunks(mask)
+
+    def _write_masked_chunks(self, mask):
+        # Đọc lại file theo từng phần, chỉ ghi ra các hàng có mask tương ứng là 1
+        def chunks():
+            offset = 0
+            for chunk in self._chunks():
+                n_rows = chunk.shape()[0]
+                chunk_mask = mask[offset:offset + n_rows]
+                offset += n_rows
+                yield chunk.filter(chunk_mask)
+        hd.write_csv_chunks(chunks(), self.output_filename)
+
+    def normalize(self, method, column, fit=None, apply=None):
         # Chuẩn hóa cột
-        col = self.df.get_column(column)
-        col.normalize(method=method)
+        # - fit: chỉ tính tham số chuẩn hóa và lưu vào file tham số `fit` (không ghi file output)
+        # - apply: chuẩn hóa bằng tham số đã lưu trong file tham số `apply` (không tính lại thống kê), đọc và ghi theo từng phần
+        if apply is not None:
+            self._apply(self.normalize_apply_step(method, column, apply))
+            return
+
+        # Tham số chuẩn hóa được lấy từ trạng thái đã lưu (nếu có),
+        # nếu có chunksize thì được tích lũy trong một lượt đọc theo từng phần (lượt 1)
+        params = None
+        if self._use_state() or self.chunksize is not None:
+            stats = self._columns_stats([column])[column]
+            if stats.dtype in [int, float] or self.chunksize is not None:
+                params = stats.normalize_params(method)
+
+        if fit is not None:
+            if params is None:
+                params = self._column(column).normalize_params(method)
+            fitted = hd.TransformParams.load(fit, missing_ok=True)
+            fitted.set_normalize(column, method, params)
+            fitted.save(fit)
+            return
+
+        if self.chunksize is None and self._can_patch():
+            col = self._read_columns([column]).get_column(column)
+            col.normalize(method=method, params=params)
+            hd.CsvPatcher(self.input_filename).write(self.output_filename, replaced=[col])
+            return
+
+        if self.chunksize is None:
+            col = self.df.get_column(column)
+            col.normalize(method=method)
+            self._write(self.df)
+            return
+
+        # Lượt 2: chuẩn hóa từng phần và ghi ra file
+        self._apply(self._normalize_step(method, column, params))
+
+    def normalize_apply_step(self, method, column, filename):
+        # Bước chuẩn hóa bằng tham số đã fit trong file tham số `filename` (chỉ phụ thuộc vào từng hàng)
+        fitted_method, params = hd.TransformParams.load(filename).get_normalize(column)
+        if method is not None and method != fitted_method:
+            raise AttributeError('Column ' + column + ' was fitted with method: ' + fitted_method)
+        return self._normalize_step(fitted_method, column, params)
+
+    @staticmethod
+    def _normalize_step(method, column, params):
+        def step(df):
+            df.get_column(column).normalize(method=method, params=params)
+            return df
+        return step
+
+    def _apply(self, step):
+        # Chạy bước chỉ phụ thuộc vào từng hàng (nhận và trả về một DataFrame):
+        # trên dataframe trong bộ nhớ (trong pipeline), nếu không thì trên từng phần của file (bộ nhớ giới hạn)
+        if not self._can_patch():
+            self._write(step(self.df))
+            return
+        chunks = hd.read_csv(self.input_filename, chunksize=self.chunksize or self.STREAM_CHUNKSIZE)
+        hd.write_csv_chunks((step(chunk) for chunk in chunks), self.output_filename)
+
+    def _column(self, column):
+        # Đọc một cột (chỉ đọc cột đó nếu file chưa được đọc vào bộ nhớ)
+        if self._can_patch():
+            return self._read_columns([column]).get_column(column)
+        return self.df.get_column(column)
+
+    def _columns_stats(self, columns=None, fill=False):
+        # Tham số thống kê (ColumnStats) của các cột `columns` (None: tất cả các cột):
+        # lấy từ trạng thái đã lưu (nếu có), nếu không thì tích lũy trong một lượt đọc theo từng phần.
+        # Nếu `fill` thì tích lũy cả bảng tần suất và sketch phân vị (để tính giá trị điền)
+        if self._use_state():
+            state = self._state()
+            labels = columns if columns is not None else state.labels or []
+            return {label: state.get_stats(label) for label in labels}
+
+        stats = {}
+        for chunk in self._chunks(columns):
+            for col in chunk._columns:
+                if col.label not in stats:
+                    stats[col.label] = hd.ColumnStats(col.label, frequency=fill, quantiles=fill)
+                stats[col.label].update(col)
+        if columns is not None:
+            for label in columns:
+                if label not in stats:
+                    raise AttributeError('Column not found: ' + label)
+        return stats
+
+    def evaluate(self, expressions, label, plan_cache=None):
+        # Tính giá trị các biểu thức thuộc tính, kết quả được thêm vào cuối dataframe
+        expressions = self._parse_expressions(expressions, label)
+        # Nạp cache kế hoạch tính từ file (nếu có)
+        if plan_cache is not None:
+            hd.SeriesExpression.plan_cache.load(plan_cache)
+
+        labels = []
+        for expression in expressions.values():
+            labels += [label for label in hd.SeriesExpression.column_labels(expression) if label not in labels]
+
+        if self.chunksize is None and self._can_patch() and len(labels) > 0:
+            # Chỉ đọc các cột có trong biểu thức, các cột kết quả được thêm vào cuối từng hàng của file gốc
+            results = hd.MultiSeriesExpression(expressions, self._read_columns(labels)).evaluate()
+            hd.CsvPatcher(self.input_filename).write(self.output_filename, appended=results)
+        elif self.chunksize is None:
+            self._write(self._evaluate(self.df, expressions))
+        else:
+            # Biểu thức được tính trên từng hàng nên xử lý được trên từng phần
+            chunks = (self._evaluate(chunk, expressions) for chunk in self._chunks())
+            hd.write_csv_chunks(chunks, self.output_filename)
+
+        if plan_cache is not None:
+            hd.SeriesExpression.plan_cache.save(plan_cache)
+
+    def dropna_rows_step(self, threshold):
+        # Bước xóa hàng rỗng trên một phần dữ liệu (dùng trong stream_pipeline)
+        def step(df):
+            df.drop_na(axis=0, threshold=threshold)
+            return df
+        return step
+
+    def evaluate_step(self, expressions, label):
+        # Bước tính biểu thức trên một phần dữ liệu (dùng trong stream_pipeline)
+        expressions = self._parse_expressions(expressions, label)
+        return lambda df: self._evaluate(df, expressions)
+
+    @staticmethod
+    def _parse_expressions(expressions, label):
+        # Tách các biểu thức dạng `label=expression` thành {label: expression}
+        # Biểu thức không có tên thì dùng tên `label` (mặc định: out)
+        result = {}
+        for expression in expressions:
+            if '=' in expression:
+                name, expression = expression.split('=', 1)
+                name = name.strip()
+            else:
+                name = label if label is not None else 'out'
+            if name in result:
+                raise AttributeError('Duplicate output column: ' + name)
+            result[name] = expression
+        return result
+
+    @staticmethod
+    def _evaluate(df, expressions):
+        # Tính các biểu thức trên `df` trong một lượt và thêm các cột kết quả vào `df`
+        results = hd.MultiSeriesExpression(expressions, df).evaluate()
+        for result in results:
+            df.append_column(result)
+        return df
+
+    def pipeline(self, steps):
+        """
+        Chạy lần lượt các bước trên cùng một dataframe: chỉ đọc file một lần và ghi file một lần.
+        - steps: danh sách (mô tả bước, hàm không tham số chạy bước đó trên controller này)
+        Nếu có chunksize thì các bước đọc theo từng phần được tắt, mọi bước đều chạy trong bộ nhớ.
+        In ra thời gian chạy của từng bước.
+        """
+        chunksize, self.chunksize = self.chunksize, None
+        self._in_pipeline = True
+        try:
+            start = time.perf_counter()
+            self.df
+            print_timing('read', time.perf_counter() - start)
+
+            for index, (name, step) in enumerate(steps):
+                start = time.perf_counter()
+                step()
+                print_timing('[%d/%d] %s' % (index + 1, len(steps), name), time.perf_counter() - start)
+        finally:
+            self._in_pipeline = False
+            self.chunksize = chunksize
+
+        start = time.perf_counter()
         self.df.write_csv(self.output_filename)
-    
-    def evaluate(self, expression, label):
-        # Tính giá trị biểu thức thuộc tính
-        expr = hd.SeriesExpression(expression, self.df)
-        result = expr.evaluate()
-        if label is None:
-            label = 'out'
-        result.label = label
-
-        new_df = hd.DataFrame()
-        new_df.append_column(result)
-        new_df.write_csv(self.output_filename)
\ No newline at end of file
+        print_timing('write', time.perf_counter() - start)
+
+    def stream_pipeline(self, steps):
+        """
+        Chạy các bước chỉ phụ thuộc vào từng hàng (dropna theo hàng, evaluate) trên từng phần của file,
+        đọc và ghi file một lần với bộ nhớ giới hạn.
+        - steps: danh sách (mô tả bước, hàm nhận một DataFrame và trả về DataFrame kết quả)
+        In ra tổng thời gian chạy của từng bước trên tất cả các phần.
+        """
+        elapsed = [0.0] * len(steps)
+
+        def chunks():
+            for chunk in self._chunks():
+                for index, (name, step) in enumerate(steps):
+                    start = time.perf_counter()
+                    chunk = step(chunk)
+                    elapsed[index] += time.perf_counter() - start
+                yield chunk
+
+        start = time.perf_counter()
+        hd.write_csv_chunks(chunks(), self.output_filename)
+        total = time.perf_counter() - start
+        for index, (name, step) in enumerate(steps):
+            print_timing('[%d/%d] %s' % (index + 1, len(steps), name), elapsed[index])
+        print_timing('read + write', total - sum(elapsed))
+
+
+def print_timing(name, seconds):
+    # In thời gian chạy của một bước
+    print(name.ljust(48), '\t', '%.3f s' % seconds)
@@ -4,10 +4,16 @@ Simple data cleasing tool
 By 19120615 -- Hung Ngoc Phat @ FIT, VNU-HCMUS
 """
 import argparse 
+import json
+import shlex
 import traceback
 from command_controller import Controller
 
-def main():
+def build_parser():
+    """
+    Tạo parser cho các tham số dòng lệnh.
+    Trả về: parser, subparsers (để parse riêng từng bước của pipeline)
+    """
     parser = argparse.ArgumentParser(description='Honoka\'s Data Preprocessing Toolbox')
     subparsers = parser.add_subparsers(help='Honoda subcommands', dest='command')
 
@@ -26,7 +32,13 @@ def main():
     )
     stats_exclusive.add_argument('-d', '--describe', 
         metavar='COLUMN', 
-        help='Display statistical info (min, max, mean, mode, ...) of a column'
+        nargs='+', 
+        help='Display statistical info (min, max, mean, mode, ...) of one or more columns'
+    )
+    stats_exclusive.add_argument('-a', '--all', 
+        dest='describe_all', 
+        action='store_true', 
+        help='Display statistical info of all columns (every column is profiled in one scan)'
     )
     stats_exclusive.add_argument('-cnr', '--count-null-rows', 
         dest='count_null_rows', 
@@ -42,11 +54,11 @@ def main():
     # Lệnh để điền giá trị thiếu 
     fillna_parser = subparsers.add_parser('fillna', help='Fill null values')
     fillna_parser.add_argument('-m', '--method', 
-        help='Method to fill for numeric columns (median, mean, mode are allowed). Categorical columns are always filled with their mode value', 
+        help='Method to fill for numeric columns (median, mean, mode are allowed). Categorical columns are always filled with their mode value. '
+            'Required unless --apply is used', 
         metavar='METHOD', 
         type=str,
-        choices=['median', 'mean', 'mode'],
-        required=True
+        choices=['median', 'mean', 'mode']
     )
 
     fillna_parser.add_argument('-c', '--column', 
@@ -54,6 +66,7 @@ def main():
         metavar='COL', 
         type=str
     )
+    add_fit_arguments(fillna_parser, 'fill values')
 
     # Lệnh xóa các dòng/cột bị thiếu dữ liệu 
     dropna_parser = subparsers.add_parser('dropna', help='Drop column or row with null values')
@@ -73,6 +86,24 @@ def main():
 
     # Lệnh xóa các mẫu trùng lặp 
     uniquefilter_parser = subparsers.add_parser('dropdup', help='Only keep unique rows from the dataframe')
+    uniquefilter_parser.add_argument('-s', '--subset', 
+        help='Only compare these columns when looking for duplicates (default: all columns)', 
+        metavar='COL', 
+        nargs='+', 
+        type=str
+    )
+    uniquefilter_parser.add_argument('-k', '--keep', 
+        help='Which occurrence of a duplicated row to keep (first, last are allowed)', 
+        metavar='KEEP', 
+        type=str, 
+        choices=['first', 'last'], 
+        default='first'
+    )
+    uniquefilter_parser.add_argument('-p', '--partitions', 
+        help='Spill row fingerprints to N temporary partition files instead of keeping all distinct rows in memory', 
+        metavar='N', 
+        type=int
+    )
 
     # Lệnh chuẩn hóa cột 
     normalize_parser = subparsers.add_parser('normalize', help='Normalize a column')
@@ -88,57 +119,196 @@ def main():
         type=str, 
         required=True
     )
+    add_fit_arguments(normalize_parser, 'normalization parameters')
 
     # Tính giá trị của biểu thức 
     evaluate_parser = subparsers.add_parser('evaluate', help='Evaluate a columnar expression')
-    evaluate_parser.add_argument('expression', type=str, help='Expression to evaluate. Tokens MUST be seperated by spaces. Ex: Col1 * Col2 + Col3')
+    evaluate_parser.add_argument('expression', 
+        type=str, 
+        nargs='+', 
+        help='Expressions to evaluate, optionally named as LABEL=EXPRESSION. Tokens MUST be seperated by spaces. ' 
+            'All expressions are computed in one pass and appended as new columns. Ex: "F1=Col1 * Col2 + Col3" "F2=Col1 * Col2 / 2"'
+    )
     evaluate_parser.add_argument('-c', '--column', 
-        help='Specify the output column name',
+        help='Specify the output column name of the unnamed expression (default: out)',
         metavar='COL', 
         type=str, 
     )
+    evaluate_parser.add_argument('--plan-cache', 
+        dest='plan_cache', 
+        help='Load/save parsed and compiled expression plans from/to this file, so formulas reused across runs are only parsed once',
+        metavar='FILE', 
+        type=str
+    )
+
+    # Chạy nhiều bước liên tiếp: chỉ đọc file một lần và ghi file một lần
+    pipeline_parser = subparsers.add_parser('pipeline', help='Run several steps on the data, reading the input and writing the output only once')
+    pipeline_parser.add_argument('-r', '--recipe', 
+        help='JSON file with a list of steps, each written like a subcommand. Ex: ["dropna -a 1", "fillna -m mean", "dropdup"]', 
+        metavar='FILE', 
+        type=str
+    )
+    pipeline_parser.add_argument('-s', '--step', 
+        dest='steps', 
+        help='A step written like a subcommand, may be repeated (run after the steps of the recipe). Ex: -s "normalize -m zscore -c Col1"', 
+        metavar='STEP', 
+        action='append', 
+        default=[]
+    )
 
     parser.add_argument('input', metavar='INPUT', type=str, help='Input filename')
     parser.add_argument('-o', '--out', default=None, metavar='OUTPUT', type=str, help='Output filename')
     parser.add_argument('-v', '--verbose', action='store_true', help='Increase verbosity')
+    parser.add_argument('-cs', '--chunksize', 
+        default=None, 
+        metavar='N', 
+        type=int, 
+        help='Read the input in chunks of N rows with bounded memory (supported by stats, dropna --axis 0, dropdup, normalize, evaluate '
+            'fillna --fit/--apply and pipelines made only of dropna --axis 0, evaluate and --apply steps)'
+    )
+    parser.add_argument('-j', '--jobs', 
+        dest='workers', 
+        default=None, 
+        metavar='N', 
+        type=int, 
+        help='Use N worker processes: the input is parsed in parallel byte ranges, and stats -d/--all and fillna on all columns process columns in parallel'
+    )
+    parser.add_argument('--cache', 
+        default=None, 
+        metavar='DIR', 
+        nargs='?', 
+        const=True, 
+        help='Keep a binary columnar cache of the input (next to the input, or in DIR) and load from it while the input is unchanged'
+    )
+    parser.add_argument('--state', 
+        default=None, 
+        metavar='FILE', 
+        help='Keep the processed byte offset, per-column aggregates and dedup fingerprints of an append-only input in FILE, '
+            'so stats -d/--all, fillna, normalize and dropdup (keep first) only read the rows appended since the last run '
+            '(medians come from a quantile sketch)'
+    )
+    return parser, subparsers
+
+
+def add_fit_arguments(parser, name):
+    """
+    Thêm các tham số --fit/--apply (tách bước tính tham số và bước áp dụng tham số) cho lệnh `parser`
+    """
+    fit_exclusive = parser.add_mutually_exclusive_group()
+    fit_exclusive.add_argument('--fit', 
+        metavar='PARAMS', 
+        type=str, 
+        help='Only compute the %s on the input and save them to the JSON file PARAMS (no output is written)' % name
+    )
+    fit_exclusive.add_argument('--apply', 
+        metavar='PARAMS', 
+        type=str, 
+        help='Apply the %s saved in PARAMS by --fit instead of computing them, streaming the input chunk by chunk' % name
+    )
+
+
+def parse_steps(subparsers, args):
+    """
+    Đọc các bước của pipeline (từ file recipe và các tham số --step).
+    Trả về danh sách (chuỗi mô tả bước, tham số của bước đã được parse)
+    """
+    texts = []
+    if args.recipe is not None:
+        with open(args.recipe, 'rt') as f:
+            texts += json.load(f)
+    texts += args.steps
+
+    steps = []
+    for text in texts:
+        tokens = shlex.split(text)
+        if len(tokens) == 0 or tokens[0] not in subparsers.choices or tokens[0] == 'pipeline':
+            raise AttributeError('Invalid pipeline step: ' + text)
+        step_args = subparsers.choices[tokens[0]].parse_args(tokens[1:])
+        step_args.command = tokens[0]
+        steps.append((text, step_args))
+    return steps
 
+
+def run_pipeline(ctrl, subparsers, args):
+    steps = parse_steps(subparsers, args)
+    if len(steps) == 0:
+        print('No pipeline steps specified')
+        return
+
+    # Nếu tất cả các bước chỉ phụ thuộc vào từng hàng thì xử lý theo từng phần
+    if ctrl.chunksize is not None:
+        row_steps = []
+        for text, step_args in steps:
+            if step_args.command == 'dropna' and step_args.axis == 0:
+                row_steps.append((text, ctrl.dropna_rows_step(step_args.threshold)))
+            elif step_args.command == 'evaluate' and step_args.plan_cache is None:
+                row_steps.append((text, ctrl.evaluate_step(step_args.expression, step_args.column)))
+            elif step_args.command == 'normalize' and step_args.apply is not None:
+                row_steps.append((text, ctrl.normalize_apply_step(step_args.method, step_args.column, step_args.apply)))
+            elif step_args.command == 'fillna' and step_args.apply is not None:
+                row_steps.append((text, ctrl.fillna_apply_step(step_args.method, step_args.column, step_args.apply)))
+        if len(row_steps) == len(steps):
+            ctrl.stream_pipeline(row_steps)
+            return
+        if ctrl.verbose:
+            print('Some steps need the whole dataframe, running the pipeline in memory.')
+
+    ctrl.pipeline([(text, lambda step_args=step_args: run_command(ctrl, step_args)) for text, step_args in steps])
+
+
+def run_command(ctrl, args):
+    """
+    Chạy một lệnh (không phải pipeline) trên controller
+    """
+    if args.command == 'stats':
+        if args.describe:
+            ctrl.describe(args.describe)
+        elif args.describe_all:
+            ctrl.describe()
+        elif args.shape:
+            ctrl.shape()
+        elif args.list_null_columns:
+            # Yêu cầu 1: Đếm các dòng bị thiếu dữ liệu
+            ctrl.list_null_columns()
+        elif args.count_null_rows:
+            # Yêu cầu 2: Liệt kê các cột bị thiếu dữ liệu
+            ctrl.count_null_rows()
+        elif args.list_columns:
+            ctrl.list_columns()
+        else: 
+            print('Invalid action or action not specified')
+        
+    elif args.command == 'fillna':
+        # Yêu cầu 3: Điền giá trị bị thiếu
+        if args.method is None and args.apply is None:
+            raise AttributeError('fillna: -m/--method is required unless --apply is used')
+        ctrl.fillna(args.method, args.column, args.fit, args.apply)
+    elif args.command == 'dropna':
+        # Yêu cầu 4, 5: Xóa các dòng/cột bị thiếu với ngưỡng cho trước
+        ctrl.dropna(args.axis, args.threshold)
+    elif args.command == 'dropdup':
+        # Yêu cầu 6: Xóa các mẫu trùng lặp
+        ctrl.drop_duplicate(args.subset, args.keep, args.partitions)
+    elif args.command == 'normalize':
+        # Yêu cầu 7: Chuẩn hóa một thuộc tính
+        ctrl.normalize(args.method, args.column, args.fit, args.apply)
+    elif args.command == 'evaluate':
+        # Yêu cầu 8: Tính giá trị biểu thức 
+        ctrl.evaluate(args.expression, args.column, args.plan_cache)
+    else: 
+        print('Unknown command:', args.command)
+
+
+def main():
+    parser, subparsers = build_parser()
     args = parser.parse_args()
-    ctrl = Controller(args.input, args.out, args.verbose)
+    ctrl = Controller(args.input, args.out, args.verbose, args.chunksize, args.workers, args.cache, args.state)
 
     try:
-        if args.command == 'stats':
-            if args.describe:
-                ctrl.describe(args.describe)
-            elif args.shape:
-                ctrl.shape()
-            elif args.list_null_columns:
-                # Yêu cầu 1: Đếm các dòng bị thiếu dữ liệu
-                ctrl.list_null_columns()
-            elif args.count_null_rows:
-                # Yêu cầu 2: Liệt kê các cột bị thiếu dữ liệu
-                ctrl.count_null_rows()
-            elif args.list_columns:
-                ctrl.list_columns()
-            else: 
-                print('Invalid action or action not specified')
-            
-        elif args.command == 'fillna':
-            # Yêu cầu 3: Điền giá trị bị thiếu
-            ctrl.fillna(args.method, args.column)
-        elif args.command == 'dropna':
-            # Yêu cầu 4, 5: Xóa các dòng/cột bị thiếu với ngưỡng cho trước
-            ctrl.dropna(args.axis, args.threshold)
-        elif args.command == 'dropdup':
-            # Yêu cầu 6: Xóa các mẫu trùng lặp
-            ctrl.drop_duplicate()
-        elif args.command == 'normalize':
-            # Yêu cầu 7: Chuẩn hóa một thuộc tính
-            ctrl.normalize(args.method, args.column)
-        elif args.command == 'evaluate':
-            # Yêu cầu 8: Tính giá trị biểu thức 
-            ctrl.evaluate(args.expression, args.column)
-        else: 
-            print('Unknown command:', args.command)
+        if args.command == 'pipeline':
+            run_pipeline(ctrl, subparsers, args)
+        else:
+            run_command(ctrl, args)
     except KeyboardInterrupt:
         print('Good bye!')
     except Exception as e:
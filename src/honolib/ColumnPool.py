@@ -0,0 +1,95 @@
+"""
+Module chạy các tác vụ độc lập trên từng cột bằng nhiều tiến trình
+"""
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from honolib.Series import Series
+
+
+class ColumnPool:
+    """
+    Class chia các cột cho `workers` tiến trình, mỗi cột là một tác vụ độc lập.
+    - Cột lưu trong buffer kiểu (int/float, mã của cột phân loại) được chép vào shared memory một lần,
+      tiến trình con đọc thẳng từ shared memory thay vì nhận dữ liệu qua pickle (từ điển của cột phân loại được gửi kèm).
+    - Cột lưu trong list (chuỗi/object) không chia sẻ được nên được xử lý ngay trong tiến trình chính
+      trong lúc các tiến trình con xử lý các cột số.
+    Chỉ kết quả (thường nhỏ: tham số thống kê, giá trị điền, ...) được gửi ngược về qua pickle.
+    Nếu `workers` là None hoặc 1 thì chạy tuần tự trong tiến trình hiện tại.
+    """
+
+    def __init__(self, workers=None):
+        assert workers is None or workers > 0, 'Number of workers must be positive'
+        self.workers = workers
+
+    def map(self, func, columns) -> list:
+        """
+        Trả về danh sách [func(col) for col in columns].
+        `func` phải là hàm ở cấp module (để gửi được sang tiến trình con).
+        """
+        if self.workers is None or self.workers == 1:
+            return [func(col) for col in columns]
+
+        results = [None] * len(columns)
+        blocks = []
+        try:
+            with ProcessPoolExecutor(self.workers) as executor:
+                futures = {}
+                for index, col in enumerate(columns):
+                    if col.is_typed():
+                        block, descriptor = export_column(col)
+                        blocks.append(block)
+                        futures[index] = executor.submit(_run_shared, func, descriptor)
+
+                # Các cột không chia sẻ được thì xử lý ngay trong tiến trình chính
+                for index, col in enumerate(columns):
+                    if index not in futures:
+                        results[index] = func(col)
+
+                for index, future in futures.items():
+                    results[index] = future.result()
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+        return results
+
+
+def export_column(col: Series):
+    """
+    Chép buffer của cột số (hoặc mã của cột phân loại) vào một vùng shared memory.
+    Trả về: vùng shared memory (người gọi phải close/unlink), mô tả để tiến trình con dựng lại cột
+    """
+    rows = col.rows
+    n_rows = len(rows)
+    rows_size = n_rows * rows.itemsize
+    # Mảng đánh dấu ô kiểu int (nếu có) được chép ngay sau mảng đánh dấu hàng hợp lệ
+    has_int_cells = col.int_cells is not None
+    block = SharedMemory(create=True, size=max(1, rows_size + n_rows * (2 if has_int_cells else 1)))
+    block.buf[:rows_size] = memoryview(rows).cast('B')
+    block.buf[rows_size:rows_size + n_rows] = col.valid
+    if has_int_cells:
+        block.buf[rows_size + n_rows:rows_size + 2 * n_rows] = col.int_cells
+    return block, (block.name, rows.typecode, n_rows, col.dtype, col.label, col.categories, has_int_cells)
+
+
+def import_column(descriptor) -> Series:
+    """
+    Dựng lại cột từ mô tả của `export_column` (dữ liệu được chép từ shared memory bằng memcpy, không qua pickle)
+    """
+    name, typecode, n_rows, dtype, label, categories, has_int_cells = descriptor
+    block = SharedMemory(name=name)
+    try:
+        rows = array(typecode)
+        rows_size = n_rows * rows.itemsize
+        rows.frombytes(block.buf[:rows_size])
+        valid = bytearray(block.buf[rows_size:rows_size + n_rows])
+        int_cells = bytearray(block.buf[rows_size + n_rows:rows_size + 2 * n_rows]) if has_int_cells else None
+    finally:
+        block.close()
+    return Series.from_buffer(rows, valid, dtype, label, categories, int_cells)
+
+
+def _run_shared(func, descriptor):
+    # Chạy trong tiến trình con
+    return func(import_column(descriptor))
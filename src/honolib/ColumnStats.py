@@ -0,0 +1,218 @@
+"""
+Module tích lũy tham số thống kê của một cột qua nhiều phần dữ liệu
+"""
+import math
+from honolib.QuantileSketch import QuantileSketch
+from honolib.utils import promote_type, table_mode
+
+_DTYPE_NAMES = {int: 'int', float: 'float', str: 'str', object: 'object'}
+_DTYPES = {name: dtype for dtype, name in _DTYPE_NAMES.items()}
+
+
+class ColumnStats:
+    """
+    Class tích lũy các tham số thống kê (số hàng rỗng, tổng, mean, std, min, max, mode) của một cột
+    khi dữ liệu được đọc theo từng phần (chunk). Bộ nhớ sử dụng không phụ thuộc số hàng
+    (trừ bảng tần suất, chỉ được lưu khi `frequency=True`).
+    Nếu `quantiles=True` thì các giá trị còn được đưa vào một QuantileSketch để ước lượng trung vị/phân vị.
+    Mỗi phần chỉ được duyệt một lần: tất cả các tham số được tính trong cùng một vòng lặp.
+    """
+
+    def __init__(self, label='', frequency=False, quantiles=False):
+        # Tên cột
+        self.label = label
+        # Kiểu dữ liệu của cột sau khi kết hợp tất cả các phần
+        self.dtype: type = None
+        # Tổng số hàng và số hàng rỗng
+        self.length = 0
+        self.null_count = 0
+        # Số hàng không rỗng đã được tích lũy vào các tham số số học bên dưới
+        self.count = 0
+        self._sum = 0
+        self._mean = 0.0
+        # Tổng bình phương độ lệch so với mean (để tính phương sai)
+        self._m2 = 0.0
+        self._min = +math.inf
+        self._max = -math.inf
+        # Bảng tần suất các giá trị (bao gồm None)
+        self.frequency: dict = {} if frequency else None
+        # Sketch ước lượng phân vị
+        self.sketch: QuantileSketch = QuantileSketch() if quantiles else None
+
+    def to_dict(self) -> dict:
+        # Bảng tần suất được lưu thành danh sách cặp [giá trị, số lần] để giữ nguyên kiểu của giá trị (kể cả None)
+        return {
+            'label': self.label,
+            'dtype': _DTYPE_NAMES.get(self.dtype, 'object') if self.dtype is not None else None,
+            'length': self.length,
+            'null_count': self.null_count,
+            'count': self.count,
+            'sum': self._sum,
+            'mean': self._mean,
+            'm2': self._m2,
+            'min': self._min,
+            'max': self._max,
+            'frequency': [[value, count] for value, count in self.frequency.items()] if self.frequency is not None else None,
+            'sketch': self.sketch.to_dict() if self.sketch is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, obj: dict) -> 'ColumnStats':
+        """
+        Dựng lại tham số thống kê từ `to_dict` (vd: sau khi đọc từ file JSON)
+        """
+        stats = cls(obj['label'])
+        stats.dtype = _DTYPES[obj['dtype']] if obj['dtype'] is not None else None
+        stats.length = obj['length']
+        stats.null_count = obj['null_count']
+        stats.count = obj['count']
+        stats._sum = obj['sum']
+        stats._mean = obj['mean']
+        stats._m2 = obj['m2']
+        stats._min = obj['min']
+        stats._max = obj['max']
+        if obj['frequency'] is not None:
+            stats.frequency = {value: count for value, count in obj['frequency']}
+        if obj['sketch'] is not None:
+            stats.sketch = QuantileSketch.from_dict(obj['sketch'])
+        return stats
+
+    def update(self, series):
+        """
+        Tích lũy thêm dữ liệu của một phần của cột (Series)
+        """
+        self.dtype = promote_type(self.dtype, series.dtype)
+        self.length += len(series)
+        null_count = series.count_na()
+        self.null_count += null_count
+
+        frequency = self.frequency
+        if frequency is not None and null_count > 0:
+            frequency[None] = frequency.get(None, 0) + null_count
+
+        if series.dtype not in [int, float]:
+            if frequency is None:
+                return
+            if series.is_categorical():
+                # Cột phân loại: cộng bảng tần suất đã đếm trên mã của cột
+                for value, count in series.frequency_table().items():
+                    if value is not None:
+                        frequency[value] = frequency.get(value, 0) + count
+                return
+            for value in series._non_na_values():
+                frequency[value] = frequency.get(value, 0) + 1
+            return
+
+        # Duyệt một lần: tổng, min, max, bảng tần suất và mean/phương sai theo thuật toán của Welford
+        n = 0
+        s = 0
+        mean = 0.0
+        m2 = 0.0
+        min_value = +math.inf
+        max_value = -math.inf
+        for value in series._non_na_values():
+            n += 1
+            s += value
+            delta = value - mean
+            mean += delta / n
+            m2 += delta * (value - mean)
+            if value < min_value:
+                min_value = value
+            if value > max_value:
+                max_value = value
+            if frequency is not None:
+                frequency[value] = frequency.get(value, 0) + 1
+        if n == 0:
+            return
+        if self.sketch is not None:
+            self.sketch.update(series._non_na_values())
+
+        # Kết hợp mean và phương sai của hai phần dữ liệu (thuật toán song song của Chan)
+        total = self.count + n
+        delta = mean - self._mean
+        self._mean += delta * n / total
+        self._m2 += m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+        self._sum += s
+        self._min = min(self._min, min_value)
+        self._max = max(self._max, max_value)
+
+    def sum(self):
+        if self.dtype not in [int, float]:
+            return None
+        return self._sum
+
+    def mean(self):
+        if self.dtype not in [int, float]:
+            return None
+        # Tính từ tổng (chính xác hơn mean tích lũy, giống `Series.mean`)
+        return self._sum / self.count
+
+    def std(self):
+        if self.dtype not in [int, float]:
+            return None
+        return math.sqrt(self._m2 / self.count)
+
+    def minmax(self):
+        if self.dtype not in [int, float]:
+            return None
+        return self._min, self._max
+
+    def mode(self):
+        return table_mode(self.frequency)
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def quantile(self, q):
+        """
+        Trả về giá trị ước lượng tại phân vị `q` (cần `quantiles=True`)
+        """
+        if self.dtype not in [int, float] or self.sketch is None:
+            return None
+        return self.sketch.quantile(q)
+
+    def normalize_params(self, method='zscore') -> tuple:
+        """
+        Trả về tham số chuẩn hóa của cột (giống `Series.normalize_params`)
+        """
+        assert method in ['zscore', 'minmax'], 'Invalid normalize method'
+        if method == 'zscore':
+            return self.mean(), self.std()
+        return self.minmax()
+
+    def fill_value(self, method):
+        """
+        Trả về giá trị dùng để điền các ô rỗng theo `method` (giống `Series._fill_value`, trung vị là giá trị ước lượng)
+        """
+        if self.dtype not in [int, float]:
+            method = 'mode'
+
+        if method == 'mean':
+            return self.mean()
+        elif method == 'median':
+            return self.median()
+        elif method == 'mode':
+            fill_value, freq = self.mode()
+            return fill_value
+
+    def describe(self, median=None):
+        """
+        Hàm in ra thông tin mô tả của cột (cùng định dạng với `Series.describe`).
+        Nếu không truyền vào trung vị chính xác thì in ra trung vị ước lượng từ sketch (nếu có).
+        """
+        if median is None:
+            median = self.median()
+        rnd = lambda x: round(x, 4) if x is not None else None
+
+        print('Type:            ', self.dtype)
+        print('Length:          ', self.length)
+        print('Null values:     ', self.null_count)
+        print('Label:           ', self.label)
+        print('Sum:             ', rnd(self.sum()))
+        print('Mean:            ', rnd(self.mean()))
+        print('Median:          ', rnd(median))
+        print('Std:             ', rnd(self.std()))
+        print('Min-Max:         ', self.minmax())
+        print('Mode:            ', self.mode())
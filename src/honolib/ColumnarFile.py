@@ -0,0 +1,210 @@
+"""
+Module đọc/ghi dataframe ở định dạng nhị phân theo cột (dùng làm cache cho file CSV)
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from itertools import accumulate
+from honolib.Series import Series
+from honolib.utils import TYPECODES
+
+# Tên của các kiểu dữ liệu khi lưu trong metadata
+_DTYPE_NAMES = {int: 'int', float: 'float', str: 'str', object: 'object'}
+_DTYPES = {name: dtype for dtype, name in _DTYPE_NAMES.items()}
+
+# Kiểu của từng ô trong cột lưu bằng list
+_TAGS = {type(None): 0, int: 1, float: 2, str: 3}
+_PARSERS = {1: int, 2: float, 3: str}
+
+
+class ColumnarFile:
+    """
+    Class đọc/ghi file nhị phân theo cột. Cấu trúc file:
+    - Header: magic (8 byte), version (uint32), độ dài metadata (uint64)
+    - Metadata (JSON): số hàng, file nguồn (đường dẫn, kích thước, thời gian sửa), và với từng cột:
+      tên, kiểu dữ liệu, cách lưu và vị trí các buffer của cột
+    - Các buffer (căn lề 8 byte, vị trí tính từ đầu phần dữ liệu):
+      + Cột số (int/float): buffer của array.array và mảng đánh dấu hàng hợp lệ (1 byte/hàng),
+        cột số thực có ô số nguyên thì có thêm mảng đánh dấu các ô kiểu int (1 byte/hàng)
+      + Cột phân loại: như cột số (buffer chứa mã của từng hàng), kèm từ điển giá trị được mã hóa như cột chuỗi
+      + Cột chuỗi/object: kiểu của từng ô (1 byte/ô), độ dài chuỗi của từng ô (int64) và các chuỗi nối liền (UTF-8)
+    File được đọc bằng mmap, buffer của cột số được chép thẳng vào array.array (không cần đoán kiểu lại)
+    và khi chỉ cần một vài cột thì các cột khác không được đọc.
+    """
+
+    MAGIC = b'HONOCOL\0'
+    VERSION = 3
+    _HEADER = struct.Struct('<8sIQ')
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    @staticmethod
+    def source_key(source) -> dict:
+        """
+        Trả về khóa nhận diện file nguồn: đường dẫn tuyệt đối, kích thước và thời gian sửa đổi
+        """
+        stat = os.stat(source)
+        return {'path': os.path.abspath(source), 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    @staticmethod
+    def cache_filename(source, cache) -> str:
+        """
+        Trả về tên file cache của file CSV `source`
+        - cache = True: file cache nằm cạnh file CSV
+        - cache là đường dẫn thư mục: file cache nằm trong thư mục đó, tên file là giá trị băm của đường dẫn file CSV
+        """
+        if cache is True:
+            return source + '.honocache'
+        digest = hashlib.blake2b(os.path.abspath(source).encode(), digest_size=8).hexdigest()
+        return os.path.join(cache, os.path.basename(source) + '.' + digest + '.honocache')
+
+    def write(self, columns, source=None):
+        """
+        Ghi danh sách các Series ra file (ghi ra file tạm rồi đổi tên để không để lại file ghi dở).
+        Nếu có `source` thì khóa của file nguồn được lưu lại để kiểm tra cache còn hợp lệ hay không.
+        """
+        buffers = []
+        offset = 0
+        metadata = {
+            'n_rows': len(columns[0]) if len(columns) > 0 else 0,
+            'source': self.source_key(source) if source is not None else None,
+            'columns': [],
+        }
+        for col in columns:
+            if col.is_typed():
+                storage = col.rows.typecode
+                parts = {'rows': memoryview(col.rows).cast('B'), 'valid': col.valid}
+                if col.is_categorical():
+                    parts.update(_encode_list(col.categories))
+                if col.int_cells is not None:
+                    parts['int_cells'] = col.int_cells
+            else:
+                storage = 'list'
+                parts = _encode_list(col.rows)
+
+            locations = {}
+            for name, buffer in parts.items():
+                locations[name] = [offset, len(buffer)]
+                padding = -len(buffer) % 8
+                buffers.append(buffer)
+                buffers.append(bytes(padding))
+                offset += len(buffer) + padding
+            metadata['columns'].append({
+                'label': col.label,
+                'dtype': _DTYPE_NAMES.get(col.dtype, 'object') if col.dtype is not None else None,
+                'storage': storage,
+                'buffers': locations,
+            })
+
+        encoded = json.dumps(metadata).encode()
+        encoded += b' ' * (-(self._HEADER.size + len(encoded)) % 8)
+
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, temp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self._HEADER.pack(self.MAGIC, self.VERSION, len(encoded)))
+                f.write(encoded)
+                for buffer in buffers:
+                    f.write(buffer)
+            os.replace(temp_filename, self.filename)
+        except BaseException:
+            os.remove(temp_filename)
+            raise
+
+    def _read_metadata(self, data):
+        """
+        Private: trả về metadata và vị trí bắt đầu phần dữ liệu, None nếu không phải file hợp lệ (hoặc khác version)
+        """
+        if len(data) < self._HEADER.size:
+            return None
+        magic, version, length = self._HEADER.unpack_from(data)
+        if magic != self.MAGIC or version != self.VERSION:
+            return None
+        start = self._HEADER.size + length
+        return json.loads(data[self._HEADER.size:start]), start
+
+    def is_valid_for(self, source) -> bool:
+        """
+        Kiểm tra file có phải là cache còn hợp lệ của file nguồn `source` hay không
+        (cùng version, cùng đường dẫn, kích thước và thời gian sửa đổi của file nguồn)
+        """
+        if not os.path.exists(self.filename):
+            return False
+        with open(self.filename, 'rb') as f:
+            header = f.read(self._HEADER.size)
+            if len(header) < self._HEADER.size:
+                return False
+            magic, version, length = self._HEADER.unpack(header)
+            if magic != self.MAGIC or version != self.VERSION:
+                return False
+            metadata = json.loads(f.read(length))
+        return metadata['source'] == self.source_key(source)
+
+    def read(self, usecols=None) -> list:
+        """
+        Đọc file, trả về danh sách các Series (theo thứ tự lúc ghi).
+        Nếu có `usecols` thì chỉ đọc các cột có tên trong danh sách.
+        """
+        with open(self.filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            result = self._read_metadata(data)
+            if result is None:
+                raise AttributeError('Not a valid columnar file: ' + self.filename)
+            metadata, start = result
+
+            columns = metadata['columns']
+            if usecols is not None:
+                labels = [column['label'] for column in columns]
+                for label in usecols:
+                    if label not in labels:
+                        raise AttributeError('Column not found: ' + label)
+                columns = [column for column in columns if column['label'] in usecols]
+
+            series = []
+            for column in columns:
+                buffer = lambda name: data[start + column['buffers'][name][0]:start + sum(column['buffers'][name])]
+                dtype = _DTYPES[column['dtype']] if column['dtype'] is not None else None
+                if column['storage'] == 'list':
+                    rows = _decode_list(buffer('tags'), buffer('lengths'), buffer('text'))
+                    series.append(Series.from_buffer(rows, None, dtype, column['label']))
+                else:
+                    rows = array(column['storage'])
+                    rows.frombytes(buffer('rows'))
+                    categories = None
+                    if 'tags' in column['buffers']:
+                        categories = _decode_list(buffer('tags'), buffer('lengths'), buffer('text'))
+                    int_cells = bytearray(buffer('int_cells')) if 'int_cells' in column['buffers'] else None
+                    series.append(Series.from_buffer(
+                        rows, bytearray(buffer('valid')), dtype, column['label'], categories, int_cells
+                    ))
+        return series
+
+
+def _encode_list(rows) -> dict:
+    """
+    Mã hóa cột lưu bằng list: kiểu của từng ô, độ dài chuỗi của từng ô và các chuỗi nối liền
+    """
+    tags = bytearray(_TAGS.get(type(row), 3) for row in rows)
+    texts = ['' if row is None else str(row) for row in rows]
+    lengths = array(TYPECODES[int], map(len, texts))
+    return {'tags': tags, 'lengths': memoryview(lengths).cast('B'), 'text': ''.join(texts).encode('utf-8')}
+
+
+def _decode_list(tags, lengths, text) -> list:
+    """
+    Giải mã cột lưu bằng list (ngược lại với `_encode_list`)
+    """
+    sizes = array(TYPECODES[int])
+    sizes.frombytes(lengths)
+    text = text.decode('utf-8')
+    ends = list(accumulate(sizes))
+    starts = [0] + ends[:-1]
+    return [
+        None if tag == 0 else _PARSERS[tag](text[begin:end])
+        for tag, begin, end in zip(tags, starts, ends)
+    ]
@@ -0,0 +1,161 @@
+"""
+Module ghi file CSV kết quả bằng cách sửa trực tiếp trên byte của file gốc
+"""
+from honolib.CsvReader import CsvReader, _ENCODING
+
+
+class CsvPatcher:
+    """
+    Class ghi file kết quả cho các lệnh chỉ đọc/sửa một vài cột (cột được đọc bằng `read_csv(usecols=...)`):
+    - Các cột không bị thay đổi được chép nguyên byte từ file gốc, không cần đoán kiểu hay ghi lại.
+    - Các cột bị thay đổi (`replaced`) được thay bằng giá trị mới, các cột mới (`appended`) được thêm vào cuối.
+    - Nếu có `mask` thì chỉ giữ lại các hàng có mask tương ứng là 1.
+    Các hàng của file gốc được duyệt giống hệt `CsvReader` (bỏ qua dòng trống, hàng thiếu ô được thêm ô rỗng)
+    nên hàng thứ i của file khớp với hàng thứ i của các cột đã đọc: bản ghi có dấu nháy chỉ được chép nguyên byte
+    khi các ô thô khớp đúng với một hàng do csv.reader tách ra, nếu không thì các hàng của bản ghi được ghi lại. Hàng được ghi với dấu xuống dòng
+    '\\r\\n' giống csv.writer (`DataFrame.write_csv`).
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._reader = CsvReader(filename)
+
+    def write(self, output_filename, replaced=None, appended=None, mask=None):
+        """
+        Ghi file kết quả
+        - replaced: danh sách các Series thay thế cột cùng tên trong file gốc
+        - appended: danh sách các Series được thêm vào cuối mỗi hàng
+        - mask: mảng đánh dấu các hàng được giữ lại (None: giữ lại tất cả)
+        """
+        replaced = replaced if replaced is not None else []
+        appended = appended if appended is not None else []
+
+        with self._reader._mapped() as data, open(output_filename, 'wb') as out:
+            if data is None:
+                return
+            header = self._reader._header(data)
+            if header is None:
+                return
+            n_cols = len(header)
+            header_record = self._raw_fields(data[:data.tell()], n_cols)
+            # Các ô của header không nằm trong bản ghi đầu tiên (header có ô trong dấu nháy bị tách dòng) thì ghi lại
+            if header_record is None:
+                header_record = [format_cell(label) for label in header]
+
+            positions = {}
+            for index, label in enumerate(header):
+                positions.setdefault(label, index)
+            for col in replaced:
+                if col.label not in positions:
+                    raise AttributeError('Column not found: ' + col.label)
+            replaced_columns = [(positions[col.label], iter(col)) for col in replaced]
+            appended_columns = [iter(col) for col in appended]
+
+            out.write(b','.join(header_record + [format_cell(col.label) for col in appended]) + b'\r\n')
+
+            row_index = 0
+            for fields in self._rows(data, n_cols):
+                cells = [(index, next(values)) for index, values in replaced_columns]
+                extra = [format_cell(next(values)) for values in appended_columns]
+                keep = mask is None or mask[row_index]
+                row_index += 1
+                if not keep:
+                    continue
+                for index, value in cells:
+                    fields[index] = format_cell(value)
+                out.write(b','.join(fields + extra) + b'\r\n')
+
+            # Số hàng của file phải khớp với số hàng của các cột đã đọc
+            assert mask is None or row_index == len(mask), 'Mask length does not match'
+            for values in [values for index, values in replaced_columns] + appended_columns:
+                assert next(values, _END) is _END, 'Series length does not match'
+
+    def _rows(self, data, n_cols):
+        """
+        Private: generator các hàng (danh sách byte thô của từng ô) từ vị trí hiện tại của `data`
+        """
+        while True:
+            record = self._reader._next_record(data)
+            if record is None:
+                return
+            fields = self._raw_fields(record, n_cols)
+            if fields is not None:
+                if len(fields) > 0:
+                    yield fields
+                continue
+
+            # Bản ghi không phải đúng một hàng của csv.reader (dấu \r đứng riêng, dấu nháy lẻ ở giữa ô, ...): ghi lại từng hàng
+            for row in self._reader._parse_record(record):
+                if len(row) == 0:
+                    continue
+                row = row[:n_cols] + [None] * (n_cols - len(row))
+                yield [format_cell(cell) for cell in row]
+
+    @staticmethod
+    def _raw_fields(record, n_cols):
+        """
+        Private: tách bản ghi thành byte thô của từng ô (giữ nguyên dấu nháy), cắt/thêm ô cho đủ `n_cols` ô.
+        Trả về [] nếu là dòng trống, None nếu bản ghi không phải là đúng một hàng.
+        """
+        line = record
+        if line.endswith(b'\n'):
+            line = line[:-1]
+        if line.endswith(b'\r'):
+            line = line[:-1]
+        if len(line) == 0:
+            return []
+
+        if b'"' not in line:
+            if b'\r' in line:
+                return None
+            fields = line.split(b',')
+        else:
+            # Chỉ dùng các ô thô khi chúng khớp đúng với hàng duy nhất do csv.reader (CsvReader) tách ra
+            rows = CsvReader._parse_record(record)
+            if len(rows) != 1:
+                return None
+            # Ghép lại các phần bị tách tại dấu phẩy nằm trong dấu nháy (đếm dấu nháy trên từng phần mới)
+            fields = []
+            pending = []
+            quotes = 0
+            for part in line.split(b','):
+                pending.append(part)
+                quotes += part.count(b'"')
+                if quotes % 2 == 0:
+                    fields.append(b','.join(pending))
+                    pending = []
+                    quotes = 0
+            if len(pending) > 0:
+                fields.append(b','.join(pending))
+            if [_unquote(field) for field in fields] != rows[0]:
+                return None
+
+        if len(fields) < n_cols:
+            fields += [b''] * (n_cols - len(fields))
+        return fields[:n_cols]
+
+
+# Đánh dấu iterator đã hết phần tử
+_END = object()
+
+
+def _unquote(field) -> str:
+    """
+    Private: giá trị của một ô thô (bỏ dấu nháy bao quanh, '""' thành '"')
+    """
+    text = field.decode(_ENCODING)
+    if len(text) >= 2 and text.startswith('"') and text.endswith('"'):
+        return text[1:-1].replace('""', '"')
+    return text
+
+
+def format_cell(value) -> bytes:
+    """
+    Định dạng một ô giống csv.writer (QUOTE_MINIMAL): None là ô rỗng, ô có dấu phẩy/nháy/xuống dòng được đặt trong dấu nháy
+    """
+    if value is None:
+        return b''
+    text = str(value)
+    if ',' in text or '"' in text or '\r' in text or '\n' in text:
+        text = '"' + text.replace('"', '""') + '"'
+    return text.encode(_ENCODING)
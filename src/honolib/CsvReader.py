@@ -0,0 +1,461 @@
+"""
+Module đọc file CSV theo cột
+"""
+import contextlib
+import csv
+import io
+import locale
+import mmap
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress, islice
+from honolib.Series import Series, TYPECODES
+from honolib.utils import EXACT_INT, INT_PATTERN, promote_type, infer_column_type, convert_cells, has_inexact_ints
+
+
+class ColumnBuilder:
+    """
+    Class xây dựng dữ liệu của một cột trong lúc đọc CSV.
+    Dữ liệu được đưa vào theo từng khối ô: kiểu dữ liệu được đoán trên cả khối (`infer_column_type`)
+    và cả khối được chuyển kiểu rồi ghi thẳng vào buffer kiểu của cột (`convert_cells`).
+    """
+
+    def __init__(self, label, dtype=None):
+        # Tên cột
+        self.label = label
+        # Kiểu dữ liệu do người dùng chỉ định (bỏ qua việc đoán kiểu), None nếu cần đoán kiểu
+        self.fixed_dtype: type = dtype
+        # Kiểu dữ liệu của cột, quy tắc nâng kiểu giống `Series._process_col_type`
+        self.dtype: type = dtype
+        # Buffer của cột: array.array khi cột còn là số, list khi cột là chuỗi/object
+        self.rows = array(TYPECODES[int]) if dtype in (None, int) else array(TYPECODES[float]) if dtype is float else []
+        # Mảng đánh dấu hàng hợp lệ (None khi cột đã chuyển sang list)
+        self.valid = bytearray() if isinstance(self.rows, array) else None
+        # Đánh dấu các ô số nguyên trong buffer số thực (chỉ dùng khi cột int bị nâng lên float).
+        # Nếu sau đó cột trở thành object thì các ô này được trả lại kiểu int như khi đọc bằng Series.
+        self.int_cells: bytearray = None
+
+    def extend(self, cells):
+        """
+        Thêm một khối ô (dạng chuỗi, ô rỗng là None hoặc '') vào cuối cột
+        """
+        if self.fixed_dtype is not None:
+            self._extend_as(cells, self.fixed_dtype)
+            return
+
+        # Cột đã là object thì không cần đoán kiểu nữa
+        block_dtype = object if self.dtype is object else infer_column_type(cells)
+        self.dtype = promote_type(self.dtype, block_dtype)
+        self._extend_as(cells, self.dtype)
+
+    def _extend_as(self, cells, dtype):
+        """
+        Private: chuyển khối ô sang kiểu `dtype` (kiểu của cả cột sau khi thêm khối) và ghi vào buffer
+        """
+        if dtype is None:
+            # Khối toàn ô rỗng
+            if self.valid is None:
+                self.rows.extend([None] * len(cells))
+            else:
+                self.rows.extend([0] * len(cells))
+                self.valid.extend(bytes(len(cells)))
+                if self.int_cells is not None:
+                    self.int_cells.extend(bytes(len(cells)))
+            return
+
+        if dtype not in TYPECODES:
+            self._to_list()
+            self.rows.extend(convert_cells(cells, dtype)[0])
+            return
+
+        if dtype is float and self.valid is not None and self.rows.typecode == TYPECODES[int]:
+            self._promote_float()
+
+        int_cells = None
+        if dtype is float and self.fixed_dtype is None:
+            # Đánh dấu các ô số nguyên trong khối
+            int_cells = bytearray(map(bool, map(INT_PATTERN.match, [cell if cell else '' for cell in cells])))
+            # Số nguyên lớn không giữ được chính xác trong buffer số thực -> lưu bằng list
+            if int_cells.count(1) > 0 and has_inexact_ints(compress(cells, int_cells)):
+                self._to_list()
+
+        rows, valid = convert_cells(cells, dtype)
+        if valid is None or self.valid is None:
+            # Số nguyên vượt quá 64 bit -> lưu bằng list, mỗi ô giữ kiểu riêng của ô đó
+            self._to_list()
+            self.rows.extend(convert_cells(cells, object)[0] if self.fixed_dtype is None else rows)
+            return
+
+        if int_cells is not None:
+            if self.int_cells is None and int_cells.count(1) > 0:
+                self.int_cells = bytearray(len(self.rows))
+            if self.int_cells is not None:
+                self.int_cells.extend(int_cells)
+        elif self.int_cells is not None:
+            self.int_cells.extend(bytes(len(cells)))
+
+        self.rows.extend(rows)
+        self.valid.extend(valid)
+
+    def _promote_float(self):
+        """
+        Private: nâng buffer số nguyên lên buffer số thực
+        """
+        # Số nguyên lớn không giữ được chính xác trong buffer số thực -> lưu bằng list
+        if len(self.rows) > 0 and max(abs(max(self.rows)), abs(min(self.rows))) > EXACT_INT:
+            self._to_list()
+            return
+        self.rows = array(TYPECODES[float], self.rows)
+        # Tất cả các ô hợp lệ trước đó đều là số nguyên
+        self.int_cells = bytearray(self.valid)
+
+    def _to_list(self):
+        """
+        Private: chuyển buffer kiểu sang list (hàng rỗng là None)
+        """
+        if self.valid is None:
+            return
+        if self.int_cells is None:
+            self.rows = [row if ok else None for row, ok in zip(self.rows, self.valid)]
+        else:
+            self.rows = [
+                (int(row) if is_int else row) if ok else None
+                for row, ok, is_int in zip(self.rows, self.valid, self.int_cells)
+            ]
+        self.valid = None
+        self.int_cells = None
+
+    def merge(self, other):
+        """
+        Nối dữ liệu của một ColumnBuilder khác (phần tiếp theo của cùng cột) vào cuối cột này.
+        Kiểu dữ liệu được kết hợp như khi đọc tuần tự: int + float -> float, khác nhau -> object.
+        """
+        if self.fixed_dtype is None:
+            self.dtype = promote_type(self.dtype, other.dtype)
+        self._coerce(self.dtype)
+        other._coerce(self.dtype)
+
+        if self.valid is None or other.valid is None:
+            # Một trong hai phần đang lưu bằng list (cột chuỗi/object hoặc số nguyên vượt quá 64 bit)
+            self._to_list()
+            other._to_list()
+            self.rows.extend(other.rows)
+            return
+
+        if self.int_cells is not None or other.int_cells is not None:
+            self.int_cells = (self.int_cells if self.int_cells is not None else bytearray(len(self.rows))) + \
+                (other.int_cells if other.int_cells is not None else bytearray(len(other.rows)))
+        self.rows.extend(other.rows)
+        self.valid.extend(other.valid)
+
+    def _coerce(self, dtype):
+        """
+        Private: chuyển buffer sang dạng lưu trữ của kiểu `dtype` (kiểu đã kết hợp của cả cột)
+        """
+        if dtype is float and self.valid is not None and self.rows.typecode == TYPECODES[int]:
+            self._promote_float()
+        elif dtype not in TYPECODES and dtype is not None:
+            self._to_list()
+
+    def to_series(self) -> Series:
+        """
+        Tạo Series từ dữ liệu đã đọc
+        """
+        # Cột toàn ô rỗng thì lưu bằng list như cột không xác định được kiểu
+        if self.dtype is None:
+            self._to_list()
+        int_cells = self.int_cells if self.valid is not None and self.rows.typecode == TYPECODES[float] else None
+        series = Series.from_buffer(self.rows, self.valid, self.dtype, self.label, int_cells=int_cells)
+        # Cột chuỗi có ít giá trị phân biệt thì mã hóa thành cột phân loại.
+        # Cột số đã chuyển sang list (số nguyên vượt quá 64 bit hoặc không lưu chính xác được trong buffer số thực)
+        # thì giữ nguyên list, không chuyển lại sang buffer kiểu.
+        if self.dtype is str:
+            series._to_categorical()
+        return series
+
+
+class CsvReader:
+    """
+    Class đọc file CSV theo vị trí cột. File được ánh xạ vào bộ nhớ (mmap) và được quét trên byte thô:
+    bản ghi không có dấu nháy kép được tách ô trực tiếp theo dấu phẩy, chỉ các bản ghi có dấu nháy
+    mới cần đến csv.reader. Nếu có `usecols` thì chỉ các ô của các cột đó được giải mã thành chuỗi.
+    Các hàng được gom thành từng khối, mỗi khối được chuyển vị (zip) thành các cột
+    rồi việc phát hiện ô rỗng và đoán kiểu dữ liệu được làm trên cả khối của từng cột.
+    Với file lớn, phần dữ liệu có thể được chia thành nhiều khoảng byte (bắt đầu tại đầu một bản ghi)
+    và mỗi khoảng được đọc trong một tiến trình riêng (`read(workers=N)`).
+    """
+
+    # Số hàng của một khối
+    BLOCK_SIZE = 4096
+
+    def __init__(self, filename, dtypes=None, usecols=None):
+        self.filename = filename
+        # {tên cột: kiểu dữ liệu} do người dùng chỉ định, các cột này không cần đoán kiểu
+        self.dtypes = dtypes if dtypes is not None else {}
+        # Danh sách tên các cột cần đọc (None: đọc tất cả các cột), các cột được trả về theo thứ tự trong file
+        self.usecols = usecols
+
+    def read(self, workers=None) -> list:
+        """
+        Đọc toàn bộ file, trả về danh sách các Series theo thứ tự cột trong file
+        - workers: số tiến trình đọc song song các khoảng của file (None: đọc tuần tự)
+        """
+        if workers is not None and workers > 1:
+            return self._read_parallel(workers)
+        for columns in self.read_chunks(None):
+            return columns
+        return []
+
+    def _new_builders(self, labels) -> list:
+        return [ColumnBuilder(label, self.dtypes.get(label)) for label in labels]
+
+    def _projection(self, header):
+        """
+        Private: trả về vị trí các cột cần đọc (None: tất cả các cột)
+        """
+        if self.usecols is None:
+            return None
+        for label in self.usecols:
+            if label not in header:
+                raise AttributeError('Column not found: ' + label)
+        usecols = set(self.usecols)
+        return [index for index, label in enumerate(header) if label in usecols]
+
+    @staticmethod
+    def _flush(builders, block):
+        """
+        Private: đưa một khối hàng vào các cột
+        """
+        for builder, cells in zip(builders, zip(*block)):
+            builder.extend(cells)
+
+    @contextlib.contextmanager
+    def _mapped(self):
+        """
+        Private: ánh xạ file vào bộ nhớ (None nếu file rỗng)
+        """
+        with open(self.filename, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield None
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+    @staticmethod
+    def _next_record(data):
+        """
+        Private: đọc byte thô của bản ghi tiếp theo (một bản ghi có thể gồm nhiều dòng nếu có ô trong dấu nháy
+        chứa dấu xuống dòng). Trả về None khi hết file.
+        """
+        line = data.readline()
+        if len(line) == 0:
+            return None
+        if b'"' not in line:
+            return line
+
+        # Đếm dấu nháy trên từng dòng mới đọc (không quét lại cả bản ghi), các dòng được nối một lần ở cuối
+        quotes = line.count(b'"')
+        if quotes % 2 == 0:
+            return line
+        parts = [line]
+        while quotes % 2 == 1:
+            more = data.readline()
+            if len(more) == 0:
+                break
+            quotes += more.count(b'"')
+            parts.append(more)
+        return b''.join(parts)
+
+    @staticmethod
+    def _parse_record(record) -> list:
+        """
+        Private: tách bản ghi có dấu nháy (hoặc dấu \\r đứng riêng) bằng csv.reader.
+        Trả về danh sách các hàng (có thể rỗng nếu là dòng trống)
+        """
+        return list(csv.reader(io.StringIO(record.decode(_ENCODING), newline='')))
+
+    def _header(self, data):
+        """
+        Private: đọc header tại vị trí hiện tại của `data`, trả về None nếu file không có header
+        """
+        record = self._next_record(data)
+        if record is None:
+            return None
+        rows = self._parse_record(record)
+        return rows[0] if len(rows) > 0 else []
+
+    def _records(self, data, end, n_cols, indices):
+        """
+        Private: generator các hàng dữ liệu từ vị trí hiện tại của `data` đến vị trí `end`.
+        Bỏ qua dòng trống (giống csv.DictReader), thêm ô rỗng vào các hàng thiếu ô
+        và chỉ giữ lại các ô tại vị trí `indices` (None: tất cả các ô).
+        """
+        while data.tell() < end:
+            record = self._next_record(data)
+            if record is None:
+                return
+
+            line = record
+            if line.endswith(b'\n'):
+                line = line[:-1]
+            if line.endswith(b'\r'):
+                line = line[:-1]
+
+            if b'"' in line or b'\r' in line:
+                # Bản ghi có dấu nháy: để csv.reader xử lý
+                for row in self._parse_record(record):
+                    if len(row) == 0:
+                        continue
+                    if len(row) < n_cols:
+                        row = row + [None] * (n_cols - len(row))
+                    yield row if indices is None else [row[i] for i in indices]
+                continue
+
+            # Bản ghi không có dấu nháy: tách ô trực tiếp trên byte thô
+            if len(line) == 0:
+                continue
+            if indices is None:
+                row = line.decode(_ENCODING).split(',')
+                if len(row) < n_cols:
+                    row = row + [None] * (n_cols - len(row))
+                yield row
+            else:
+                cells = line.split(b',')
+                yield [cells[i].decode(_ENCODING) if i < len(cells) else None for i in indices]
+
+    def read_chunks(self, chunksize, start=None, end=None):
+        """
+        Generator đọc file theo từng phần, mỗi phần tối đa `chunksize` hàng.
+        Mỗi lần trả về danh sách các Series của phần đó (kiểu dữ liệu được đoán riêng trên từng phần).
+        Nếu `chunksize` là None thì đọc toàn bộ file thành một phần.
+        Nếu có `start`/`end` thì chỉ đọc các bản ghi trong khoảng byte [start, end) (`start` là đầu một bản ghi,
+        mặc định: ngay sau header đến cuối file).
+        """
+        with self._mapped() as data:
+            if data is None:
+                return
+            header = self._header(data)
+            if header is None:
+                return
+            if start is not None:
+                data.seek(start)
+            end = len(data) if end is None else min(end, len(data))
+            indices = self._projection(header)
+            labels = header if indices is None else [header[i] for i in indices]
+            builders = self._new_builders(labels)
+            block = []
+            n_rows = 0
+            n_chunks = 0
+
+            for row in self._records(data, end, len(header), indices):
+                block.append(row)
+                n_rows += 1
+
+                if len(block) == self.BLOCK_SIZE or n_rows == chunksize:
+                    self._flush(builders, block)
+                    block = []
+                if n_rows == chunksize:
+                    yield [builder.to_series() for builder in builders]
+                    builders = self._new_builders(labels)
+                    n_rows = 0
+                    n_chunks += 1
+
+            self._flush(builders, block)
+            # Phần cuối cùng (file chỉ có header thì vẫn trả về một phần rỗng)
+            if n_rows > 0 or n_chunks == 0:
+                yield [builder.to_series() for builder in builders]
+
+    def split_ranges(self, n_ranges):
+        """
+        Chia phần dữ liệu của file thành tối đa `n_ranges` khoảng byte có kích thước gần bằng nhau,
+        mỗi khoảng bắt đầu tại đầu một bản ghi.
+        Một dấu xuống dòng là ranh giới giữa hai bản ghi khi và chỉ khi số dấu nháy kép đứng trước nó
+        (tính từ một ranh giới đã biết) là số chẵn, nên các ô có xuống dòng bên trong dấu nháy không bị cắt đôi.
+        Trả về: header (None nếu file rỗng), danh sách các khoảng (start, end)
+        """
+        with self._mapped() as data:
+            if data is None:
+                return None, []
+            header = self._header(data)
+            header_end = data.tell()
+            size = len(data)
+
+            boundaries = [header_end]
+            for i in range(1, n_ranges):
+                target = header_end + (size - header_end) * i // n_ranges
+                if target <= boundaries[-1]:
+                    continue
+                boundary = _next_record_boundary(data, boundaries[-1], target)
+                if boundary >= size:
+                    break
+                boundaries.append(boundary)
+            boundaries.append(size)
+
+        ranges = [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+        return header, ranges
+
+    def read_range(self, header, start, end) -> list:
+        """
+        Đọc các bản ghi trong khoảng byte [start, end) của file (khoảng do `split_ranges` trả về).
+        Trả về danh sách ColumnBuilder của khoảng đó (dùng `ColumnBuilder.merge` để nối các khoảng)
+        """
+        indices = self._projection(header)
+        builders = self._new_builders(header if indices is None else [header[i] for i in indices])
+        with self._mapped() as data:
+            data.seek(start)
+            rows = self._records(data, end, len(header), indices)
+            while True:
+                block = list(islice(rows, self.BLOCK_SIZE))
+                if len(block) == 0:
+                    break
+                self._flush(builders, block)
+        return builders
+
+    def _read_parallel(self, workers) -> list:
+        """
+        Private: đọc các khoảng của file song song, sau đó nối các cột theo thứ tự các khoảng
+        (kiểu dữ liệu của các khoảng được kết hợp theo quy tắc của `promote_type`)
+        """
+        # Chia nhiều khoảng hơn số tiến trình để cân bằng tải
+        header, ranges = self.split_ranges(workers * 4)
+        if header is None:
+            return []
+        indices = self._projection(header)
+        builders = self._new_builders(header if indices is None else [header[i] for i in indices])
+
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [
+                executor.submit(_read_range, self.filename, self.dtypes, self.usecols, header, start, end)
+                for start, end in ranges
+            ]
+            for future in futures:
+                for builder, other in zip(builders, future.result()):
+                    builder.merge(other)
+        return [builder.to_series() for builder in builders]
+
+
+# Bảng mã mặc định khi mở file ở chế độ văn bản (giống `open`)
+_ENCODING = locale.getpreferredencoding(False)
+
+
+def _next_record_boundary(data, start, target) -> int:
+    """
+    Trả về vị trí ngay sau dấu xuống dòng đầu tiên kể từ `target` mà không nằm trong dấu nháy kép
+    (vị trí `start` phải là đầu một bản ghi). Không tìm thấy thì trả về cuối file.
+    """
+    parity = data[start:target].count(b'"') % 2
+    position = target
+    while True:
+        newline = data.find(b'\n', position)
+        if newline == -1:
+            return len(data)
+        parity = (parity + data[position:newline].count(b'"')) % 2
+        if parity == 0:
+            return newline + 1
+        position = newline + 1
+
+
+def _read_range(filename, dtypes, usecols, header, start, end):
+    # Chạy trong tiến trình con
+    return CsvReader(filename, dtypes, usecols).read_range(header, start, end)
@@ -1,30 +1,63 @@
 import csv
+import os
 import re
 import math 
-import copy
+from functools import partial
+from itertools import islice
 from honolib.Series import Series
+from honolib.CsvReader import CsvReader
+from honolib.Deduplicator import Deduplicator
+from honolib.ColumnPool import ColumnPool
+from honolib.ColumnarFile import ColumnarFile
+from honolib.utils import unpack_bits, bitsliced_add, bitsliced_at_least
 
 class DataFrame:
     def __init__(self):
         self._columns = []
+        # Chỉ mục tên cột -> vị trí cột trong `_columns` (để tra cứu cột trong O(1))
+        self._index = {}
+        # Số ô rỗng của từng hàng đã tính (bộ đếm theo lát bit), kèm các cột và phiên bản (`Series.version`) của chúng lúc tính
+        self._row_na_cache = None
     
     def count_na(self):
         """
         Hàm in ra số lượng phần tử rỗng trên từng cột và lấy tổng
         """
-        
-        sum_count = 0
-        counter = {col.label: col.count_na() for col in self._columns}
-        
-        # Độ rộng lớn nhất của các label (để format cho đẹp)
-        max_label_width = max([len(label) for label in counter])
+        print_na_counts(self.count_na_columns())
 
-        for label, null_count in counter.items():
-            if null_count > 0:
-                print(label.ljust(max_label_width), '\t', null_count)
-        
-        print('\nTotal null values:', sum(counter.values()))
+    def count_na_columns(self) -> dict:
+        """
+        Trả về số lượng phần tử rỗng trên từng cột dưới dạng {tên cột: số phần tử rỗng}
+        """
+        return {col.label: col.count_na() for col in self._columns}
     
+    def describe(self, labels=None, workers=None):
+        """
+        Hàm in ra thông tin mô tả của các cột `labels` (mặc định: tất cả các cột).
+        Mỗi cột được duyệt một lần để tính tất cả các tham số thống kê.
+        - workers: số tiến trình tính song song trên các cột (None: tính tuần tự)
+        """
+        columns = self._columns if labels is None else [self.get_column(label) for label in labels]
+        summaries = ColumnPool(workers).map(_column_summary, columns)
+        for index, (stats, median) in enumerate(summaries):
+            if index > 0:
+                print()
+            stats.describe(median=median)
+
+    def fill_na(self, method='mean', verbose=False, workers=None, fill_values=None):
+        """
+        Điền giá trị rỗng cho tất cả các cột (xem `Series.fill_na`).
+        - workers: số tiến trình tính song song giá trị điền của các cột (None: tính tuần tự)
+        - fill_values: {tên cột: giá trị điền} đã được tính trước (vd: từ IncrementalState), cột không có thì tự tính
+        """
+        fill_values = fill_values if fill_values is not None else {}
+        columns = [col for col in self._columns if col.count_na() > 0 and fill_values.get(col.label) is None]
+        computed = ColumnPool(workers).map(partial(_column_fill_value, method=method), columns)
+        computed = {id(col): value for col, value in zip(columns, computed)}
+        for col in self._columns:
+            fill_value = computed.get(id(col), fill_values.get(col.label))
+            col.fill_na(method=method, verbose=verbose, fill_value=fill_value)
+
     def shape(self) -> tuple:
         """
         Trả về kích thước (hàng, cột) của dataframe
@@ -61,16 +94,16 @@ class DataFrame:
         assert len(obj) == shape[1], 'Input array length and dataframe width does not match'
 
         for index, col in enumerate(self._columns):
-            col.rows.append(obj[index])
+            col.append(obj[index])
         
     def get_column(self, label) -> Series:
         """
         Lấy ra tham chiếu tới một cột từ tên cột `label`.
         """
-        for col in self._columns:
-            if col.label == label:
-                return col 
-        raise AttributeError('Column not found: ' + label)
+        col = self._lookup(label)
+        if col is None:
+            raise AttributeError('Column not found: ' + label)
+        return col
     
     def set_column(self, label: str, obj: Series):
         """
@@ -78,11 +111,10 @@ class DataFrame:
         """
         assert len(obj) == self.shape()[0], 'Length mismatch'
 
-        for col in self._columns:
-            if col.label == label:
-                col.rows = obj
-                return 
-        raise AttributeError('Column not found')
+        if self._lookup(label) is None:
+            raise AttributeError('Column not found')
+        obj.label = label
+        self._columns[self._index[label]] = obj
     
     def append_column(self, obj: Series):
         """
@@ -92,13 +124,69 @@ class DataFrame:
         assert type(obj) == Series
         assert n_rows == 0 or len(obj) == n_rows
         self._columns.append(obj)
+        # Nếu trùng tên cột thì giữ vị trí của cột đầu tiên (giống như khi tìm tuần tự)
+        self._index.setdefault(obj.label, len(self._columns) - 1)
+
+    def select(self, labels) -> 'DataFrame':
+        """
+        Trả về DataFrame chỉ gồm các cột `labels` (theo thứ tự của `labels`).
+        Dữ liệu của các cột không bị sao chép: DataFrame mới dùng chung các object Series với DataFrame này.
+        """
+        df = DataFrame()
+        for label in labels:
+            df.append_column(self.get_column(label))
+        return df
+
+    def _lookup(self, label) -> Series:
+        """
+        Private: tra cứu cột theo tên bằng chỉ mục, trả về None nếu không có.
+        Nếu chỉ mục bị lệch (vd: tên cột bị đổi sau khi thêm vào bảng) thì dựng lại chỉ mục và tra lại.
+        """
+        pos = self._index.get(label)
+        if pos is not None and pos < len(self._columns) and self._columns[pos].label == label:
+            return self._columns[pos]
+        self._rebuild_index()
+        pos = self._index.get(label)
+        return self._columns[pos] if pos is not None else None
+
+    def _rebuild_index(self):
+        """
+        Private: dựng lại chỉ mục tên cột sau khi danh sách cột bị thay đổi
+        """
+        self._index = {}
+        for pos, col in enumerate(self._columns):
+            self._index.setdefault(col.label, pos)
+
+    def _set_columns(self, columns: list):
+        """
+        Private: thay toàn bộ danh sách cột và dựng lại chỉ mục
+        """
+        self._columns = columns
+        self._rebuild_index()
 
     def delete_row(self, index):
         """
         Hàm xóa hàng tại vị trí `index` khỏi bảng.
+        Nếu `index` là danh sách các vị trí thì xóa tất cả các hàng đó (mỗi cột chỉ được dựng lại một lần).
         """
+        if isinstance(index, int):
+            for col in self._columns:
+                del col[index]
+            return
+
+        mask = bytearray([1]) * self.shape()[0]
+        for i in index:
+            mask[i] = 0
+        self._set_columns(self.filter(mask)._columns)
+
+    def filter(self, mask):
+        """
+        Trả về DataFrame mới chỉ gồm các hàng có `mask` tương ứng là True (mask có độ dài bằng số hàng)
+        """
+        df = DataFrame()
         for col in self._columns:
-            del col[index]
+            df.append_column(col.filter(mask))
+        return df
     
     def iterrows(self) -> list:
         """
@@ -118,53 +206,64 @@ class DataFrame:
     
     def count_na_rows(self) -> int:
         """
-        Trả về số lượng hàng bị thiếu dữ liệu (hàng mà có ít nhất 1 cột bị thiếu).
+        Trả về số lượng hàng bị thiếu dữ liệu (hàng mà có ít nhất 1 cột bị thiếu):
+        OR bitmap hàng rỗng của các cột rồi đếm số bit 1.
         """
-        count = 0
-        for row in self.iterrows():
-            for cell in row:
-                if cell is None:
-                    count += 1 
-                    break
-        return count
+        bitmap = 0
+        for col in self._columns:
+            bitmap |= col.null_bitmap()
+        return bitmap.bit_count()
+
+    def _row_na_counters(self) -> list:
+        """
+        Private: trả về số ô rỗng của từng hàng dưới dạng bộ đếm theo lát bit (xem `bitsliced_add`),
+        được tính bằng cách cộng bitmap hàng rỗng của các cột (không dựng lại từng hàng).
+        Kết quả được lưu lại cho đến khi có cột bị thay đổi hoặc danh sách cột thay đổi.
+        """
+        columns = tuple(self._columns)
+        versions = tuple(col.version for col in columns)
+        if self._row_na_cache is not None:
+            cached_columns, cached_versions, counters = self._row_na_cache
+            if versions == cached_versions and all(a is b for a, b in zip(columns, cached_columns)):
+                return counters
+
+        counters = []
+        for col in self._columns:
+            bitsliced_add(counters, col.null_bitmap())
+        self._row_na_cache = (columns, versions, counters)
+        return counters
 
     def __auto_drop_row(self, threshold):
         """
         Private: hàm drop các hàng với tỉ lệ null cho trước
         """
         n_rows, n_cols = self.shape()
-        idx = 0
-
-        while idx < n_rows:
-            row = self.get_row(idx)
-            # Đếm số lượng cột null
-            count_null = 0
-            for col in row:
-                if col is None: 
-                    count_null += 1
-            null_perc = count_null / n_cols
-
-            # Drop hàng nếu tỉ lệ >= threshold
-            if null_perc >= threshold:
-                self.delete_row(idx)
-                n_rows -= 1
-            else: 
-                idx += 1
+        if n_cols == 0:
+            return
+
+        # Số ô rỗng nhỏ nhất để hàng bị xóa (hàng được giữ lại khi tỉ lệ null < threshold)
+        limit = next((k for k in range(n_cols + 1) if not k / n_cols < threshold), None)
+        if limit is None:
+            return
+        dropped = bitsliced_at_least(self._row_na_counters(), limit, n_rows)
+        if dropped == 0:
+            return
+        mask = unpack_bits(~dropped, n_rows)
+        self._set_columns(self.filter(mask)._columns)
 
     def __auto_drop_col(self, threshold):
         """
         Private: hàm drop các cột với tỉ lệ null cho trước
         """
-        idx = 0 
-        while idx < len(self._columns):
-            col = self._columns[idx]
+        columns = []
+        for col in self._columns:
             # Tính tỉ lệ null
             null_perc = col.count_na() / len(col)
             if null_perc >= threshold:
                 print('Deleted "', col.label, '"; Null = ', null_perc * 100, '%', sep='')
-                del self._columns[idx]
             else: 
-                idx += 1
+                columns.append(col)
+        self._set_columns(columns)
     
     def drop_na(self, axis=0, threshold=0.5):
         """
@@ -180,71 +279,194 @@ class DataFrame:
         else: 
             raise AttributeError('Invalid axis. Only accept 0 or 1')
     
-    def drop_duplicate(self):
+    def drop_duplicate(self, subset=None, keep='first', partitions=None):
         """
         Hàm xóa các hàng trùng lặp
+        - subset: danh sách tên các cột dùng để so sánh (mặc định: tất cả các cột)
+        - keep: 'first' giữ lại hàng xuất hiện đầu tiên, 'last' giữ lại hàng xuất hiện cuối cùng
+        - partitions: số phân vùng ghi ra đĩa khi tập các hàng phân biệt không vừa bộ nhớ (xem `Deduplicator`)
         Trả về: DataFrame chứa các hàng không trùng
         """
-        # Lặp qua tất cả các hàng và xây dựng danh sách các hàng không trùng lặp
-        duplicate_count = 0
-        unique_rows = [] 
-        for row in self.iterrows():
-            # Drop cột chứa index và chuyển thành tuple (immutable thì dùng toán tử in mới chính xác)
-            row = tuple(row[1:])
-            if row not in unique_rows:
-                unique_rows.append(row)
-            else:
-                duplicate_count += 1
-        
-        # Dựng lại dataframe mới 
+        mask = self._duplicate_mask(subset, keep, partitions)
+        # Dựng lại dataframe mới, mỗi cột được dựng một lần
+        return self.filter(mask)
+
+    def _duplicate_mask(self, subset=None, keep='first', partitions=None) -> bytearray:
+        """
+        Private: trả về mảng đánh dấu các hàng được giữ lại khi xóa hàng trùng lặp (xem `drop_duplicate`)
+        """
+        if subset is None:
+            columns = self._columns
+        else:
+            columns = [self.get_column(label) for label in subset]
+
+        # Mỗi hàng được tra trong bảng băm một lần (cột phân loại dùng mã thay vì chuỗi làm khóa)
+        dedup = Deduplicator(keep=keep, partitions=partitions)
+        for row in zip(*[col._keys() for col in columns]):
+            dedup.add(row)
+        return dedup.keep_mask()
+
+    def take(self, indices):
+        """
+        Trả về DataFrame mới chỉ gồm các hàng tại các vị trí `indices`
+        """
         df = DataFrame()
         for col in self._columns:
-            series = Series(None, label=col.label)
-            df._columns.append(series)
-        for row in unique_rows:
-            df.append_row(row)
-        
+            df.append_column(col.take(indices))
         return df
 
-    def read_csv(self, filename):
+    def read_csv(self, filename, dtypes=None, workers=None, usecols=None):
             """
             Hàm đọc CSV từ file
+            - dtypes: {tên cột: kiểu dữ liệu} để bỏ qua bước đoán kiểu của các cột đó
+              (ô không chuyển được sang kiểu đã cho thì trở thành ô rỗng)
+            - workers: số tiến trình đọc song song các khoảng của file (None: đọc tuần tự)
+            - usecols: danh sách tên các cột cần đọc (None: đọc tất cả các cột)
             """
-            # columns: dataframe thô dưới dạng transpose
-            columns = {}
-            with open(filename, 'rt', newline='') as f:
-                reader = csv.DictReader(f)
-                # Lặp qua từng hàng của CSV
-                for row in reader:
-                    for key in row:
-                        if key not in columns:
-                            columns[key] = [row[key]]
-                        else:
-                            columns[key].append(row[key])
-            
-            # Từ data thô, construct các series tương ứng
-            for col in columns:
-                series = Series(columns[col], col)
-                self._columns.append(series)
-
-    def write_csv(self, filename):
+            for series in CsvReader(filename, dtypes, usecols).read(workers):
+                self.append_column(series)
+
+    def lazy(self):
         """
-        Hàm xuất dataframe ra CSV
+        Trả về LazyFrame với nguồn là dataframe này: các thao tác được ghi lại thành kế hoạch,
+        tối ưu và chỉ chạy khi gọi `collect` hoặc `write_csv` (xem `LazyFrame`)
         """
-        df = copy.deepcopy(self)
-        for column in df._columns:
-            column._process_empty_cells(operation='write')
+        # Import trong hàm vì module LazyFrame import module này
+        from honolib.LazyFrame import LazyFrame
+        return LazyFrame(self)
 
+    def to_binary(self, filename, source=None):
+        """
+        Hàm xuất dataframe ra file nhị phân theo cột (xem `ColumnarFile`)
+        - source: file CSV nguồn (nếu có) để kiểm tra cache còn hợp lệ khi đọc lại
+        """
+        ColumnarFile(filename).write(self._columns, source)
+
+    @classmethod
+    def from_binary(cls, filename, usecols=None) -> 'DataFrame':
+        """
+        Hàm đọc dataframe từ file nhị phân theo cột (ghi bởi `to_binary`)
+        - usecols: danh sách tên các cột cần đọc (None: đọc tất cả các cột)
+        """
+        df = cls()
+        for series in ColumnarFile(filename).read(usecols):
+            df.append_column(series)
+        return df
+
+    def write_csv(self, filename, batch_size=10000):
+        """
+        Hàm xuất dataframe ra CSV
+        - batch_size: số hàng được ghi mỗi lần gọi `writerows`
+        """
         with open(filename, 'wt', newline='') as f:
-            column_labels = df.get_column_labels()
-            writer = csv.DictWriter(f, fieldnames=column_labels)
-            writer.writeheader()
-            for row in df.iterrows():
-                # Bỏ cột index
-                row = row[1:]
-                writer.writerow({cell[0]: cell[1] for cell in zip(column_labels, row)})
-
-def read_csv(filename):
+            writer = csv.writer(f)
+            writer.writerow(self.get_column_labels())
+            self._write_rows(writer, batch_size)
+
+    def _write_rows(self, writer, batch_size=10000):
+        """
+        Private: ghi các hàng của dataframe bằng `writer` (csv.writer, không ghi header).
+        Dataframe không bị sao chép: các hàng được dựng lần lượt bằng cách zip các cột,
+        ô rỗng (None) được csv.writer ghi thành chuỗi rỗng.
+        """
+        assert batch_size > 0, 'Batch size must be positive'
+        rows = zip(*self._columns)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if len(batch) == 0:
+                break
+            writer.writerows(batch)
+
+
+def print_na_counts(counter: dict):
+    """
+    In ra số lượng phần tử rỗng của các cột có phần tử rỗng và lấy tổng
+    - counter: {tên cột: số phần tử rỗng}
+    """
+    # Độ rộng lớn nhất của các label (để format cho đẹp)
+    max_label_width = max([len(label) for label in counter])
+
+    for label, null_count in counter.items():
+        if null_count > 0:
+            print(label.ljust(max_label_width), '\t', null_count)
+    
+    print('\nTotal null values:', sum(counter.values()))
+
+
+def _column_summary(col: Series):
+    # Tham số thống kê và trung vị của một cột (chạy được trong tiến trình con của ColumnPool)
+    return col.statistics(), col.median()
+
+
+def _column_fill_value(col: Series, method):
+    # Giá trị điền các ô rỗng của một cột (chạy được trong tiến trình con của ColumnPool)
+    return col._fill_value(method)
+
+
+def read_csv(filename, chunksize=None, dtypes=None, workers=None, usecols=None, cache=None):
+    """
+    Đọc file CSV thành DataFrame.
+    Nếu có `chunksize` thì trả về iterator các DataFrame, mỗi DataFrame chứa tối đa `chunksize` hàng.
+    Nếu có `dtypes` ({tên cột: kiểu dữ liệu}) thì các cột đó không cần đoán kiểu.
+    Nếu có `workers` thì file được chia thành nhiều khoảng và đọc song song bằng `workers` tiến trình.
+    Nếu có `usecols` thì chỉ đọc các cột có tên trong danh sách (các cột khác không được giải mã).
+    Nếu có `cache` (True: file cache nằm cạnh file CSV, chuỗi: thư mục chứa file cache) thì dataframe được đọc
+    từ file cache nhị phân khi file cache còn hợp lệ (cùng đường dẫn, kích thước và thời gian sửa đổi của file CSV),
+    nếu không thì file CSV được đọc và ghi lại vào file cache. Không dùng cache khi đọc theo từng phần hoặc có `dtypes`.
+    """
+    if chunksize is not None:
+        return read_csv_chunks(filename, chunksize, dtypes, usecols)
+    if cache and dtypes is None:
+        return _read_csv_cached(filename, workers, usecols, cache)
     df = DataFrame()
-    df.read_csv(filename)
-    return df
\ No newline at end of file
+    df.read_csv(filename, dtypes, workers, usecols)
+    return df
+
+
+def _read_csv_cached(filename, workers, usecols, cache):
+    # Đọc file CSV qua file cache nhị phân (xem `read_csv`)
+    cache_file = ColumnarFile(ColumnarFile.cache_filename(filename, cache))
+    if cache_file.is_valid_for(filename):
+        return DataFrame.from_binary(cache_file.filename, usecols)
+
+    # Cache chưa có hoặc đã cũ: đọc toàn bộ file (để cache dùng được cho mọi tập cột) rồi ghi lại cache
+    df = DataFrame()
+    df.read_csv(filename, workers=workers)
+    if cache is not True:
+        os.makedirs(cache, exist_ok=True)
+    df.to_binary(cache_file.filename, source=filename)
+    if usecols is None:
+        return df
+    for label in usecols:
+        df.get_column(label)
+    projected = DataFrame()
+    for col in df._columns:
+        if col.label in usecols:
+            projected.append_column(col)
+    return projected
+
+
+def read_csv_chunks(filename, chunksize, dtypes=None, usecols=None):
+    """
+    Generator đọc file CSV theo từng phần, mỗi phần là một DataFrame có tối đa `chunksize` hàng
+    """
+    assert chunksize > 0, 'Chunk size must be positive'
+    for columns in CsvReader(filename, dtypes, usecols).read_chunks(chunksize):
+        df = DataFrame()
+        for series in columns:
+            df.append_column(series)
+        yield df
+
+
+def write_csv_chunks(chunks, filename):
+    """
+    Ghi lần lượt các DataFrame (có cùng danh sách cột) vào một file CSV.
+    Header được lấy từ DataFrame đầu tiên.
+    """
+    with open(filename, 'wt', newline='') as f:
+        writer = None
+        for df in chunks:
+            if writer is None:
+                writer = csv.writer(f)
+                writer.writerow(df.get_column_labels())
+            df._write_rows(writer)
\ No newline at end of file
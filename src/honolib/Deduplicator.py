@@ -0,0 +1,80 @@
+"""
+Module tìm các hàng trùng lặp bằng bảng băm
+"""
+import struct
+import tempfile
+from honolib.utils import row_fingerprint
+
+# Một bản ghi trong file phân vùng: fingerprint 16 byte + vị trí hàng (số nguyên 64 bit)
+_RECORD = struct.Struct('<16sq')
+
+
+class Deduplicator:
+    """
+    Class đánh dấu các hàng cần giữ lại khi xóa hàng trùng lặp, mỗi hàng được xử lý một lần (O(n)).
+    - keep: 'first' giữ lại hàng xuất hiện đầu tiên, 'last' giữ lại hàng xuất hiện cuối cùng.
+    - partitions: nếu có, fingerprint của các hàng được ghi ra `partitions` file tạm theo giá trị băm
+      và mỗi lần chỉ nạp một phân vùng vào bộ nhớ (dùng khi tập các hàng phân biệt không vừa bộ nhớ).
+    """
+
+    def __init__(self, keep='first', partitions=None):
+        assert keep in ('first', 'last'), 'Unsupported keep method'
+        assert partitions is None or partitions > 0, 'Number of partitions must be positive'
+        self.keep = keep
+        self.partitions = partitions
+        # Số hàng đã thêm vào
+        self.n_rows = 0
+        # Vị trí hàng được giữ lại của mỗi khóa (chế độ trong bộ nhớ)
+        self._seen = {}
+        # Các file tạm của từng phân vùng (chế độ ghi ra đĩa)
+        self._files = None
+        if partitions is not None:
+            self._files = [tempfile.TemporaryFile() for _ in range(partitions)]
+
+    def add(self, key: tuple):
+        """
+        Thêm khóa của hàng tiếp theo (tuple các giá trị của hàng)
+        """
+        if self._files is None:
+            if self.keep == 'first':
+                self._seen.setdefault(key, self.n_rows)
+            else:
+                self._seen[key] = self.n_rows
+        else:
+            fingerprint = row_fingerprint(key)
+            partition = self._files[fingerprint[0] % self.partitions]
+            partition.write(_RECORD.pack(fingerprint, self.n_rows))
+        self.n_rows += 1
+
+    def keep_mask(self) -> bytearray:
+        """
+        Trả về mảng đánh dấu các hàng được giữ lại (1: giữ, 0: xóa) theo thứ tự đã thêm vào
+        """
+        mask = bytearray(self.n_rows)
+        if self._files is None:
+            for index in self._seen.values():
+                mask[index] = 1
+            return mask
+
+        # Xử lý lần lượt từng phân vùng, các hàng trùng nhau chắc chắn nằm cùng một phân vùng
+        for partition in self._files:
+            partition.seek(0)
+            seen = {}
+            for fingerprint, index in _RECORD.iter_unpack(partition.read()):
+                if self.keep == 'first':
+                    seen.setdefault(fingerprint, index)
+                else:
+                    seen[fingerprint] = index
+            for index in seen.values():
+                mask[index] = 1
+        self.close()
+        return mask
+
+    def close(self):
+        """
+        Xóa các file tạm
+        """
+        if self._files is not None:
+            for partition in self._files:
+                partition.close()
+            self._files = []
@@ -0,0 +1,361 @@
+"""
+Module chứa kế hoạch tính (plan) của biểu thức và cache các kế hoạch tính
+"""
+import json
+from array import array
+from collections import OrderedDict
+from honolib.Series import Series, TYPECODES
+
+OPERATORS = ('+', '-', '*', '/')
+
+
+class FusedKernel:
+    """
+    Class biểu diễn biểu thức đã được biên dịch thành một hàm python duy nhất.
+    Hàm này tính toàn bộ biểu thức trên từng hàng trong một lượt duyệt và chỉ cấp phát một buffer kết quả
+    (thay vì tạo một Series trung gian cho mỗi toán tử).
+    """
+
+    def __init__(self, source, n_columns, dtype, label):
+        # Mã nguồn của hàm tính (để debug và lưu cache)
+        self.source = source
+        # Số cột đầu vào của hàm tính
+        self.n_columns = n_columns
+        # Kiểu dữ liệu của kết quả (int hoặc float)
+        self.dtype = dtype
+        # Tên cột kết quả
+        self.label = label
+        namespace = {}
+        exec(compile(source, '<SeriesExpression>', 'exec'), namespace)
+        self.func = namespace['_kernel']
+
+    @staticmethod
+    def _valid_mask(columns, n_rows) -> bytearray:
+        """
+        Private: mảng đánh dấu các hàng mà tất cả các cột đầu vào đều có dữ liệu.
+        Phép AND trên từng byte được làm bằng phép AND của số nguyên lớn (không phải lặp trong python).
+        """
+        mask = None
+        for col in columns:
+            if col.is_typed():
+                col_mask = col.valid
+            else:
+                col_mask = bytearray([row is not None for row in col.rows])
+            col_mask = int.from_bytes(col_mask, 'little')
+            mask = col_mask if mask is None else mask & col_mask
+        return bytearray(mask.to_bytes(n_rows, 'little'))
+
+    def __call__(self, columns) -> Series:
+        """
+        Tính biểu thức trên các cột đầu vào `columns` (theo thứ tự biến của hàm tính).
+        """
+        assert len(columns) == self.n_columns, 'Number of input columns does not match'
+        n_rows = len(columns[0])
+        for col in columns:
+            assert len(col) == n_rows, 'Series length does not match'
+
+        valid = self._valid_mask(columns, n_rows)
+        values = self.func(valid, *[col.rows for col in columns])
+        return Series.from_buffer(array(TYPECODES[self.dtype], values), valid, self.dtype, self.label)
+
+    @staticmethod
+    def build(postfix, dtypes: dict):
+        """
+        Biên dịch biểu thức hậu tố `postfix` (toán hạng là hằng số float hoặc tên cột) thành một FusedKernel.
+        - dtypes: {tên cột: kiểu dữ liệu} của các cột trong biểu thức.
+        Trả về: kernel, danh sách tên các cột đầu vào của kernel.
+        Trả về None, None nếu biểu thức không biên dịch được (không có toán tử, có cột không phải kiểu số, ...).
+        """
+        # Mỗi phần tử của stack: (mã python, tên cột kết quả, kiểu dữ liệu)
+        stack = []
+        # Tên các cột đầu vào, mỗi cột ứng với một biến x0, x1, ... của hàm tính
+        columns = []
+        has_operator = False
+
+        for token in postfix:
+            if isinstance(token, float):
+                stack.append((repr(token), str(token), float))
+            elif token not in OPERATORS:
+                if dtypes[token] not in (int, float):
+                    return None, None
+                if token not in columns:
+                    columns.append(token)
+                stack.append(('x%d' % columns.index(token), token, dtypes[token]))
+            else:
+                has_operator = True
+                code2, label2, dtype2 = stack.pop()
+                code1, label1, dtype1 = stack.pop()
+                dtype = float if token == '/' or float in (dtype1, dtype2) else int
+                stack.append(('(%s %s %s)' % (code1, token, code2), label1 + token + label2, dtype))
+
+        if not has_operator or len(columns) == 0 or len(stack) != 1:
+            return None, None
+
+        code, label, dtype = stack.pop()
+        # Hàng không hợp lệ (có ít nhất một toán hạng rỗng) được điền 0 và đánh dấu trong mảng valid của kết quả
+        params = ''.join(', c%d' % i for i in range(len(columns)))
+        variables = ''.join(', x%d' % i for i in range(len(columns)))
+        source = (
+            'def _kernel(valid%s):\n'
+            '    return [%s if ok else 0 for ok%s in zip(valid%s)]\n'
+        ) % (params, code, variables, params)
+        return FusedKernel(source, len(columns), dtype, label), columns
+
+
+class ExpressionPlan:
+    """
+    Class biểu diễn kế hoạch tính của một biểu thức, không phụ thuộc vào dữ liệu cụ thể:
+    biểu thức hậu tố (toán hạng là hằng số float hoặc tên cột) và kernel đã biên dịch (nếu có).
+    """
+
+    def __init__(self, postfix, kernel: FusedKernel = None, columns=None):
+        self.postfix = postfix
+        self.kernel = kernel
+        # Tên các cột đầu vào của kernel (theo thứ tự biến của kernel)
+        self.columns = columns
+
+    def to_dict(self) -> dict:
+        # Chỉ lưu biểu thức hậu tố, không lưu mã nguồn của kernel (kernel được biên dịch lại khi nạp)
+        return {'postfix': self.postfix}
+
+    @staticmethod
+    def from_dict(obj: dict, dtypes: dict):
+        """
+        Dựng lại kế hoạch tính từ `to_dict`, kernel được biên dịch lại bằng `FusedKernel.build`.
+        - dtypes: {tên cột: kiểu dữ liệu} của các cột trong biểu thức
+        Trả về None nếu biểu thức không hợp lệ (token không phải hằng số/toán tử/tên cột có trong `dtypes`).
+        """
+        postfix = obj.get('postfix')
+        if not isinstance(postfix, list):
+            return None
+        for token in postfix:
+            if not isinstance(token, float) and not (isinstance(token, str) and (token in OPERATORS or token in dtypes)):
+                return None
+        kernel, columns = FusedKernel.build(postfix, dtypes)
+        return ExpressionPlan(postfix, kernel, columns)
+
+
+class PlanCache:
+    """
+    Cache LRU các kế hoạch tính của biểu thức.
+    Khóa là dãy token đã chuẩn hóa của biểu thức cùng với kiểu dữ liệu của các cột trong biểu thức,
+    nên cùng một công thức trên các file có cùng schema chỉ cần phân tích và biên dịch một lần.
+    File cache chỉ chứa token, biểu thức hậu tố và schema (không chứa mã nguồn): kernel luôn được sinh lại
+    bằng `FusedKernel.build` khi nạp, không có đoạn mã nào đọc từ file được thực thi.
+    """
+
+    # Phiên bản định dạng file cache
+    VERSION = 2
+    # Kiểu dữ liệu của các cột số theo tên lưu trong schema (các kiểu khác không biên dịch được thành kernel)
+    _DTYPES = {'int': int, 'float': float}
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._plans = OrderedDict()
+        # Số lần tìm thấy/không tìm thấy trong cache
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._plans)
+
+    def get(self, key) -> ExpressionPlan:
+        """
+        Trả về kế hoạch tính ứng với `key`, None nếu không có trong cache
+        """
+        plan = self._plans.get(key)
+        if plan is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._plans.move_to_end(key)
+        return plan
+
+    def put(self, key, plan: ExpressionPlan):
+        """
+        Thêm kế hoạch tính vào cache, xóa kế hoạch ít được dùng gần đây nhất nếu cache đã đầy
+        """
+        self._plans[key] = plan
+        self._plans.move_to_end(key)
+        while len(self._plans) > self.maxsize:
+            self._plans.popitem(last=False)
+
+    def clear(self):
+        self._plans.clear()
+
+    def save(self, filename):
+        """
+        Lưu cache ra file (JSON)
+        """
+        entries = []
+        for (tokens, schema), plan in self._plans.items():
+            entries.append({'tokens': list(tokens), 'schema': [list(item) for item in schema], 'plan': plan.to_dict()})
+        with open(filename, 'wt') as f:
+            json.dump({'version': self.VERSION, 'plans': entries}, f)
+
+    def load(self, filename):
+        """
+        Nạp cache từ file. File không tồn tại hoặc khác phiên bản thì bỏ qua.
+        """
+        try:
+            with open(filename, 'rt') as f:
+                obj = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if not isinstance(obj, dict) or obj.get('version') != self.VERSION:
+            return
+        for entry in obj.get('plans', []):
+            try:
+                key = (tuple(entry['tokens']), tuple((label, dtype) for label, dtype in entry['schema']))
+                dtypes = {label: self._DTYPES.get(dtype) for label, dtype in key[1]}
+                plan = ExpressionPlan.from_dict(entry['plan'], dtypes)
+            except (KeyError, TypeError, ValueError, IndexError):
+                # Bản ghi không hợp lệ thì bỏ qua (biểu thức sẽ được phân tích lại)
+                continue
+            if plan is not None:
+                self.put(key, plan)
+
+
+class ExpressionDag:
+    """
+    Class biểu diễn nhiều biểu thức dưới dạng DAG: các biểu thức con giống nhau
+    (vd: `GrLivArea + TotalBsmtSF` xuất hiện trong nhiều biểu thức) chỉ được tạo một nút.
+    Các nút được đánh số theo thứ tự tạo (thứ tự topo: nút con luôn có số nhỏ hơn nút cha).
+    """
+
+    def __init__(self, dtypes: dict):
+        # {tên cột: kiểu dữ liệu} của các cột trong các biểu thức
+        self.dtypes = dtypes
+        # Mỗi nút: (toán tử hoặc 'col'/'const', con trái hoặc tên cột/hằng số, con phải)
+        self.nodes = []
+        # Kiểu dữ liệu, tập các cột đầu vào và số lần được tham chiếu của từng nút
+        self.node_dtypes = []
+        self.node_columns = []
+        self.uses = []
+        self._ids = {}
+
+    def _add_node(self, key, dtype, columns):
+        """
+        Private: tạo nút mới nếu chưa có nút nào giống vậy.
+        Trả về: số của nút, nút có phải mới được tạo hay không
+        """
+        node_id = self._ids.get(key)
+        if node_id is not None:
+            return node_id, False
+        node_id = len(self.nodes)
+        self._ids[key] = node_id
+        self.nodes.append(key)
+        self.node_dtypes.append(dtype)
+        self.node_columns.append(columns)
+        self.uses.append(0)
+        return node_id, True
+
+    def add(self, postfix) -> int:
+        """
+        Thêm một biểu thức hậu tố vào DAG, trả về số của nút gốc
+        """
+        stack = []
+        for token in postfix:
+            if isinstance(token, float):
+                node_id, _ = self._add_node(('const', token, None), float, frozenset())
+            elif token not in OPERATORS:
+                node_id, _ = self._add_node(('col', token, None), self.dtypes[token], frozenset([token]))
+            else:
+                right = stack.pop()
+                left = stack.pop()
+                # Phép cộng và phép nhân có tính giao hoán (kể cả với số thực) nên chuẩn hóa thứ tự toán hạng
+                if token in ('+', '*') and right < left:
+                    left, right = right, left
+                dtype1, dtype2 = self.node_dtypes[left], self.node_dtypes[right]
+                dtype = float if token == '/' or float in (dtype1, dtype2) else int
+                columns = self.node_columns[left] | self.node_columns[right]
+                node_id, is_new = self._add_node((token, left, right), dtype, columns)
+                # Mỗi nút con được tính thêm một lần tham chiếu khi có một nút cha mới dùng đến nó
+                if is_new:
+                    self.uses[left] += 1
+                    self.uses[right] += 1
+            stack.append(node_id)
+        assert len(stack) == 1, 'Invalid expression'
+        return stack.pop()
+
+
+class MultiKernel:
+    """
+    Class biểu diễn nhiều biểu thức được biên dịch thành một hàm python duy nhất,
+    tính tất cả các biểu thức trong một lượt duyệt qua dữ liệu.
+    Biểu thức con dùng chung được tính một lần cho mỗi hàng và lưu vào biến tạm.
+    """
+
+    def __init__(self, dag: ExpressionDag, roots: list, labels: list):
+        self.labels = labels
+        self.dtypes = [dag.node_dtypes[root] for root in roots]
+
+        # Các cột đầu vào, mỗi cột ứng với một biến x0, x1, ...
+        for root in roots:
+            assert len(dag.node_columns[root]) > 0, 'Expressions must reference at least one column'
+        self.columns = sorted(set().union(*[dag.node_columns[root] for root in roots]))
+        # Các tập cột đầu vào khác nhau, mỗi tập ứng với một mảng đánh dấu hàng hợp lệ g0, g1, ...
+        self.column_sets = []
+        # Các nút được lưu vào biến tạm: kết quả của biểu thức và các biểu thức con dùng chung
+        saved = set(roots) | {i for i, node in enumerate(dag.nodes) if node[0] in OPERATORS and dag.uses[i] > 1}
+
+        def code_of(node_id, top=False):
+            op, left, right = dag.nodes[node_id]
+            if op == 'const':
+                return repr(left)
+            if op == 'col':
+                return 'x%d' % self.columns.index(left)
+            if node_id in saved and not top:
+                return 't%d' % node_id
+            return '(%s %s %s)' % (code_of(left), op, code_of(right))
+
+        body = []
+        for node_id in sorted(saved):
+            columns = dag.node_columns[node_id]
+            if columns not in self.column_sets:
+                self.column_sets.append(columns)
+            body.append('t%d = %s if g%d else 0' % (node_id, code_of(node_id, top=True), self.column_sets.index(columns)))
+        for i, root in enumerate(roots):
+            body.append('a%d(t%d)' % (i, root))
+
+        params = ['c%d' % i for i in range(len(self.columns))] + ['k%d' % i for i in range(len(self.column_sets))]
+        variables = ['x%d' % i for i in range(len(self.columns))] + ['g%d' % i for i in range(len(self.column_sets))]
+        lines = ['def _kernel(%s):' % ', '.join(params)]
+        for i, dtype in enumerate(self.dtypes):
+            lines.append('    o%d = array(%r)' % (i, TYPECODES[dtype]))
+            lines.append('    a%d = o%d.append' % (i, i))
+        lines.append('    for %s in zip(%s):' % (', '.join(variables), ', '.join(params)))
+        lines += ['        ' + line for line in body]
+        lines.append('    return %s,' % ', '.join('o%d' % i for i in range(len(roots))))
+        self.source = '\n'.join(lines) + '\n'
+
+        namespace = {'array': array}
+        exec(compile(self.source, '<SeriesExpression>', 'exec'), namespace)
+        self.func = namespace['_kernel']
+        self.output_column_sets = [self.column_sets.index(dag.node_columns[root]) for root in roots]
+
+    def __call__(self, df) -> list:
+        """
+        Tính tất cả các biểu thức trên dataframe `df`, trả về danh sách các Series kết quả
+        """
+        columns = [df.get_column(label) for label in self.columns]
+        n_rows = len(columns[0])
+        masks = {}
+        for col in columns:
+            if col.is_typed():
+                masks[col.label] = int.from_bytes(col.valid, 'little')
+            else:
+                masks[col.label] = int.from_bytes(bytearray([row is not None for row in col.rows]), 'little')
+
+        valid = []
+        for column_set in self.column_sets:
+            mask = None
+            for label in column_set:
+                mask = masks[label] if mask is None else mask & masks[label]
+            valid.append(bytearray(mask.to_bytes(n_rows, 'little')))
+
+        outputs = self.func(*[col.rows for col in columns], *valid)
+        results = []
+        for values, dtype, label, column_set in zip(outputs, self.dtypes, self.labels, self.output_column_sets):
+            results.append(Series.from_buffer(values, bytearray(valid[column_set]), dtype, label))
+        return results
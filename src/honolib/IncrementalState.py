@@ -0,0 +1,242 @@
+"""
+Module lưu trạng thái xử lý của một file CSV chỉ được ghi thêm vào cuối (append-only)
+"""
+import hashlib
+import json
+import os
+import tempfile
+from honolib.CsvReader import CsvReader
+from honolib.ColumnStats import ColumnStats
+from honolib.utils import row_fingerprint
+
+
+class IncrementalState:
+    """
+    Class lưu trạng thái đã xử lý của file CSV `source` vào file `filename` để lần chạy sau chỉ cần đọc phần mới
+    được ghi thêm vào cuối file:
+    - Vị trí byte đã xử lý và số hàng đã xử lý
+    - Tham số thống kê của từng cột (ColumnStats: số hàng rỗng, tổng, mean/phương sai, min, max, bảng tần suất, sketch phân vị)
+    - Fingerprint của các hàng và mảng đánh dấu các hàng được giữ lại khi xóa hàng trùng lặp (keep='first')
+      cho từng tập cột so sánh đã yêu cầu (`track_duplicates`)
+    Trạng thái được lưu thành file JSON `filename`; fingerprint của mỗi tập cột so sánh được lưu riêng trong file nhị phân
+    `filename.dedup<i>` và chỉ được ghi thêm vào cuối file (mỗi hàng một bản ghi: 1 byte đánh dấu + 16 byte fingerprint).
+    Phần đã xử lý được coi là không đổi nếu file không nhỏ đi, các byte đầu file và các byte ngay trước vị trí đã xử lý
+    không đổi; nếu không (file bị ghi lại, bị cắt, hoặc hàng cuối chưa có dấu xuống dòng đã bị ghi tiếp)
+    thì trạng thái được tính lại từ đầu file.
+    """
+
+    VERSION = 2
+    # Kích thước một bản ghi trong file fingerprint
+    RECORD_SIZE = 17
+    # Số byte ở đầu file và ngay trước vị trí đã xử lý được dùng để kiểm tra phần đã xử lý không bị thay đổi
+    WINDOW = 4096
+    # Số hàng mỗi lần đọc khi cập nhật trạng thái
+    CHUNKSIZE = 100000
+
+    def __init__(self, source, filename=None):
+        self.source = source
+        self.filename = filename
+        self._reset()
+
+    def _reset(self):
+        """
+        Private: xóa trạng thái (giữ lại các tập cột so sánh đã yêu cầu, fingerprint được tính lại từ đầu)
+        """
+        # Vị trí byte ngay sau phần đã xử lý (None: chưa xử lý)
+        self.offset = None
+        # Phần đã xử lý có kết thúc bằng dấu xuống dòng hay không
+        self.complete = True
+        self.checksum = None
+        self.n_rows = 0
+        self.labels = None
+        # {tên cột: ColumnStats}
+        self.stats = {}
+        # {tập cột so sánh (tuple, () là tất cả các cột): (tập fingerprint, mảng đánh dấu các hàng được giữ lại)}
+        self.dedup = {key: (set(), bytearray()) for key in getattr(self, 'dedup', {})}
+        # {tập cột so sánh: các bản ghi chưa được ghi ra file fingerprint}
+        self._pending = {key: bytearray() for key in self.dedup}
+        # Số bản ghi đã có trong file fingerprint (các file được ghi lại từ đầu sau khi xóa trạng thái)
+        self._stored = 0
+
+    @classmethod
+    def load(cls, source, filename) -> 'IncrementalState':
+        """
+        Nạp trạng thái từ file. File không tồn tại, không hợp lệ, khác phiên bản hoặc của file nguồn khác
+        thì trả về trạng thái rỗng.
+        """
+        state = cls(source, filename)
+        try:
+            with open(filename, 'rb') as f:
+                obj = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return state
+        if not isinstance(obj, dict) or obj.get('version') != cls.VERSION or obj.get('source') != os.path.abspath(source):
+            return state
+
+        try:
+            offset, complete, n_rows, labels = obj['offset'], obj['complete'], obj['n_rows'], obj['labels']
+            checksum = bytes.fromhex(obj['checksum']) if obj['checksum'] is not None else None
+            stats = {label: ColumnStats.from_dict(stats) for label, stats in obj['stats'].items()}
+            dedup = {}
+            for index, subset in enumerate(obj['dedup']):
+                dedup[tuple(subset)] = state._read_fingerprints(index, n_rows)
+        except (KeyError, TypeError, ValueError, IndexError, OSError):
+            return state
+
+        state.offset, state.complete, state.checksum, state.n_rows = offset, complete, checksum, n_rows
+        state.labels = labels
+        state.stats = stats
+        state.dedup = dedup
+        state._pending = {key: bytearray() for key in dedup}
+        state._stored = n_rows
+        return state
+
+    def _fingerprint_filename(self, index) -> str:
+        return self.filename + '.dedup' + str(index)
+
+    def _read_fingerprints(self, index, n_rows) -> tuple:
+        """
+        Private: đọc `n_rows` bản ghi đầu tiên của file fingerprint thứ `index`
+        (các bản ghi phía sau là của lần lưu bị ngắt giữa chừng, bị bỏ qua).
+        Trả về (tập fingerprint, mảng đánh dấu các hàng được giữ lại).
+        """
+        size = self.RECORD_SIZE
+        with open(self._fingerprint_filename(index), 'rb') as f:
+            data = f.read(n_rows * size)
+        if len(data) != n_rows * size:
+            raise ValueError('Fingerprint file is truncated')
+        mask = bytearray(data[0::size])
+        seen = {data[start + 1:start + size] for start in range(0, len(data), size) if data[start]}
+        return seen, mask
+
+    def save(self):
+        """
+        Lưu trạng thái ra file: ghi thêm các bản ghi fingerprint mới vào cuối các file fingerprint,
+        sau đó ghi file JSON (ghi ra file tạm rồi đổi tên để không để lại file ghi dở)
+        """
+        for index, key in enumerate(self.dedup):
+            with open(self._fingerprint_filename(index), 'ab') as f:
+                # Bỏ các bản ghi thừa của lần lưu trước bị ngắt giữa chừng (hoặc toàn bộ file nếu trạng thái đã bị xóa)
+                f.truncate(self._stored * self.RECORD_SIZE)
+                f.write(self._pending[key])
+            self._pending[key] = bytearray()
+        self._stored = self.n_rows
+
+        obj = {
+            'version': self.VERSION,
+            'source': os.path.abspath(self.source),
+            'offset': self.offset,
+            'complete': self.complete,
+            'checksum': self.checksum.hex() if self.checksum is not None else None,
+            'n_rows': self.n_rows,
+            'labels': self.labels,
+            'stats': {label: stats.to_dict() for label, stats in self.stats.items()},
+            'dedup': [list(key) for key in self.dedup],
+        }
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, temp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(obj, f)
+            os.replace(temp_filename, self.filename)
+        except BaseException:
+            os.remove(temp_filename)
+            raise
+
+    def track_duplicates(self, subset=None):
+        """
+        Yêu cầu lưu fingerprint của các hàng theo các cột `subset` (None: tất cả các cột).
+        Nếu trước đó chưa lưu thì trạng thái được tính lại từ đầu file ở lần `update` tiếp theo.
+        Trả về khóa của tập cột trong `dedup`.
+        """
+        key = tuple(subset) if subset is not None else ()
+        if key not in self.dedup:
+            self.dedup[key] = (set(), bytearray())
+            self._reset()
+        return key
+
+    def keep_mask(self, subset=None) -> bytearray:
+        """
+        Trả về mảng đánh dấu các hàng được giữ lại khi xóa hàng trùng lặp theo các cột `subset` (giữ hàng đầu tiên)
+        """
+        return self.dedup[tuple(subset) if subset is not None else ()][1]
+
+    def get_stats(self, label) -> ColumnStats:
+        if label not in self.stats:
+            raise AttributeError('Column not found: ' + label)
+        return self.stats[label]
+
+    def _checksum(self, end) -> bytes:
+        """
+        Private: giá trị băm của các byte đầu file và các byte ngay trước vị trí `end`
+        """
+        with open(self.source, 'rb') as f:
+            head = f.read(min(self.WINDOW, end))
+            f.seek(max(0, end - self.WINDOW))
+            tail = f.read(end - max(0, end - self.WINDOW))
+        return hashlib.blake2b(head + tail + str(end).encode(), digest_size=16).digest()
+
+    def _is_current(self, size) -> bool:
+        """
+        Private: kiểm tra phần đã xử lý của file có còn nguyên vẹn hay không
+        """
+        if size < self.offset or (not self.complete and size != self.offset):
+            return False
+        return self._checksum(self.offset) == self.checksum
+
+    def update(self) -> int:
+        """
+        Cập nhật trạng thái với các hàng mới được ghi thêm vào cuối file.
+        Trả về số hàng mới đã xử lý.
+        """
+        size = os.path.getsize(self.source)
+        if self.offset is not None and not self._is_current(size):
+            self._reset()
+        if self.offset is not None and self.offset == size:
+            return 0
+
+        new_rows = 0
+        reader = CsvReader(self.source)
+        for columns in reader.read_chunks(self.CHUNKSIZE, self.offset, size):
+            if self.labels is None:
+                self.labels = [col.label for col in columns]
+            for col in columns:
+                if col.label not in self.stats:
+                    self.stats[col.label] = ColumnStats(col.label, frequency=True, quantiles=True)
+                self.stats[col.label].update(col)
+            for key, (seen, mask) in self.dedup.items():
+                self._update_duplicates(columns, key, seen, mask, self._pending[key])
+            new_rows += len(columns[0]) if len(columns) > 0 else 0
+
+        with open(self.source, 'rb') as f:
+            f.seek(max(0, size - 1))
+            self.complete = size == 0 or f.read(1) == b'\n'
+        self.offset = size
+        self.checksum = self._checksum(size)
+        self.n_rows += new_rows
+        return new_rows
+
+    @staticmethod
+    def _update_duplicates(columns, key, seen, mask, records):
+        """
+        Private: đánh dấu các hàng của một phần dữ liệu, hàng có fingerprint đã gặp thì bị xóa.
+        Bản ghi của từng hàng được thêm vào `records` để ghi ra file fingerprint khi lưu.
+        """
+        if key != ():
+            by_label = {}
+            for col in columns:
+                by_label.setdefault(col.label, col)
+            for label in key:
+                if label not in by_label:
+                    raise AttributeError('Column not found: ' + label)
+            columns = [by_label[label] for label in key]
+        for row in zip(*columns):
+            fingerprint = row_fingerprint(row)
+            if fingerprint in seen:
+                mask.append(0)
+                records.append(0)
+            else:
+                seen.add(fingerprint)
+                mask.append(1)
+                records.append(1)
+            records += fingerprint
@@ -0,0 +1,412 @@
+"""
+Module ghi lại các thao tác trên dataframe thành kế hoạch (plan), tối ưu kế hoạch rồi mới chạy
+"""
+import copy
+from functools import partial
+from honolib.DataFrame import DataFrame, read_csv
+from honolib.Series import Series
+from honolib.ColumnPool import ColumnPool
+from honolib.SeriesExpression import SeriesExpression, MultiSeriesExpression
+
+
+class PlanStep:
+    """
+    Class cơ sở của một bước trong kế hoạch.
+    - inputs(): các cột bước này đọc (None: tất cả các cột hiện có)
+    - outputs(): các cột bước này tạo ra
+    - prune(needed): bỏ phần việc không cần thiết khi sau bước này chỉ cần các cột `needed` (None: tất cả).
+      Trả về bước đã rút gọn (None nếu bỏ được cả bước) và các cột cần có trước bước này.
+    - run(df, workers): chạy bước trên `df`, trả về dataframe kết quả
+    """
+    # Bước chỉ sửa giá trị của các cột (không đổi số hàng, không thêm/bớt cột)
+    mutates = False
+
+    def inputs(self):
+        return None
+
+    def outputs(self):
+        return []
+
+    def prune(self, needed):
+        return self, None
+
+    def run(self, df: DataFrame, workers=None) -> DataFrame:
+        raise NotImplementedError
+
+
+class SelectStep(PlanStep):
+    def __init__(self, labels):
+        self.labels = list(labels)
+
+    def inputs(self):
+        return list(self.labels)
+
+    def prune(self, needed):
+        return self, set(self.labels)
+
+    def run(self, df, workers=None):
+        return df.select(self.labels)
+
+    def __str__(self):
+        return 'select ' + ', '.join(self.labels)
+
+
+class DropNaStep(PlanStep):
+    def __init__(self, axis, threshold):
+        assert threshold <= 1 and threshold >= 0
+        if axis not in (0, 1):
+            raise AttributeError('Invalid axis. Only accept 0 or 1')
+        self.axis = axis
+        self.threshold = threshold
+
+    def prune(self, needed):
+        # Xóa cột chỉ phụ thuộc vào chính cột đó, xóa hàng thì phụ thuộc vào tất cả các cột
+        return self, needed if self.axis == 1 else None
+
+    def run(self, df, workers=None):
+        df.drop_na(axis=self.axis, threshold=self.threshold)
+        return df
+
+    def __str__(self):
+        return 'drop_na axis=%d threshold=%s' % (self.axis, self.threshold)
+
+
+class DropDuplicateStep(PlanStep):
+    def __init__(self, subset, keep):
+        self.subset = list(subset) if subset is not None else None
+        self.keep = keep
+
+    def inputs(self):
+        return self.subset
+
+    def prune(self, needed):
+        if needed is None or self.subset is None:
+            return self, None
+        return self, needed | set(self.subset)
+
+    def run(self, df, workers=None):
+        return df.drop_duplicate(self.subset, self.keep)
+
+    def __str__(self):
+        subset = 'all' if self.subset is None else ', '.join(self.subset)
+        return 'drop_duplicate subset=%s keep=%s' % (subset, self.keep)
+
+
+class FillNaStep(PlanStep):
+    mutates = True
+
+    def __init__(self, method, labels, verbose=False):
+        assert method in ['mean', 'median', 'mode'], 'Unsupported fill method'
+        self.method = method
+        # None: tất cả các cột hiện có
+        self.labels = list(labels) if labels is not None else None
+        self.verbose = verbose
+
+    def inputs(self):
+        return self.labels
+
+    def prune(self, needed):
+        if needed is None or self.labels is None:
+            return self, needed
+        labels = [label for label in self.labels if label in needed]
+        if len(labels) == 0:
+            return None, needed
+        step = copy.copy(self)
+        step.labels = labels
+        return step, needed
+
+    def run(self, df, workers=None):
+        # Dataframe con dùng chung các object Series nên các cột của `df` được điền trực tiếp
+        target = df if self.labels is None else df.select(self.labels)
+        target.fill_na(method=self.method, verbose=self.verbose, workers=workers)
+        return df
+
+    def __str__(self):
+        labels = 'all' if self.labels is None else ', '.join(self.labels)
+        return 'fill_na method=%s columns=%s' % (self.method, labels)
+
+
+class NormalizeStep(PlanStep):
+    mutates = True
+
+    def __init__(self, method, labels):
+        assert method in ['zscore', 'minmax'], 'Invalid normalize method'
+        self.method = method
+        self.labels = list(labels)
+
+    def inputs(self):
+        return list(self.labels)
+
+    def prune(self, needed):
+        if needed is None:
+            return self, needed
+        labels = [label for label in self.labels if label in needed]
+        if len(labels) == 0:
+            return None, needed
+        step = copy.copy(self)
+        step.labels = labels
+        return step, needed
+
+    def run(self, df, workers=None):
+        # Tham số chuẩn hóa của các cột được tính trong cùng một lượt (song song nếu có `workers`)
+        columns = [df.get_column(label) for label in self.labels]
+        params = ColumnPool(workers).map(partial(_normalize_params, method=self.method), columns)
+        for col, (a, b) in zip(columns, params):
+            col._normalize_with(self.method, a, b)
+        return df
+
+    def __str__(self):
+        return 'normalize method=%s columns=%s' % (self.method, ', '.join(self.labels))
+
+
+class EvaluateStep(PlanStep):
+    def __init__(self, expressions: dict):
+        # {tên cột kết quả: chuỗi biểu thức trung tố}
+        self.expressions = dict(expressions)
+
+    def inputs(self):
+        labels = []
+        for expression in self.expressions.values():
+            labels += [label for label in SeriesExpression.column_labels(expression) if label not in labels]
+        return labels
+
+    def outputs(self):
+        return list(self.expressions)
+
+    def prune(self, needed):
+        if needed is None:
+            return self, None
+        expressions = {label: expr for label, expr in self.expressions.items() if label in needed}
+        if len(expressions) == 0:
+            return None, needed
+        step = EvaluateStep(expressions)
+        return step, (needed - set(expressions)) | set(step.inputs())
+
+    def run(self, df, workers=None):
+        # Tất cả các biểu thức được tính trong một lượt duyệt (xem `MultiSeriesExpression`)
+        for result in MultiSeriesExpression(self.expressions, df).evaluate():
+            df.append_column(result)
+        return df
+
+    def __str__(self):
+        return 'evaluate ' + ', '.join(label + ' = ' + expr for label, expr in self.expressions.items())
+
+
+class LazyFrame:
+    """
+    Class ghi lại các thao tác trên dataframe thành kế hoạch, chỉ chạy khi gọi `collect` hoặc `write_csv`.
+    Trước khi chạy, kế hoạch được tối ưu (kết quả giống hệt khi chạy lần lượt từng thao tác):
+    - Đẩy bước xóa hàng trùng lặp (có `subset`) lên trước các bước tính biểu thức không tạo ra cột trong `subset`,
+      để biểu thức chỉ phải tính trên các hàng được giữ lại.
+    - Gộp các bước liền nhau cùng loại: các bước tính biểu thức độc lập được tính trong một lượt,
+      các bước điền/chuẩn hóa trên nhiều cột được gộp thành một bước (tham số của các cột được tính cùng lúc).
+    - Bỏ bước xóa hàng rỗng ngay sau bước điền giá trị rỗng cho tất cả các cột (không còn ô rỗng).
+    - Bỏ các cột không cần thiết sớm nhất có thể: chỉ đọc các cột cần cho kết quả (file CSV được đọc với `usecols`),
+      bỏ các biểu thức, các cột cần điền/chuẩn hóa không có trong kết quả.
+    Mỗi thao tác trả về một LazyFrame mới, dataframe nguồn không bị thay đổi.
+    """
+
+    def __init__(self, source, steps=None, **read_args):
+        # Nguồn dữ liệu: DataFrame hoặc tên file CSV (đọc bằng `read_csv` với các tham số `read_args`)
+        self.source = source
+        self.read_args = read_args
+        self.steps = steps if steps is not None else []
+
+    def _then(self, step: PlanStep) -> 'LazyFrame':
+        return LazyFrame(self.source, self.steps + [step], **self.read_args)
+
+    def select(self, labels) -> 'LazyFrame':
+        return self._then(SelectStep(labels))
+
+    def drop_na(self, axis=0, threshold=0.5) -> 'LazyFrame':
+        return self._then(DropNaStep(axis, threshold))
+
+    def drop_duplicate(self, subset=None, keep='first') -> 'LazyFrame':
+        return self._then(DropDuplicateStep(subset, keep))
+
+    def fill_na(self, method='mean', labels=None, verbose=False) -> 'LazyFrame':
+        if isinstance(labels, str):
+            labels = [labels]
+        return self._then(FillNaStep(method, labels, verbose))
+
+    def normalize(self, labels, method='zscore') -> 'LazyFrame':
+        if isinstance(labels, str):
+            labels = [labels]
+        return self._then(NormalizeStep(method, labels))
+
+    def evaluate(self, expressions: dict) -> 'LazyFrame':
+        return self._then(EvaluateStep(expressions))
+
+    def optimize(self):
+        """
+        Trả về kế hoạch đã tối ưu: danh sách các cột cần đọc từ nguồn (None: tất cả) và danh sách các bước
+        """
+        steps = _push_down_filters(self.steps)
+        steps = _fuse_steps(steps)
+        steps = _drop_redundant_filters(steps)
+        return _prune_columns(steps)
+
+    def explain(self, optimized=True) -> str:
+        """
+        Trả về chuỗi mô tả kế hoạch (mỗi bước một dòng)
+        """
+        if optimized:
+            usecols, steps = self.optimize()
+        else:
+            usecols, steps = None, self.steps
+        source = 'dataframe' if isinstance(self.source, DataFrame) else 'csv ' + self.source
+        columns = 'all' if usecols is None else ', '.join(usecols)
+        lines = ['scan %s columns=%s' % (source, columns)]
+        lines += [str(step) for step in steps]
+        return '\n'.join(lines)
+
+    def collect(self, workers=None, optimize=True) -> DataFrame:
+        """
+        Chạy kế hoạch, trả về dataframe kết quả
+        - workers: số tiến trình đọc file/xử lý song song các cột (None: tuần tự)
+        - optimize: nếu False thì chạy lần lượt từng thao tác đã ghi lại (không tối ưu)
+        """
+        if optimize:
+            usecols, steps = self.optimize()
+        else:
+            usecols, steps = None, self.steps
+        df = self._scan(usecols, steps, workers)
+        for step in steps:
+            df = step.run(df, workers)
+        return df
+
+    def write_csv(self, filename, workers=None):
+        """
+        Chạy kế hoạch và ghi kết quả ra file CSV
+        """
+        self.collect(workers).write_csv(filename)
+
+    def _scan(self, usecols, steps, workers) -> DataFrame:
+        """
+        Private: đọc dữ liệu nguồn (chỉ các cột `usecols` nếu có)
+        """
+        if not isinstance(self.source, DataFrame):
+            return read_csv(self.source, workers=workers, usecols=usecols, **self.read_args)
+
+        # Nguồn là dataframe: các cột bị sửa trực tiếp được sao chép để không làm thay đổi dataframe nguồn
+        mutated = set()
+        for step in steps:
+            if step.mutates:
+                if step.inputs() is None:
+                    mutated = None
+                    break
+                mutated |= set(step.inputs())
+
+        df = DataFrame()
+        for col in self.source._columns:
+            if usecols is not None and col.label not in usecols:
+                continue
+            if mutated is None or col.label in mutated:
+                col = _copy_column(col)
+            df.append_column(col)
+        if usecols is not None:
+            for label in usecols:
+                df.get_column(label)
+        return df
+
+
+def scan_csv(filename, **read_args) -> LazyFrame:
+    """
+    Tạo LazyFrame đọc từ file CSV (các tham số khác được truyền cho `read_csv`, vd: dtypes, cache)
+    """
+    return LazyFrame(filename, **read_args)
+
+
+def _push_down_filters(steps) -> list:
+    """
+    Đẩy bước xóa hàng trùng lặp (có subset) lên trước các bước tính biểu thức không tạo ra cột nào trong subset.
+    Biểu thức được tính theo từng hàng nên xóa hàng trước hay sau khi tính đều cho cùng kết quả.
+    """
+    steps = list(steps)
+    for index in range(len(steps)):
+        position = index
+        step = steps[position]
+        if not isinstance(step, DropDuplicateStep) or step.subset is None:
+            continue
+        while position > 0:
+            previous = steps[position - 1]
+            if not isinstance(previous, EvaluateStep) or set(previous.outputs()) & set(step.subset):
+                break
+            steps[position - 1], steps[position] = step, previous
+            position -= 1
+    return steps
+
+
+def _fuse_steps(steps) -> list:
+    """
+    Gộp các bước liền nhau cùng loại thành một bước
+    """
+    result = []
+    for step in steps:
+        previous = result[-1] if len(result) > 0 else None
+        if isinstance(step, EvaluateStep) and isinstance(previous, EvaluateStep):
+            # Chỉ gộp khi biểu thức sau không dùng (và không trùng tên với) kết quả của biểu thức trước
+            outputs = set(previous.outputs())
+            if not outputs & (set(step.inputs()) | set(step.outputs())):
+                result[-1] = EvaluateStep({**previous.expressions, **step.expressions})
+                continue
+        elif isinstance(step, FillNaStep) and isinstance(previous, FillNaStep):
+            # Điền lại một cột đã được điền không làm thay đổi gì nên gộp được các tập cột
+            if step.method == previous.method and step.verbose == previous.verbose:
+                labels = None
+                if previous.labels is not None and step.labels is not None:
+                    labels = previous.labels + [label for label in step.labels if label not in previous.labels]
+                result[-1] = FillNaStep(step.method, labels, step.verbose)
+                continue
+        elif isinstance(step, NormalizeStep) and isinstance(previous, NormalizeStep):
+            # Chuẩn hóa hai lần một cột không giống chuẩn hóa một lần nên chỉ gộp khi các cột khác nhau
+            if step.method == previous.method and not set(step.labels) & set(previous.labels):
+                result[-1] = NormalizeStep(step.method, previous.labels + step.labels)
+                continue
+        result.append(step)
+    return result
+
+
+def _drop_redundant_filters(steps) -> list:
+    """
+    Bỏ bước xóa hàng rỗng ngay sau bước điền giá trị rỗng cho tất cả các cột.
+    Với threshold = 0, mọi hàng (kể cả hàng không rỗng) đều bị xóa nên vẫn giữ lại bước này.
+    """
+    result = []
+    for step in steps:
+        previous = result[-1] if len(result) > 0 else None
+        if (isinstance(step, DropNaStep) and step.threshold > 0
+                and isinstance(previous, FillNaStep) and previous.labels is None):
+            continue
+        result.append(step)
+    return result
+
+
+def _prune_columns(steps):
+    """
+    Duyệt ngược các bước để tìm các cột cần thiết, bỏ các phần việc không ảnh hưởng đến kết quả.
+    Trả về: các cột cần đọc từ nguồn (None: tất cả), danh sách các bước đã rút gọn
+    """
+    needed = None
+    result = []
+    for step in reversed(steps):
+        step, needed = step.prune(needed)
+        if step is not None:
+            result.append(step)
+    result.reverse()
+    return (sorted(needed) if needed is not None else None), result
+
+
+def _normalize_params(col: Series, method):
+    # Tham số chuẩn hóa của một cột (chạy được trong tiến trình con của ColumnPool)
+    return col.normalize_params(method)
+
+
+def _copy_column(col: Series) -> Series:
+    """
+    Sao chép một cột (buffer/list của cột mới không dùng chung với cột cũ)
+    """
+    rows = col.rows[:]
+    valid = bytearray(col.valid) if col.is_typed() else None
+    int_cells = bytearray(col.int_cells) if col.int_cells is not None else None
+    return Series.from_buffer(rows, valid, col.dtype, col.label, col.categories, int_cells)
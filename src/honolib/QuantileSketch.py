@@ -0,0 +1,140 @@
+"""
+Module ước lượng phân vị của một cột khi đọc dữ liệu theo từng phần
+"""
+import math
+import random
+
+
+class QuantileSketch:
+    """
+    Class ước lượng phân vị theo kiểu KLL sketch: bộ nhớ sử dụng chỉ phụ thuộc `k` (không phụ thuộc số hàng).
+    Các giá trị được lưu trong nhiều tầng (compactor), mỗi giá trị ở tầng h đại diện cho 2^h giá trị gốc.
+    Khi một tầng đầy, tầng đó được sắp xếp và chỉ giữ lại một nửa (xen kẽ) để đưa lên tầng trên.
+    Sai số hạng (rank) của kết quả vào khoảng O(1/k).
+    """
+
+    def __init__(self, k=200, seed=0):
+        # Kích thước của tầng cao nhất (độ chính xác của sketch)
+        self.k = k
+        # Các tầng, tầng 0 chứa các giá trị mới thêm vào
+        self.compactors = [[]]
+        # Tổng số giá trị đang được lưu trong tất cả các tầng và sức chứa tối đa
+        self.size = 0
+        self.max_size = 0
+        # Số giá trị gốc đã thêm vào
+        self.n = 0
+        # Bộ sinh số ngẫu nhiên riêng để kết quả lặp lại được giữa các lần chạy
+        self._random = random.Random(seed)
+        self._grow()
+
+    def _capacity(self, height):
+        """
+        Private: sức chứa của tầng `height`, các tầng thấp nhỏ dần theo cấp số nhân 2/3
+        """
+        depth = len(self.compactors) - height - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def _grow(self):
+        """
+        Private: thêm một tầng mới ở trên cùng
+        """
+        self.compactors.append([])
+        self.max_size = sum(self._capacity(height) for height in range(len(self.compactors)))
+
+    def _compress(self):
+        """
+        Private: nén các tầng đầy cho đến khi tổng số giá trị nhỏ hơn sức chứa
+        """
+        while self.size >= self.max_size:
+            for height in range(len(self.compactors)):
+                compactor = self.compactors[height]
+                if len(compactor) < self._capacity(height):
+                    continue
+                if height + 1 >= len(self.compactors):
+                    self._grow()
+
+                compactor.sort()
+                # Số lượng lẻ thì giữ lại giá trị cuối cùng ở tầng hiện tại
+                last = compactor.pop() if len(compactor) % 2 == 1 else None
+                offset = self._random.getrandbits(1)
+                self.compactors[height + 1].extend(compactor[offset::2])
+                self.compactors[height] = [] if last is None else [last]
+                self.size = sum(len(c) for c in self.compactors)
+                break
+
+    def to_dict(self) -> dict:
+        # Trạng thái của bộ sinh số ngẫu nhiên cũng được lưu để kết quả giống như khi không lưu/nạp lại
+        return {'k': self.k, 'compactors': self.compactors, 'n': self.n, 'random': self._random.getstate()}
+
+    @classmethod
+    def from_dict(cls, obj: dict) -> 'QuantileSketch':
+        """
+        Dựng lại sketch từ `to_dict` (vd: sau khi đọc từ file JSON)
+        """
+        sketch = cls(obj['k'])
+        sketch.compactors = [list(compactor) for compactor in obj['compactors']]
+        sketch.max_size = sum(sketch._capacity(height) for height in range(len(sketch.compactors)))
+        sketch.size = sum(len(c) for c in sketch.compactors)
+        sketch.n = obj['n']
+        version, internal, gauss = obj['random']
+        sketch._random.setstate((version, tuple(internal), gauss))
+        return sketch
+
+    def update(self, values):
+        """
+        Thêm các giá trị (không rỗng) vào sketch
+        """
+        before = len(self.compactors[0])
+        self.compactors[0].extend(values)
+        added = len(self.compactors[0]) - before
+        self.n += added
+        self.size += added
+        self._compress()
+
+    def merge(self, other):
+        """
+        Gộp một sketch khác (vd: sketch của phần dữ liệu khác) vào sketch này
+        """
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for height, compactor in enumerate(other.compactors):
+            self.compactors[height].extend(compactor)
+        self.n += other.n
+        self.size = sum(len(c) for c in self.compactors)
+        self._compress()
+
+    def quantiles(self, qs):
+        """
+        Trả về danh sách giá trị ước lượng tại các phân vị `qs` (0 <= q <= 1). Sketch rỗng thì trả về None
+        """
+        for q in qs:
+            assert 0 <= q <= 1, 'Quantile must be between 0 and 1'
+        if self.n == 0:
+            return [None for q in qs]
+
+        items = sorted(
+            (value, 1 << height)
+            for height, compactor in enumerate(self.compactors)
+            for value in compactor
+        )
+        total = sum(weight for value, weight in items)
+
+        result = []
+        for q in qs:
+            # Giá trị đầu tiên có hạng tích lũy vượt qua q * tổng trọng số
+            target = q * total
+            cumulative = 0
+            answer = items[-1][0]
+            for value, weight in items:
+                cumulative += weight
+                if cumulative > target:
+                    answer = value
+                    break
+            result.append(answer)
+        return result
+
+    def quantile(self, q):
+        """
+        Trả về giá trị ước lượng tại phân vị `q`
+        """
+        return self.quantiles([q])[0]
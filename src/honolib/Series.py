@@ -1,6 +1,27 @@
 import math 
 import operator
-from honolib.utils import detect_type_value
+import functools
+from array import array
+from collections import Counter
+from itertools import compress, repeat
+from honolib.utils import TYPECODES, CATEGORICAL_RATIO, CATEGORY_TYPECODE, INT_PATTERN, detect_type_value, exact_in_float, promote_type, table_mode, infer_column_type, convert_cells, select_many, pack_bits
+from honolib.ColumnStats import ColumnStats
+
+
+def memoized(method):
+    """
+    Decorator lưu lại kết quả của một hàm thống kê của Series (không có tham số) cho đến khi cột bị thay đổi.
+    Mọi thao tác thay đổi dữ liệu của cột đều phải gọi `Series._invalidate` để xóa các kết quả đã lưu.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self):
+        if name not in self._cache:
+            self._cache[name] = method(self)
+        return self._cache[name]
+    return wrapper
+
 
 class Series:
     """
@@ -9,11 +30,29 @@ class Series:
 
     def __init__(self, obj, label=''):
         # Các dòng trong series
+        # Cột số (int/float) được lưu trong array.array, các cột còn lại lưu trong list
+        # Cột phân loại (chuỗi có ít giá trị phân biệt) lưu mã (chỉ số trong `categories`) của từng hàng trong array.array,
+        # hàng rỗng luôn có mã 0
         self.rows = []
+        # Mảng đánh dấu hàng hợp lệ (1: có dữ liệu, 0: rỗng), chỉ dùng cho cột lưu trong array.array.
+        # Với cột lưu trong list thì hàng rỗng được đánh dấu bằng None như cũ.
+        self.valid: bytearray = None
+        # Từ điển các giá trị phân biệt của cột phân loại (theo thứ tự xuất hiện), None nếu không phải cột phân loại.
+        # List này không bị sửa trực tiếp (có thể dùng chung giữa các Series), thêm giá trị thì tạo list mới.
+        self.categories: list = None
+        # Bảng tra ngược giá trị -> mã của `categories` (tạo khi cần)
+        self._category_codes: dict = None
+        # Đánh dấu các ô kiểu int trong buffer số thực (cột có cả số nguyên và số thực), None nếu không có ô nào.
+        # Các ô này được trả về (và ghi ra CSV) dưới dạng int như khi cột còn lưu bằng list, mỗi ô giữ kiểu riêng.
+        self.int_cells: bytearray = None
         # Tên cột
         self.label = label
         # Kiểu dữ liệu của cột (để kiểm tra tính hợp lệ của dữ liệu)
         self.dtype: type = None
+        # Các tham số thống kê đã tính (xóa khi cột bị thay đổi)
+        self._cache = {}
+        # Số lần cột bị thay đổi (để các đối tượng bên ngoài biết kết quả đã lưu còn dùng được hay không)
+        self.version = 0
 
         # Do python không support constructor overloading như C++ nên em phải viết 2 hàm riêng cho công đoạn khởi tạo mảng
         if isinstance(obj, list):
@@ -24,6 +63,23 @@ class Series:
         # Đoán kiểu dữ liệu của cột
         self._process_col_type()
 
+    @classmethod
+    def from_buffer(cls, rows, valid, dtype, label='', categories=None, int_cells=None):
+        """
+        Tạo Series trực tiếp từ buffer đã có kiểu (không cần đoán kiểu lại).
+        - rows: array.array (cột số hoặc mã của cột phân loại) hoặc list (hàng rỗng là None).
+        - valid: mảng đánh dấu hàng hợp lệ ứng với `rows` là array.array, None nếu `rows` là list.
+        - categories: từ điển giá trị của cột phân loại (`rows` là mã của các giá trị)
+        - int_cells: đánh dấu các ô kiểu int khi `rows` là buffer số thực (None: không có ô nào)
+        """
+        series = cls(None, label)
+        series.rows = rows
+        series.valid = valid
+        series.dtype = dtype
+        series.categories = categories
+        series.int_cells = int_cells if int_cells is not None and int_cells.count(1) > 0 else None
+        return series
+
     def __init_from_list(self, obj):
         # Contructor nếu người dùng truyền vào data là 1 list
         self.rows = obj
@@ -34,27 +90,138 @@ class Series:
         # Constructor nếu người dùng truyền vào một số nguyên (khởi tạo mảng rỗng có n phần tử)
         self.rows = [0 for i in range(size)]
 
+    def is_typed(self) -> bool:
+        """
+        Kiểm tra cột có đang được lưu trong buffer kiểu (array.array) hay không
+        """
+        return self.valid is not None
+
+    def is_categorical(self) -> bool:
+        """
+        Kiểm tra cột có phải cột phân loại (lưu mã và từ điển giá trị) hay không
+        """
+        return self.categories is not None
+
+    def _to_typed(self):
+        """
+        Chuyển dữ liệu của cột số từ list sang array.array kèm mảng đánh dấu hàng hợp lệ.
+        Nếu giá trị vượt quá phạm vi của buffer (vd: số nguyên > 64 bit) hoặc không lưu chính xác được trong buffer
+        (số nguyên > 2^53 trong cột số thực) thì giữ nguyên list.
+        Cột chuỗi có ít giá trị phân biệt thì được mã hóa thành cột phân loại.
+        """
+        if self.is_typed():
+            return
+        if self.dtype is str:
+            self._to_categorical()
+            return
+        if self.dtype not in TYPECODES:
+            return
+        # Cột số thực có ô số nguyên lớn (không giữ được chính xác trong buffer số thực) thì giữ nguyên list
+        if self.dtype is float and not all(map(exact_in_float, self.rows)):
+            return
+        try:
+            rows = array(TYPECODES[self.dtype], (0 if row is None else row for row in self.rows))
+        except (OverflowError, TypeError):
+            return
+        self.valid = bytearray(row is not None for row in self.rows)
+        if self.dtype is float:
+            int_cells = bytearray(isinstance(row, int) for row in self.rows)
+            self.int_cells = int_cells if int_cells.count(1) > 0 else None
+        self.rows = rows
+
+    def _to_categorical(self):
+        """
+        Mã hóa cột chuỗi lưu trong list thành cột phân loại: mã của từng hàng (array.array) và từ điển các giá trị
+        phân biệt, nếu tỉ lệ số giá trị phân biệt / số hàng không vượt quá `CATEGORICAL_RATIO`.
+        Các giá trị phân biệt được lấy theo thứ tự xuất hiện đầu tiên (giống thứ tự trong bảng tần suất).
+        Mã được lưu 1 byte/hàng nếu từ điển có không quá 256 giá trị, nếu không thì lưu bằng số nguyên 64 bit.
+        """
+        if self.is_typed() or self.dtype is not str:
+            return
+        distinct = dict.fromkeys(self.rows)
+        distinct.pop(None, None)
+        if len(distinct) > CATEGORICAL_RATIO * len(self.rows):
+            return
+
+        categories = list(distinct)
+        codes = {value: code for code, value in enumerate(categories)}
+        codes[None] = 0
+        self.valid = bytearray(map(operator.is_not, self.rows, repeat(None)))
+        if len(categories) <= 256:
+            self.rows = array(CATEGORY_TYPECODE, bytes(map(codes.__getitem__, self.rows)))
+        else:
+            self.rows = array(TYPECODES[int], list(map(codes.__getitem__, self.rows)))
+        self.categories = categories
+
+    def _category_code(self, value) -> int:
+        """
+        Private: trả về mã của giá trị `value` trong từ điển của cột phân loại (giá trị mới thì thêm vào từ điển)
+        """
+        if self._category_codes is None or len(self._category_codes) != len(self.categories):
+            self._category_codes = {category: code for code, category in enumerate(self.categories)}
+        code = self._category_codes.get(value)
+        if code is None:
+            code = len(self.categories)
+            # Tạo list mới vì từ điển có thể đang được dùng chung với Series khác (vd: kết quả của filter)
+            self.categories = self.categories + [value]
+            self._category_codes[value] = code
+        return code
+
+    def _to_list(self):
+        """
+        Chuyển dữ liệu của cột từ array.array về lại list (hàng rỗng là None)
+        """
+        if not self.is_typed():
+            return
+        self.rows = list(self)
+        self.valid = None
+        self.categories = None
+        self._category_codes = None
+        self.int_cells = None
+
     def _process_col_type(self):
         """
         Hàm để xử lý tự động kiểu dữ liệu của cột
         """
+        # Cột đã được lưu trong buffer kiểu thì kiểu dữ liệu đã được xác định
+        if self.is_typed():
+            return
+
+        # Cột toàn chuỗi (vd: đọc từ CSV): đoán kiểu và ép kiểu trên cả cột trong một lượt
+        if all(isinstance(row, str) for row in self.rows if row is not None):
+            self.dtype = infer_column_type(self.rows)
+            int_cells = None
+            if self.dtype is float:
+                # Ô số nguyên trong cột số thực vẫn giữ kiểu int (giống khi ép kiểu từng ô)
+                int_cells = bytearray(map(bool, map(INT_PATTERN.match, [row if row else '' for row in self.rows])))
+            self.rows, self.valid = convert_cells(self.rows, self.dtype)
+            if self.valid is not None and int_cells is not None and int_cells.count(1) > 0:
+                self.int_cells = int_cells
+            self._to_categorical()
+            return
+
         for index, row in enumerate(self.rows):
             if row is None:
                 continue
 
             t: type = detect_type_value(row)
             # Nếu trong cột có kiểu dữ liệu không đồng nhất -> cột có kiểu object
-            if self.dtype is None:
-                self.dtype = t
             # Nếu kiểu dữ liệu của cột khác của hàng, nhưng cả 2 đều là int hoặc float thì cột mang kiểu float
-            elif (self.dtype, t) in ((float, int), (int, float)):
-                self.dtype = float
-            elif self.dtype != t:
-                self.dtype = object
+            self.dtype = promote_type(self.dtype, t)
 
             # Ép kiểu của hàng sang kiểu dữ liệu đúng của nó
             self[index] = t(row)
 
+        # Cột số thì chuyển sang lưu trong buffer kiểu
+        self._to_typed()
+
+
+    def _invalidate(self):
+        """
+        Private: đánh dấu dữ liệu của cột đã bị thay đổi, xóa các tham số thống kê đã lưu
+        """
+        self.version += 1
+        self._cache.clear()
 
     def _process_empty_cells(self, operation='read'):
         """
@@ -78,28 +245,140 @@ class Series:
         Số phần tử (hàng) của cột
         """
         return len(self.rows)
+
+    def __iter__(self):
+        """
+        Duyệt qua giá trị của từng hàng (hàng rỗng là None)
+        """
+        if not self.is_typed():
+            return iter(self.rows)
+        if self.is_categorical():
+            # Khóa của hàng (xem `_keys`) là chỉ số trong bảng tra [None] + categories
+            return map(([None] + self.categories).__getitem__, self._keys())
+        if self.int_cells is not None:
+            return (
+                (int(row) if is_int else row) if ok else None
+                for row, ok, is_int in zip(self.rows, self.valid, self.int_cells)
+            )
+        return (row if ok else None for row, ok in zip(self.rows, self.valid))
+
+    def _non_na_values(self):
+        """
+        Private: iterator duyệt qua các giá trị không rỗng của cột
+        """
+        if self.is_categorical():
+            return map(self.categories.__getitem__, compress(self.rows, self.valid))
+        if self.int_cells is not None:
+            return (int(row) if is_int else row for row, is_int in compress(zip(self.rows, self.int_cells), self.valid))
+        if self.is_typed():
+            return compress(self.rows, self.valid)
+        return (row for row in self.rows if row is not None)
+
+    def _keys(self):
+        """
+        Private: iterator duyệt qua khóa dùng để so sánh/băm của từng hàng (hàng rỗng là None).
+        Riêng cột phân loại trả về số nguyên nhỏ thay vì chuỗi: mã + 1 với hàng có dữ liệu, 0 với hàng rỗng (hàng rỗng có mã 0),
+        hai hàng có cùng khóa khi và chỉ khi có cùng giá trị. Khóa được tính trong C (không duyệt từng hàng bằng python).
+        """
+        if self.is_categorical():
+            return map(operator.add, self.rows, self.valid)
+        return iter(self)
+
+    def _na_indices(self):
+        """
+        Private: iterator duyệt qua vị trí các hàng rỗng của cột
+        """
+        if not self.is_typed():
+            for index, row in enumerate(self.rows):
+                if row is None:
+                    yield index
+            return
+
+        index = self.valid.find(0)
+        while index != -1:
+            yield index
+            index = self.valid.find(0, index + 1)
+
+    def append(self, value):
+        """
+        Thêm một hàng vào cuối cột
+        """
+        if not self.is_typed():
+            self._invalidate()
+            self.rows.append(value)
+            return
+        self.rows.append(0)
+        self.valid.append(1)
+        if self.int_cells is not None:
+            self.int_cells.append(0)
+        self[len(self.rows) - 1] = value
+    
+    def filter(self, mask):
+        """
+        Trả về Series mới chỉ gồm các hàng có `mask` tương ứng là True (mask có cùng độ dài với cột)
+        """
+        assert len(mask) == len(self), 'Mask length does not match'
+        if self.is_typed():
+            return Series.from_buffer(
+                array(self.rows.typecode, compress(self.rows, mask)),
+                bytearray(compress(self.valid, mask)),
+                self.dtype, self.label, self.categories,
+                bytearray(compress(self.int_cells, mask)) if self.int_cells is not None else None
+            )
+        return Series.from_buffer(list(compress(self.rows, mask)), None, self.dtype, self.label)
+
+    def take(self, indices):
+        """
+        Trả về Series mới chỉ gồm các hàng tại các vị trí `indices` (theo thứ tự của `indices`)
+        """
+        rows = self.rows
+        if self.is_typed():
+            valid = self.valid
+            int_cells = self.int_cells
+            return Series.from_buffer(
+                array(rows.typecode, [rows[i] for i in indices]),
+                bytearray([valid[i] for i in indices]),
+                self.dtype, self.label, self.categories,
+                bytearray([int_cells[i] for i in indices]) if int_cells is not None else None
+            )
+        return Series.from_buffer([rows[i] for i in indices], None, self.dtype, self.label)
     
     def cast(self, dtype: type):
         """
         Hàm để ép kiểu cột sang kiểu dữ liệu tương ứng
         Không ép kiểu được thì gán kiểu dữ liệu `self.dtype` là None
         """
-        for index, row in enumerate(self.rows):
+        self._invalidate()
+        rows = []
+        for row in self:
             try:
-                self[index] = dtype(row)
+                rows.append(dtype(row))
             except:
-                self[index] = None
+                rows.append(None)
+        self.rows = rows
+        self.valid = None
+        self.categories = None
+        self._category_codes = None
+        self.int_cells = None
         self.dtype = dtype
+        self._to_typed()
     
+    @memoized
     def count_na(self) -> int:
         """
-        Trả về hàng bị thiếu trong cột
+        Trả về hàng bị thiếu trong cột (số bit 1 của bitmap hàng rỗng)
+        """
+        return self.null_bitmap().bit_count()
+
+    @memoized
+    def null_bitmap(self) -> int:
+        """
+        Trả về bitmap các hàng rỗng của cột (bit thứ i là 1 nếu hàng i rỗng), đóng gói 8 hàng/byte.
+        Dùng để đếm số ô rỗng và kết hợp các hàng rỗng của nhiều cột bằng phép toán bit.
         """
-        count = 0
-        for row in self.rows:
-            if row is None: 
-                count += 1
-        return count
+        if self.is_typed():
+            return pack_bits(self.valid, invert=True)
+        return pack_bits(bytes(map(operator.is_, self.rows, repeat(None))))
 
     def count_non_na(self) -> int:
         """
@@ -107,6 +386,7 @@ class Series:
         """
         return len(self.rows) - self.count_na()
     
+    @memoized
     def sum(self) -> float:
         """
         Trả về tổng của cột
@@ -114,12 +394,9 @@ class Series:
         if self.dtype not in [int, float]:
             return None 
         
-        s = 0
-        for row in self.rows:
-            if row is not None:
-                s += row 
-        return s 
+        return sum(self._non_na_values())
     
+    @memoized
     def mean(self) -> float:
         """
         Trả về giá trị trung bình của cột
@@ -131,6 +408,7 @@ class Series:
         s = self.sum()
         return s/n
     
+    @memoized
     def std(self) -> float:
         """
         Trả về độ lệch chuẩn của cột
@@ -141,40 +419,45 @@ class Series:
         n = self.count_non_na()
         m = self.mean()
         s = 0
-        for row in self.rows:
-            if row is None:
-                continue
+        for row in self._non_na_values():
             s += (row - m) ** 2
         return math.sqrt(s / n)
     
+    @memoized
     def frequency_table(self) -> dict:
         """
         Trả về bảng tần suất các giá trị phân biệt trong bảng (bao gồm None)
-        """
+        Cột phân loại: đếm trên mã của các hàng (Counter chạy trong C, không phải băm lại từng chuỗi),
+        các giá trị vẫn theo thứ tự xuất hiện đầu tiên.
+        """
+        if self.is_categorical():
+            categories = self.categories
+            frequency_table = {
+                categories[code]: count for code, count in Counter(compress(self.rows, self.valid)).items()
+            }
+            null_count = self.count_na()
+            if null_count > 0:
+                frequency_table[None] = null_count
+            return frequency_table
+
         frequency_table = {}
-        for row in self.rows:
+        for row in self:
             if row in frequency_table:
                 frequency_table[row] += 1 
             else: 
                 frequency_table[row] = 1
         return frequency_table
     
+    @memoized
     def mode(self):
         """
         Trả về giá trị mode của cột. Nếu có nhiều mode chỉ lấy giá trị đầu tiên.
         Trả về: mode_value, frequency.
         Nếu cả cột rỗng, trả về (0, 0)
         """
-        frequency_table = self.frequency_table()
-        max_freq = 0
-        max_value = 0
-        for (value, freq) in frequency_table.items():
-            if value is not None:
-                if freq > max_freq:
-                    max_freq = freq 
-                    max_value = value 
-        return max_value, max_freq
+        return table_mode(self.frequency_table())
     
+    @memoized
     def minmax(self):
         """
         Trả về giá trị min và max của cột
@@ -185,52 +468,82 @@ class Series:
         min_value = +math.inf
         max_value = -math.inf
 
-        for row in self.rows: 
-            if row is None:
-                continue
+        for row in self._non_na_values(): 
             if row < min_value:
                 min_value = row 
             if row > max_value: 
                 max_value = row 
         return min_value, max_value
     
+    @memoized
     def median(self):
         """
         Trả về giá trị trung vị của cột
         """
+        return self.quantile(0.5)
+
+    def quantile(self, q):
+        """
+        Trả về giá trị tại phân vị `q` (0 <= q <= 1) của cột, nội suy tuyến tính giữa hai hàng gần nhất
+        """
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs):
+        """
+        Trả về danh sách giá trị tại các phân vị `qs` của cột.
+        Các hàng cần thiết được chọn bằng quickselect (O(n)) thay vì sắp xếp cả cột.
+        """
+        for q in qs:
+            assert 0 <= q <= 1, 'Quantile must be between 0 and 1'
         if self.dtype not in [int, float]:
-            return None 
+            return [None for q in qs]
+
+        n = self.count_non_na()
+        if n == 0:
+            return [None for q in qs]
 
-        n = len(self.rows)
-        m = math.floor((n + 1) / 2)
+        # Vị trí (thực) của từng phân vị trong dãy đã sắp xếp
+        positions = [(n - 1) * q for q in qs]
+        ks = set()
+        for position in positions:
+            ks.add(math.floor(position))
+            ks.add(math.ceil(position))
+        selected = select_many(self._non_na_values(), ks)
 
-        filtered_rows = list(filter(lambda x: x is not None, self.rows))
-        sorted_rows = sorted(filtered_rows)
+        result = []
+        for position in positions:
+            low, high = math.floor(position), math.ceil(position)
+            if low == high:
+                result.append(selected[low])
+            else:
+                result.append(selected[low] + (selected[high] - selected[low]) * (position - low))
+        return result
 
-        return sorted_rows[m]
+    def statistics(self) -> ColumnStats:
+        """
+        Tính tất cả các tham số thống kê của cột (trừ trung vị) trong một lần duyệt.
+        Kết quả được lưu lại cho đến khi cột bị thay đổi.
+        """
+        stats = self._cache.get('statistics')
+        if stats is None:
+            stats = ColumnStats(self.label, frequency=True)
+            stats.update(self)
+            self._cache['statistics'] = stats
+        stats.label = self.label
+        return stats
     
     def describe(self):
         """
         Hàm in ra thông tin mô tả của cột
         """
-        rnd = lambda x: round(x, 4) if x is not None else None
-
-        print('Type:            ', self.dtype)
-        print('Length:          ', len(self.rows))
-        print('Null values:     ', self.count_na())
-        print('Label:           ', self.label)
-        print('Sum:             ', rnd(self.sum()))
-        print('Mean:            ', rnd(self.mean()))
-        print('Median:          ', rnd(self.median()))
-        print('Std:             ', rnd(self.std()))
-        print('Min-Max:         ', self.minmax())
-        print('Mode:            ', self.mode())
+        self.statistics().describe(median=self.median())
     
-    def fill_na(self, method='mean', verbose=False):
+    def fill_na(self, method='mean', verbose=False, fill_value=None):
         """
         Điền giá trị rỗng cho cột
         method = ['mean' | 'med' | 'mode']
         Nếu cột không có giá trị gì (cả cột đều rỗng) thì điền giá trị 0 cho cột.
+        - fill_value: giá trị điền đã được tính trước (vd: tính song song bằng ColumnPool), None thì tự tính
         """
         assert method in ['mean', 'median', 'mode'], 'Unsupported fill method' 
         
@@ -239,70 +552,113 @@ class Series:
             if verbose: 
                 print('Forcing method "mode" for categorical column')
 
+        na_indices = list(self._na_indices())
+        if len(na_indices) > 0:
+            if fill_value is None:
+                fill_value = self._fill_value(method)
+            # Đôi khi cột là int nhưng mean là float nên ta cần ép kiểu lại cho đúng
+            fill_value = self.dtype(fill_value) if self.dtype is not None else 0
+            for i in na_indices:
+                self[i] = fill_value
+
+        if self.dtype is None:
+            self.dtype = 0
+
+    def fill_with(self, value):
+        """
+        Điền các ô rỗng của cột bằng giá trị `value` cho trước (vd: giá trị đã fit trên dữ liệu khác)
+        """
+        for i in list(self._na_indices()):
+            self[i] = value
+
+    def _fill_value(self, method):
+        """
+        Private: tính giá trị dùng để điền các ô rỗng theo `method` (cột không phải số luôn dùng mode)
+        """
+        if self.dtype not in [int, float]:
+            method = 'mode'
+
         if method == 'mean':
-            fill_value = self.mean()
+            return self.mean()
         elif method == 'median':
-            fill_value = self.median()
+            return self.median()
         elif method == 'mode':
             fill_value, freq = self.mode()
-        
-        for i, row in enumerate(self.rows):
-            if row is None:
-                if self.dtype is not None:
-                    # Đôi khi cột là int nhưng mean là float nên ta cần ép kiểu lại cho đúng
-                    self[i] = self.dtype(fill_value)
-                else: 
-                    self[i] = 0
-
-        if self.dtype is None:
-            self.dtype = 0
+            return fill_value
     
-    def normalize(self, method='zscore'):
+    def normalize(self, method='zscore', params=None):
         """
         Chuẩn hóa cột
         method = ['zscore' | 'zscore']
+        - params: tham số chuẩn hóa đã tính trước (xem `normalize_params`), None thì tính trên cột này
+        """
+        if params is None:
+            params = self.normalize_params(method)
+        self._normalize_with(method, *params)
+
+    def normalize_params(self, method='zscore') -> tuple:
+        """
+        Trả về tham số chuẩn hóa của cột: (mean, std) với zscore, (min, max) với minmax
         """
         assert method in ['zscore', 'minmax'], 'Invalid normalize method'
-        
+
         if method == 'zscore':
-            mean = self.mean()
-            std = self.std()
+            return self.mean(), self.std()
         elif method == 'minmax':
-            min_value, max_value = self.minmax()
+            return self.minmax()
 
+    def _normalize_with(self, method, a, b):
+        """
+        Private: chuẩn hóa cột với tham số cho trước (dùng khi tham số được tính trên toàn bộ dữ liệu, vd: đọc theo chunk)
+        - zscore: a, b là mean, std
+        - minmax: a, b là min, max
+        """
+        assert method in ['zscore', 'minmax'], 'Invalid normalize method'
+        self._invalidate()
 
-        for i, row in enumerate(self.rows):
-            if row is None:
-                continue
-            if method == 'zscore':
-                self[i] = (row - mean) / std
-            elif method == 'minmax':
-                self[i] = (row - min_value) / (max_value - min_value)
+        if method == 'zscore':
+            mean, std = a, b
+            transform = lambda row: (row - mean) / std
+        elif method == 'minmax':
+            min_value, max_value = a, b
+            transform = lambda row: (row - min_value) / (max_value - min_value)
+
+        if self.is_typed():
+            # Tính lại cả buffer một lần, chỉ biến đổi các hàng hợp lệ
+            self.rows = array('d', (transform(row) if ok else 0.0 for row, ok in zip(self.rows, self.valid)))
+            self.int_cells = None
+        else:
+            for i, row in enumerate(self.rows):
+                if row is None:
+                    continue
+                self[i] = transform(row)
         
         # Sau khi chuẩn hóa, dữ liệu chắc chắn trở thành số thập phân
         self.dtype = float
     
-    def __element_wise_operation(self, operand, operatr, operator_char):
+    def __element_wise_operation(self, operand, operatr, operator_char, reflected=False):
         """
         Private: hàm xử lý các phép tính trên cột
         Nếu 1 trong 2 giá trị tại hàng tương ứng bằng None thì kết quả tại hàng đó sẽ là None.
         - operand: toán hạng còn lại của phép tính (toán hạng thứ nhất là self).
         - operatr: tham chiếu đến hàm thực hiện toán tử của phép tính.
         - operator_char: kí hiệu toán tử của phép tính. Dùng để ghi tên cột kết quả
+        - reflected: nếu True thì `operand` là toán hạng thứ nhất (vd: 2 * cột), self là toán hạng thứ hai
         """
         # Nếu "cột" kia có kiểu dữ liệu là số thì biến nó thành mảng bằng cách duplicate lên n lần (broadcast)
         if type(operand) in (int, float):
             operand = Series([operand] * len(self), str(operand))
 
         assert len(self) == len(operand), 'Series length does not match'
+        if reflected:
+            return operand.__element_wise_operation(self, operatr, operator_char)
         # Tạo series chứa kết quả trả về
-        result = Series(len(self), self.label + operator_char + operand.label)
+        result = Series(None, self.label + operator_char + operand.label)
         # Lặp qua từng hàng và tính giá trị tương ứng
-        for i, row in enumerate(self.rows):
-            if None in (row, operand[i]):
-                result[i] = None 
-            else:
-                result[i] = operatr(row, operand[i])
+        result.rows = [
+            None if row is None or other is None else operatr(row, other)
+            for row, other in zip(self, operand)
+        ]
         
         # Đoán kiểu dữ liệu trả về cho cột 
         result._process_col_type()
@@ -320,12 +676,79 @@ class Series:
 
     def __truediv__(self, operand):
         return self.__element_wise_operation(operand, operator.truediv, '/')
+
+    # Toán tử khi hằng số đứng bên trái (vd: 2 * cột)
+    def __radd__(self, operand):
+        return self.__element_wise_operation(operand, operator.add, '+', reflected=True)
+
+    def __rsub__(self, operand):
+        return self.__element_wise_operation(operand, operator.sub, '-', reflected=True)
+
+    def __rmul__(self, operand):
+        return self.__element_wise_operation(operand, operator.mul, '*', reflected=True)
+
+    def __rtruediv__(self, operand):
+        return self.__element_wise_operation(operand, operator.truediv, '/', reflected=True)
     
     def __getitem__(self, index: int):
+        if self.is_typed() and not self.valid[index]:
+            return None
+        if self.is_categorical():
+            return self.categories[self.rows[index]]
+        if self.int_cells is not None and self.int_cells[index]:
+            return int(self.rows[index])
         return self.rows[index]
     
     def __setitem__(self, index: int, value):
-        self.rows[index] = value
+        self._invalidate()
+        if not self.is_typed():
+            self.rows[index] = value
+            return
+
+        if value is None:
+            self.rows[index] = 0
+            self.valid[index] = 0
+            return
+
+        if self.is_categorical():
+            code = self._category_code(value)
+            # Từ điển vượt quá phạm vi của buffer mã 1 byte thì nâng buffer lên số nguyên 64 bit
+            if code >= 256 and self.rows.typecode == CATEGORY_TYPECODE:
+                self.rows = array(TYPECODES[int], self.rows)
+            self.rows[index] = code
+            self.valid[index] = 1
+            return
+
+        # Gán số thực vào buffer số nguyên thì nâng buffer lên kiểu số thực (các ô đã có giữ kiểu int).
+        # Nếu cột có số nguyên lớn (bị làm tròn trong buffer số thực) thì không nâng, phép gán bên dưới quay về list.
+        if self.rows.typecode == TYPECODES[int] and isinstance(value, float) and all(map(exact_in_float, self.rows)):
+            self.rows = array(TYPECODES[float], self.rows)
+            self.int_cells = bytearray(self.valid)
+            self.dtype = float
+        try:
+            if self.rows.typecode == TYPECODES[float] and not exact_in_float(value):
+                raise OverflowError('Value cannot be stored exactly in a float buffer')
+            self.rows[index] = value
+        except (TypeError, OverflowError):
+            # Giá trị không lưu được (chính xác) trong buffer kiểu (chuỗi, số quá lớn, ...) -> quay về list
+            self._to_list()
+            self.rows[index] = value
+            self.dtype = promote_type(self.dtype, type(value))
+            return
+        self.valid[index] = 1
+        # Ô số nguyên trong buffer số thực giữ kiểu int
+        if self.rows.typecode == TYPECODES[float]:
+            if isinstance(value, int):
+                if self.int_cells is None:
+                    self.int_cells = bytearray(len(self.rows))
+                self.int_cells[index] = 1
+            elif self.int_cells is not None:
+                self.int_cells[index] = 0
     
     def __delitem__(self, index: int):
-        del self.rows[index]
\ No newline at end of file
+        self._invalidate()
+        del self.rows[index]
+        if self.is_typed():
+            del self.valid[index]
+        if self.int_cells is not None:
+            del self.int_cells[index]
\ No newline at end of file
@@ -1,14 +1,23 @@
 from honolib.DataFrame import DataFrame, Series
+from honolib.ExpressionPlan import ExpressionPlan, FusedKernel, PlanCache, ExpressionDag, MultiKernel
 from honolib.utils import detect_type_value
 
+
 class SeriesExpression:
-    def __init__(self, string, df: DataFrame):
+    # Cache các kế hoạch tính dùng chung cho tất cả biểu thức trong tiến trình
+    plan_cache = PlanCache()
+
+    def __init__(self, string, df: DataFrame, cache=True):
         # Chuỗi biểu diễn biểu thức trung tố
         self.inf_expr = string
         # Chuỗi biểu diễn ký pháp ba lan ngược (suffix expression)
         self._suf_expr = None
+        # Kế hoạch tính của biểu thức (biểu thức hậu tố theo tên cột + kernel đã biên dịch)
+        self._plan: ExpressionPlan = None
         # Dataframe chứa các cột có trong biểu thức
         self.df = df
+        # Có dùng cache kế hoạch tính hay không
+        self.cache = cache
         # Phân tích thành suffix expression
         self.parse_tokens()
 
@@ -53,16 +62,73 @@ class SeriesExpression:
         # Nếu object có kiểu dữ liệu là số thì push vào biểu thức
         if detect_type_value(obj) in (int, float):
             self._suf_expr.append(float(obj))
-        # Ngược lại, xem object đó là một tên cột và lấy ra cột tương ứng, push vào biểu thức
-        # Còn nếu cột đó không tồn tại thì hàm get_column sẽ catch
+        # Ngược lại, object đó là một tên cột, push tên cột vào biểu thức
         else:
-            column = self.df.get_column(obj)
-            self._suf_expr.append(column)
+            self._suf_expr.append(obj)
+
+    @staticmethod
+    def column_labels(string) -> list:
+        """
+        Trả về tên các cột có trong biểu thức (không trùng lặp, theo thứ tự xuất hiện)
+        """
+        labels = []
+        for token in string.split():
+            if SeriesExpression._is_operator(token) or detect_type_value(token) in (int, float):
+                continue
+            if token not in labels:
+                labels.append(token)
+        return labels
+
+    def _cache_key(self, tokens) -> tuple:
+        """
+        Tạo khóa cache của biểu thức: dãy token đã chuẩn hóa và kiểu dữ liệu của các cột trong biểu thức.
+        Nếu cột không tồn tại thì hàm get_column sẽ catch.
+        """
+        normalized = []
+        schema = []
+        for token in tokens:
+            if self._is_operator(token):
+                normalized.append(token)
+            elif detect_type_value(token) in (int, float):
+                # '2', '2.0', '2.' là cùng một hằng số
+                normalized.append(repr(float(token)))
+            else:
+                normalized.append(token)
+                dtype = self.df.get_column(token).dtype
+                schema.append((token, getattr(dtype, '__name__', str(dtype))))
+        return tuple(normalized), tuple(schema)
 
     def parse_tokens(self):
+        tokens = self.inf_expr.split()
+        key = self._cache_key(tokens)
+
+        self._plan = self.plan_cache.get(key) if self.cache else None
+        if self._plan is None:
+            self._plan = self._build_plan(tokens)
+            if self.cache:
+                self.plan_cache.put(key, self._plan)
+
+        # Thay tên cột trong biểu thức hậu tố bằng cột tương ứng của dataframe
+        self._suf_expr = [
+            token if isinstance(token, float) or self._is_operator(token) else self.df.get_column(token)
+            for token in self._plan.postfix
+        ]
+
+    def _build_plan(self, tokens) -> ExpressionPlan:
+        """
+        Phân tích biểu thức thành biểu thức hậu tố và biên dịch thành kernel
+        """
+        self._to_postfix(tokens)
+        dtypes = {}
+        for token in self._suf_expr:
+            if isinstance(token, str) and not self._is_operator(token):
+                dtypes[token] = self.df.get_column(token).dtype
+        kernel, columns = FusedKernel.build(self._suf_expr, dtypes)
+        return ExpressionPlan(self._suf_expr, kernel, columns)
+
+    def _to_postfix(self, tokens):
         # Thuật toán đổi infix sang suffix: https://www.geeksforgeeks.org/stack-set-2-infix-to-postfix/
         self._suf_expr = []
-        tokens = self.inf_expr.split()
         stack = []
 
         for token in tokens:
@@ -90,7 +156,31 @@ class SeriesExpression:
             top = stack.pop()
             self._suf_expr.append(top)            
 
-    def evaluate(self):
+    def compile(self):
+        """
+        Trả về kernel đã biên dịch của biểu thức và danh sách các cột đầu vào của kernel.
+        Trả về None, None nếu biểu thức không biên dịch được (không có toán tử, có cột không phải kiểu số, ...),
+        khi đó biểu thức được tính từng toán tử như bình thường.
+        """
+        if self._plan.kernel is None:
+            return None, None
+        return self._plan.kernel, [self.df.get_column(label) for label in self._plan.columns]
+
+    def evaluate(self, fused=True):
+        """
+        Tính giá trị biểu thức.
+        - fused: nếu True thì biên dịch biểu thức thành một hàm tính duy nhất (một lượt duyệt, một buffer kết quả),
+          ngược lại thì tính từng toán tử bằng các phép toán của Series.
+        """
+        if fused:
+            kernel, columns = self.compile()
+            if kernel is not None:
+                try:
+                    return kernel(columns)
+                except OverflowError:
+                    # Kết quả vượt quá phạm vi của buffer kiểu -> tính lại từng toán tử
+                    pass
+
         stack = []
         for token in self._suf_expr:
             if not self._is_operator(token):
@@ -108,3 +198,60 @@ class SeriesExpression:
                 elif token == '/':
                     stack.append(val1 / val2)
         return stack.pop()
+
+
+class MultiSeriesExpression:
+    """
+    Class tính nhiều biểu thức trên cùng một dataframe trong một lượt duyệt qua dữ liệu.
+    Các biểu thức con dùng chung giữa các biểu thức chỉ được tính một lần (xem `ExpressionDag`).
+    """
+
+    def __init__(self, expressions: dict, df: DataFrame):
+        # {tên cột kết quả: chuỗi biểu thức trung tố}
+        self.expressions = expressions
+        # Dataframe chứa các cột có trong biểu thức
+        self.df = df
+        # Phân tích từng biểu thức (dùng chung cache kế hoạch tính với SeriesExpression)
+        self._exprs = {label: SeriesExpression(string, df) for label, string in expressions.items()}
+
+    def compile(self) -> MultiKernel:
+        """
+        Dựng DAG của các biểu thức và biên dịch thành một MultiKernel.
+        Trả về None nếu không biên dịch được (có cột không phải kiểu số, biểu thức không chứa cột nào, ...).
+        """
+        dtypes = {}
+        for expr in self._exprs.values():
+            for token in expr._plan.postfix:
+                if isinstance(token, str) and not expr._is_operator(token):
+                    dtypes[token] = self.df.get_column(token).dtype
+        if any(dtype not in (int, float) for dtype in dtypes.values()):
+            return None
+
+        dag = ExpressionDag(dtypes)
+        roots = [dag.add(expr._plan.postfix) for expr in self._exprs.values()]
+        if any(len(dag.node_columns[root]) == 0 for root in roots):
+            return None
+        return MultiKernel(dag, roots, list(self._exprs))
+
+    def evaluate(self) -> list:
+        """
+        Tính tất cả các biểu thức, trả về danh sách các Series kết quả (theo thứ tự của các biểu thức)
+        """
+        if len(self._exprs) > 1:
+            kernel = self.compile()
+            if kernel is not None:
+                try:
+                    return kernel(self.df)
+                except OverflowError:
+                    # Kết quả vượt quá phạm vi của buffer kiểu -> tính lại từng biểu thức
+                    pass
+
+        results = []
+        for label, expr in self._exprs.items():
+            result = expr.evaluate()
+            # Biểu thức chỉ có một cột thì kết quả chính là cột đó -> sao chép để không đổi tên cột gốc
+            if any(result is col for col in self.df._columns):
+                result = result.take(range(len(result)))
+            result.label = label
+            results.append(result)
+        return results
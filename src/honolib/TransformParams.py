@@ -0,0 +1,79 @@
+"""
+Module lưu tham số đã fit của các phép biến đổi (chuẩn hóa, điền giá trị rỗng) để dùng lại trên dữ liệu khác
+"""
+import json
+import os
+
+
+class TransformParams:
+    """
+    Class lưu tham số đã fit của từng cột, ghi ra file JSON:
+    - normalize: {tên cột: {'method': 'zscore' | 'minmax', 'params': [mean, std] | [min, max]}}
+    - fill_na: {tên cột: {'method': 'mean' | 'median' | 'mode', 'value': giá trị điền}}
+    Tham số được tính một lần trên dữ liệu huấn luyện (fit), sau đó các lô dữ liệu mới chỉ cần áp dụng
+    tham số theo từng hàng (không phải tính lại thống kê trên dữ liệu huấn luyện).
+    """
+
+    VERSION = 1
+
+    def __init__(self):
+        self.normalize = {}
+        self.fill_na = {}
+
+    def set_normalize(self, label, method, params):
+        self.normalize[label] = {'method': method, 'params': list(params)}
+
+    def get_normalize(self, label) -> tuple:
+        """
+        Trả về: method, tham số chuẩn hóa đã fit của cột `label`
+        """
+        if label not in self.normalize:
+            raise AttributeError('No fitted normalize parameters for column: ' + label)
+        entry = self.normalize[label]
+        return entry['method'], tuple(entry['params'])
+
+    def set_fill_na(self, label, method, value):
+        self.fill_na[label] = {'method': method, 'value': value}
+
+    def get_fill_na(self, label) -> tuple:
+        """
+        Trả về: method, giá trị điền đã fit của cột `label`
+        """
+        if label not in self.fill_na:
+            raise AttributeError('No fitted fill value for column: ' + label)
+        entry = self.fill_na[label]
+        return entry['method'], entry['value']
+
+    def save(self, filename):
+        """
+        Lưu tham số ra file (JSON)
+        """
+        with open(filename, 'wt') as f:
+            json.dump({'version': self.VERSION, 'normalize': self.normalize, 'fill_na': self.fill_na}, f, indent=2)
+
+    @classmethod
+    def load(cls, filename, missing_ok=False) -> 'TransformParams':
+        """
+        Nạp tham số từ file. Nếu `missing_ok` thì file không tồn tại trả về tham số rỗng (để fit thêm cột vào file).
+        """
+        params = cls()
+        if missing_ok and not os.path.exists(filename):
+            return params
+        with open(filename, 'rt') as f:
+            obj = json.load(f)
+        if obj.get('version') != cls.VERSION:
+            raise AttributeError('Unsupported parameter file version: ' + str(obj.get('version')))
+        params.normalize = obj.get('normalize', {})
+        params.fill_na = obj.get('fill_na', {})
+        return params
+
+
+def fitted_fill_value(dtype, value):
+    """
+    Ép kiểu giá trị điền theo kiểu của cột giống `Series.fill_na` (cột rỗng hoàn toàn thì điền 0)
+    """
+    if dtype is None:
+        return 0
+    if dtype in (int, float, str):
+        return dtype(value)
+    return value
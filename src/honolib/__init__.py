@@ -1,4 +1,15 @@
-from honolib.DataFrame import DataFrame, read_csv
+from honolib.DataFrame import DataFrame, read_csv, write_csv_chunks, print_na_counts
 from honolib.Series import Series
-from honolib.utils import detect_type_value
-from honolib.SeriesExpression import SeriesExpression
\ No newline at end of file
+from honolib.CsvReader import CsvReader
+from honolib.CsvPatcher import CsvPatcher
+from honolib.ColumnarFile import ColumnarFile
+from honolib.ColumnStats import ColumnStats
+from honolib.QuantileSketch import QuantileSketch
+from honolib.IncrementalState import IncrementalState
+from honolib.TransformParams import TransformParams, fitted_fill_value
+from honolib.Deduplicator import Deduplicator
+from honolib.ColumnPool import ColumnPool
+from honolib.utils import detect_type_value, promote_type
+from honolib.SeriesExpression import SeriesExpression, MultiSeriesExpression
+from honolib.ExpressionPlan import ExpressionPlan, PlanCache
+from honolib.LazyFrame import LazyFrame, scan_csv
\ No newline at end of file
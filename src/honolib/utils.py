@@ -2,6 +2,37 @@
 Module cho các hàm tiện ích
 """
 import re 
+import hashlib
+import math
+import operator
+import random
+from array import array
+from itertools import repeat
+
+# Mã kiểu của array.array ứng với các kiểu dữ liệu số.
+# Các cột số được lưu trong buffer kiểu này thay vì list các object của python.
+TYPECODES = {int: 'q', float: 'd'}
+# Cột chuỗi có tỉ lệ số giá trị phân biệt / số hàng không vượt quá ngưỡng này thì được mã hóa thành cột phân loại
+CATEGORICAL_RATIO = 0.5
+# Kiểu của buffer mã khi cột phân loại có không quá 256 giá trị phân biệt (1 byte/hàng)
+CATEGORY_TYPECODE = 'B'
+# Số nguyên lớn nhất (về trị tuyệt đối) được lưu chính xác trong số thực 64 bit,
+# và số chữ số tối đa của một ô số nguyên chắc chắn không vượt quá giới hạn này
+EXACT_INT = 2 ** 53
+EXACT_DIGITS = 15
+
+# Các biểu thức chính quy được biên dịch sẵn để đoán kiểu dữ liệu
+# 1, 2, -2 -> int
+INT_PATTERN = re.compile(r'^[-+]?[0-9]+$')
+# 0.5, -0.5, .5, 5. -> float
+FLOAT_PATTERN = re.compile(r'^[-+]?([0-9]+\.[0-9]*|[0-9]*\.[0-9]+)$')
+# int hoặc float
+NUMBER_PATTERN = re.compile(r'^[-+]?([0-9]+\.?[0-9]*|[0-9]*\.[0-9]+)$')
+
+# Bảng chuyển mảng cờ (1 byte/hàng, giá trị 0/1) <-> chuỗi chữ số nhị phân để đóng gói/giải nén bitmap
+_FLAGS_TO_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_INVERTED_FLAGS_TO_DIGITS = bytes.maketrans(b'\x00\x01', b'10')
+_DIGITS_TO_FLAGS = bytes.maketrans(b'01', b'\x00\x01')
 
 def detect_type_value(val):
         """
@@ -11,13 +42,307 @@ def detect_type_value(val):
         if val is None:
             return None
         elif isinstance(val, str):
-            if re.match('^[-+]?[0-9]+$', val):
-                # 1, 2, -2 -> int
+            if INT_PATTERN.match(val):
                 return int
-            elif re.match('^[-+]?([0-9]+\.[0-9]*|[0-9]*\.[0-9]+)$', val):
-                # 0.5, -0.5, .5, 5. -> float
+            elif FLOAT_PATTERN.match(val):
                 return float
             else:
                 return str
         else:
             return type(val)
+
+
+def infer_column_type(cells, sample_size=64):
+        """
+        Hàm đoán kiểu dữ liệu của cả một cột từ các ô dạng chuỗi (ô rỗng là None hoặc '').
+        Kiểu được đoán từ `sample_size` ô đầu tiên, sau đó cả cột được kiểm tra bằng regex đã biên dịch
+        (duyệt bằng map nên vòng lặp chạy trong C). Kết quả giống hệt việc gọi `detect_type_value` trên từng ô
+        rồi kết hợp bằng `promote_type`.
+        Trả về: int, float, str, object hoặc None (cột toàn ô rỗng)
+        """
+        present = [cell for cell in cells if cell]
+        if len(present) == 0:
+            return None
+
+        guess = None
+        for cell in present[:sample_size]:
+            guess = promote_type(guess, detect_type_value(cell))
+            # Đã chắc chắn là object thì không cần kiểm tra thêm
+            if guess is object:
+                return object
+
+        if guess is str:
+            return str if not any(map(NUMBER_PATTERN.match, present)) else object
+        if guess is int and all(map(INT_PATTERN.match, present)):
+            return int
+        # Cột số: nếu có ô không phải số thì cột là object, ngược lại (có ít nhất một ô số thực) là float
+        return float if all(map(NUMBER_PATTERN.match, present)) else object
+
+
+def convert_cells(cells, dtype):
+        """
+        Hàm chuyển các ô dạng chuỗi (ô rỗng là None hoặc '') của một cột sang kiểu `dtype` trong một lượt.
+        Ô không chuyển được sang `dtype` thì trở thành ô rỗng (giống `Series.cast`).
+        Cột object: mỗi ô được chuyển sang kiểu riêng của ô đó (giống `Series._process_col_type`).
+        Trả về: rows, valid
+        - Cột int/float: rows là array.array, valid là mảng đánh dấu hàng hợp lệ (1: có dữ liệu, 0: rỗng).
+          Nếu có số nguyên vượt quá 64 bit hoặc không lưu chính xác được trong buffer số thực thì lưu bằng list.
+        - Các cột còn lại: rows là list (ô rỗng là None), valid là None
+        """
+        if dtype is float and has_inexact_ints(cells):
+            # Số nguyên lớn bị làm tròn trong buffer số thực -> lưu bằng list, ô số nguyên giữ kiểu int
+            rows = []
+            for cell in cells:
+                try:
+                    rows.append((int(cell) if INT_PATTERN.match(cell) else float(cell)) if cell else None)
+                except ValueError:
+                    rows.append(None)
+            return rows, None
+
+        if dtype in TYPECODES:
+            try:
+                valid = bytearray(map(bool, cells))
+                rows = array(TYPECODES[dtype], map(dtype, [cell if cell else '0' for cell in cells]))
+                return rows, valid
+            except OverflowError:
+                # Số nguyên vượt quá 64 bit -> lưu bằng list
+                pass
+            except ValueError:
+                # Có ô không chuyển được -> chuyển từng ô
+                pass
+
+        if dtype is None:
+            return [None] * len(cells), None
+        if dtype is str:
+            return [cell if cell else None for cell in cells], None
+        if dtype is object:
+            return [detect_type_value(cell)(cell) if cell else None for cell in cells], None
+
+        rows = []
+        for cell in cells:
+            try:
+                rows.append(dtype(cell) if cell else None)
+            except (ValueError, TypeError):
+                rows.append(None)
+        if dtype in TYPECODES:
+            try:
+                valid = bytearray([row is not None for row in rows])
+                return array(TYPECODES[dtype], [0 if row is None else row for row in rows]), valid
+            except OverflowError:
+                pass
+        return rows, None
+
+
+def exact_in_float(value) -> bool:
+        """
+        Kiểm tra giá trị có được lưu chính xác trong buffer số thực hay không
+        (số nguyên có trị tuyệt đối lớn hơn 2^53 thì bị làm tròn)
+        """
+        return not isinstance(value, int) or -EXACT_INT <= value <= EXACT_INT
+
+
+def has_inexact_ints(cells) -> bool:
+        """
+        Kiểm tra trong các ô dạng chuỗi có ô số nguyên không lưu chính xác được trong buffer số thực hay không.
+        Chỉ các ô dài hơn `EXACT_DIGITS` ký tự mới cần chuyển sang int để kiểm tra.
+        """
+        return any(
+            not exact_in_float(int(cell))
+            for cell in cells
+            if cell and len(cell) > EXACT_DIGITS and INT_PATTERN.match(cell)
+        )
+
+
+def promote_type(a, b):
+        """
+        Hàm kết hợp kiểu dữ liệu của hai phần dữ liệu (hai ô, hai chunk, ...) trong cùng một cột
+        - None (chưa xác định) kết hợp với kiểu nào cũng ra kiểu đó
+        - int kết hợp với float ra float
+        - Hai kiểu khác nhau còn lại ra object
+        """
+        if a is None:
+            return b
+        if b is None or a == b:
+            return a
+        if (a, b) in ((float, int), (int, float)):
+            return float
+        return object
+
+
+def table_mode(frequency_table):
+        """
+        Trả về giá trị có tần suất lớn nhất trong bảng tần suất (bỏ qua None).
+        Nếu có nhiều mode chỉ lấy giá trị đầu tiên. Bảng rỗng thì trả về (0, 0).
+        Trả về: mode_value, frequency.
+        """
+        max_freq = 0
+        max_value = 0
+        for (value, freq) in frequency_table.items():
+            if value is not None:
+                if freq > max_freq:
+                    max_freq = freq 
+                    max_value = value 
+        return max_value, max_freq
+
+
+def select_kth(values, k):
+        """
+        Trả về phần tử nhỏ thứ `k` (tính từ 0) của `values` bằng thuật toán quickselect,
+        độ phức tạp trung bình O(n) thay vì O(n log n) khi sắp xếp cả cột.
+        """
+        return select_many(values, [k])[k]
+
+
+def select_many(values, ks):
+        """
+        Trả về {k: phần tử nhỏ thứ k của `values`} cho nhiều vị trí `ks` cùng lúc, độ phức tạp O(n).
+        Dùng cách chọn của Floyd-Rivest: sắp xếp một mẫu nhỏ để tìm khoảng [lo, hi] chắc chắn (với xác suất rất cao)
+        chứa phần tử cần tìm, sau đó chỉ cần một lượt lọc các giá trị trong khoảng và một lượt đếm các giá trị nhỏ hơn lo
+        (cả hai đều là vòng lặp trong C). Nếu khoảng không chứa phần tử cần tìm thì quay về quickselect.
+        """
+        values = list(values)
+        n = len(values)
+        for k in ks:
+            if not 0 <= k < n:
+                raise IndexError('Selection index out of range')
+        ks = sorted(set(ks))
+
+        # Dãy nhỏ thì sắp xếp luôn
+        if n <= 4096:
+            sorted_values = sorted(values)
+            return {k: sorted_values[k] for k in ks}
+
+        m = int(n ** (2 / 3))
+        sample = sorted(random.sample(values, m))
+        # Độ rộng của khoảng trong mẫu (khoảng 3 độ lệch chuẩn của hạng)
+        margin = 3 * math.sqrt(m)
+        bound = lambda k, d: min(m - 1, max(0, int(k * m / n + d)))
+
+        # Gom các vị trí gần nhau (khoảng của chúng giao nhau) để lọc chung một lần
+        groups = []
+        for k in ks:
+            if len(groups) > 0 and bound(k, -margin) <= bound(groups[-1][-1], margin):
+                groups[-1].append(k)
+            else:
+                groups.append([k])
+
+        result = {}
+        for group in groups:
+            # Phần tử nhỏ nhất/lớn nhất thì không cần lọc
+            if group == [0]:
+                result[0] = min(values)
+                continue
+            if group == [n - 1]:
+                result[n - 1] = max(values)
+                continue
+            lo = sample[bound(group[0], -margin)]
+            hi = sample[bound(group[-1], margin)]
+            n_below = sum(map(operator.lt, values, repeat(lo)))
+            band = [value for value in values if lo <= value <= hi]
+            if n_below <= group[0] and group[-1] < n_below + len(band):
+                band.sort()
+                for k in group:
+                    result[k] = band[k - n_below]
+            else:
+                result.update(_quickselect_many(values, group))
+        return result
+
+
+def _quickselect_many(values, ks):
+        """
+        Private: quickselect nhiều vị trí, sau mỗi lần phân hoạch chỉ tiếp tục trên các phần còn chứa vị trí cần tìm
+        """
+        result = {}
+        # Mỗi phần tử của stack: (các giá trị, các vị trí cần tìm, vị trí của phần tử đầu tiên trong cả dãy)
+        stack = [(values, ks, 0)]
+        while len(stack) > 0:
+            values, ks, offset = stack.pop()
+            pivot = random.choice(values)
+            lows = [value for value in values if value < pivot]
+            low_end = offset + len(lows)
+            pivot_end = low_end + values.count(pivot)
+
+            low_ks = [k for k in ks if k < low_end]
+            high_ks = [k for k in ks if k >= pivot_end]
+            for k in ks:
+                if low_end <= k < pivot_end:
+                    result[k] = pivot
+            if len(low_ks) > 0:
+                stack.append((lows, low_ks, offset))
+            if len(high_ks) > 0:
+                stack.append(([value for value in values if value > pivot], high_ks, pivot_end))
+        return result
+
+
+def pack_bits(flags, invert=False) -> int:
+        """
+        Đóng gói mảng cờ (1 byte/hàng, giá trị 0/1) thành bitmap kiểu int: bit thứ i là cờ của hàng i.
+        - invert: đảo cờ trước khi đóng gói (vd: mảng đánh dấu hàng hợp lệ -> bitmap hàng rỗng)
+        Mảng cờ được chuyển thành chuỗi chữ số nhị phân để int() đóng gói trong C (không duyệt từng hàng bằng python).
+        """
+        if len(flags) == 0:
+            return 0
+        digits = bytes(flags).translate(_INVERTED_FLAGS_TO_DIGITS if invert else _FLAGS_TO_DIGITS)
+        return int(digits[::-1], 2)
+
+
+def unpack_bits(bitmap: int, n) -> bytearray:
+        """
+        Giải nén bitmap thành mảng cờ `n` phần tử (ngược lại với `pack_bits`)
+        """
+        if n == 0:
+            return bytearray()
+        digits = format(bitmap & ((1 << n) - 1), 'b').zfill(n)
+        return bytearray(digits[::-1].encode().translate(_DIGITS_TO_FLAGS))
+
+
+def bitsliced_add(counters: list, bitmap: int):
+        """
+        Cộng bitmap (mỗi hàng +0 hoặc +1) vào bộ đếm theo lát bit của tất cả các hàng:
+        counters[j] là bitmap chứa bit thứ j của bộ đếm của từng hàng.
+        Mỗi lần cộng chỉ gồm vài phép AND/XOR trên số nguyên lớn (cộng có nhớ song song trên mọi hàng).
+        """
+        level = 0
+        while bitmap:
+            if level == len(counters):
+                counters.append(bitmap)
+                return
+            carry = counters[level] & bitmap
+            counters[level] ^= bitmap
+            bitmap = carry
+            level += 1
+
+
+def bitsliced_at_least(counters: list, k, n) -> int:
+        """
+        Trả về bitmap các hàng (trong `n` hàng) có bộ đếm theo lát bit (xem `bitsliced_add`) lớn hơn hoặc bằng `k`.
+        So sánh từ bit cao xuống bit thấp trên mọi hàng cùng lúc.
+        """
+        all_rows = (1 << n) - 1
+        if k <= 0:
+            return all_rows
+        if k >= 1 << len(counters):
+            return 0
+        greater = 0
+        equal = all_rows
+        for level in reversed(range(len(counters))):
+            if (k >> level) & 1:
+                equal &= counters[level]
+            else:
+                greater |= equal & counters[level]
+                equal &= ~counters[level]
+        return greater | equal
+
+
+def row_fingerprint(row: tuple) -> bytes:
+        """
+        Trả về fingerprint (giá trị băm 16 byte) của một hàng, không phụ thuộc vào tiến trình đang chạy.
+        Dùng khi cần lưu khóa của hàng ra đĩa thay vì giữ nguyên tuple trong bộ nhớ.
+        Số thực có giá trị nguyên được chuẩn hóa thành số nguyên trước khi băm: 3 và 3.0 bằng nhau khi so sánh
+        trực tiếp (bảng băm trong bộ nhớ) nên phải có cùng fingerprint, kể cả khi kiểu của cột được đoán riêng trên từng phần.
+        """
+        key = tuple(
+            int(value) if isinstance(value, float) and math.isfinite(value) and value.is_integer() else value
+            for value in row
+        )
+        return hashlib.blake2b(repr(key).encode(), digest_size=16).digest()
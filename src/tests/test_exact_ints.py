@@ -0,0 +1,64 @@
+"""
+Kiểm tra số nguyên lớn (> 2^53) nằm chung cột với số thực được đọc/ghi chính xác
+Chạy (trong thư mục src): python -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+import honolib as hd
+
+BIG = 12345678901234567890
+BIG_53 = 2 ** 53 + 1
+
+
+class ExactIntsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'data.csv')
+        # Số nguyên lớn ở cuối file (sau nhiều khối số nguyên nhỏ và một ô số thực) để đi qua cả bước nâng kiểu
+        self.values = [i % 10 for i in range(10000)] + [1.5, None, BIG, BIG_53]
+        with open(self.filename, 'wt', newline='') as f:
+            f.write('a,b\n')
+            for i, value in enumerate(self.values):
+                f.write('%s,%d\n' % ('' if value is None else value, i % 3))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assertExact(self, series):
+        self.assertIs(series.dtype, float)
+        self.assertEqual(list(series), self.values)
+
+    def test_series(self):
+        series = hd.Series(['9007199254740993', '1.5'])
+        self.assertEqual(list(series), [BIG_53, 1.5])
+
+        series = hd.Series([1, 2])
+        series[0] = BIG_53
+        series[1] = 0.5
+        self.assertEqual(list(series), [BIG_53, 0.5])
+
+    def test_read_csv(self):
+        self.assertExact(hd.read_csv(self.filename).get_column('a'))
+        self.assertExact(hd.read_csv(self.filename, workers=3).get_column('a'))
+
+    def test_read_csv_chunks(self):
+        values = []
+        for chunk in hd.read_csv(self.filename, chunksize=3000):
+            values += list(chunk.get_column('a'))
+        self.assertEqual(values, self.values)
+
+    def test_cache(self):
+        for _ in range(2):
+            # Lần đầu ghi cache, lần sau đọc từ cache
+            self.assertExact(hd.read_csv(self.filename, cache=True).get_column('a'))
+
+    def test_write_csv(self):
+        output = os.path.join(self.directory.name, 'out.csv')
+        hd.read_csv(self.filename).write_csv(output)
+        with open(self.filename, 'rt') as f, open(output, 'rt') as g:
+            self.assertEqual(f.read().splitlines(), g.read().splitlines())
+
+
+if __name__ == '__main__':
+    unittest.main()